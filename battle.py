@@ -0,0 +1,285 @@
+import random
+from array import array
+from dataclasses import dataclass
+from itertools import accumulate
+
+# --- 属性克制 ---
+# 键克制值：水克火，火克草，草克水
+EFFECTIVENESS = {"水": "火", "火": "草", "草": "水"}
+SUPER_EFFECTIVE = 1.2  # 克制，伤害加成20%
+NOT_EFFECTIVE = 0.8  # 被克制，伤害减少20%
+
+
+def build_multipliers(effectiveness: dict[str, str], extra_attributes=(), super_effective: float = SUPER_EFFECTIVE,
+                      not_effective: float = NOT_EFFECTIVE) -> dict[tuple[str, str], float]:
+    """预先算好所有 (攻击方属性, 防御方属性) 组合的伤害倍率，extra_attributes 为不参与克制的其他属性。"""
+    attributes = set(effectiveness) | set(effectiveness.values()) | set(extra_attributes)
+    table = {}
+    for attacker in attributes:
+        for defender in attributes:
+            if effectiveness.get(attacker) == defender:
+                table[attacker, defender] = super_effective
+            elif effectiveness.get(defender) == attacker:
+                table[attacker, defender] = not_effective
+            else:
+                table[attacker, defender] = 1.0
+    return table
+
+
+ATTRIBUTE_MULTIPLIERS = build_multipliers(EFFECTIVENESS)
+
+# --- 战斗事件 ---
+# 每次攻击记录为 4 个整数：回合、出手方(0=先手,1=后手)、伤害、效果标记
+EVENT_FIELDS = 4
+EFFECT_NORMAL, EFFECT_SUPER, EFFECT_WEAK = 0, 1, 2
+_ROLL_LOW, _ROLL_SPAN = 0.8, 1.2 - 0.8  # 与 random.uniform(0.8, 1.2) 完全相同的取值方式
+
+
+def _effect_flag(multiplier: float) -> int:
+    if multiplier > 1.0:
+        return EFFECT_SUPER
+    if multiplier < 1.0:
+        return EFFECT_WEAK
+    return EFFECT_NORMAL
+
+
+@dataclass(slots=True)
+class BattleResult:
+    """战斗核心的紧凑输出，不包含任何文本。"""
+    events: array
+    start_hp: tuple[int, int]
+    end_hp: tuple[int, int]
+    turns: int
+    winner: int  # 0 为先手方获胜，1 为后手方获胜
+    damage: tuple[int, int]  # 双方造成的总伤害
+
+    @staticmethod
+    def round_start(turn: int) -> int:
+        """第 turn 回合（从 1 开始）首个事件在数组中的位置；除最后一回合外每回合恰好两次攻击。"""
+        return (turn - 1) * 2 * EVENT_FIELDS
+
+
+def run_battle_core(pet1: dict, pet2: dict, attr1: str, attr2: str,
+                    multipliers: dict[tuple[str, str], float] = ATTRIBUTE_MULTIPLIERS) -> BattleResult:
+    """
+    执行一场战斗，只记录紧凑的事件数组。
+    规则：HP = 等级*10 + 饱食度；先手方先攻击，后手方存活时反击；
+    基础伤害 = max(1, int(攻击 * U(0.8, 1.2) - 对方防御 * 0.5))，最终伤害 = int(基础伤害 * 属性倍率)。
+    """
+    hp1 = start1 = pet1['level'] * 10 + pet1['satiety']
+    hp2 = start2 = pet2['level'] * 10 + pet2['satiety']
+    atk1, atk2 = pet1['attack'], pet2['attack']
+    cut_on_2, cut_on_1 = pet2['defense'] * 0.5, pet1['defense'] * 0.5
+    mult1, mult2 = multipliers[attr1, attr2], multipliers[attr2, attr1]
+    flag1, flag2 = _effect_flag(mult1), _effect_flag(mult2)
+    rand = random.random
+    events = array('i')
+    push = events.extend
+
+    turn = 0
+    while hp1 > 0 and hp2 > 0:
+        turn += 1
+        dmg = int(max(1, int(atk1 * (_ROLL_LOW + _ROLL_SPAN * rand()) - cut_on_2)) * mult1)
+        hp2 -= dmg
+        push((turn, 0, dmg, flag1))
+        if hp2 <= 0:
+            break
+        dmg = int(max(1, int(atk2 * (_ROLL_LOW + _ROLL_SPAN * rand()) - cut_on_1)) * mult2)
+        hp1 -= dmg
+        push((turn, 1, dmg, flag2))
+
+    return BattleResult(events=events, start_hp=(start1, start2), end_hp=(hp1, hp2), turns=turn,
+                        winner=0 if hp1 > 0 else 1, damage=(start2 - hp2, start1 - hp1))
+
+
+# --- 战斗日志渲染 ---
+def _render_round(lines: list[str], events: array, start: int, end: int, names: tuple[str, str],
+                  hp: list[int]):
+    for i in range(start, end, EVENT_FIELDS):
+        turn, actor, dmg, flag = events[i:i + EVENT_FIELDS]
+        if actor == 0:
+            lines.append(f"\n--- 第 {turn} 回合 ---")
+            lines.append(f"「{names[0]}」发起了攻击！")
+        else:
+            lines.append(f"「{names[1]}」进行了反击！")
+        if flag == EFFECT_SUPER:
+            lines.append("效果拔群！")
+        elif flag == EFFECT_WEAK:
+            lines.append("效果不太理想…")
+        target = 1 - actor
+        hp[target] -= dmg
+        lines.append(f"对「{names[target]}」造成了 {dmg} 点伤害！(剩余HP: {max(0, hp[target])})")
+
+
+# 每回合至少有一行回合标题
+_ROUND_MIN_CHARS = len("\n--- 第 1 回合 ---") + 1
+
+
+def _text_length(lines: list[str]) -> int:
+    """按换行连接后的长度。"""
+    return sum(len(line) + 1 for line in lines)
+
+
+def render_battle_log(result: BattleResult, pet1: dict, pet2: dict, attr1: str, attr2: str,
+                      max_rounds: int = 0, max_chars: int = 0) -> list[str]:
+    """
+    把战斗事件渲染为文字日志。
+    max_rounds > 0 且回合数超出时，只保留开头和结尾的若干回合，中间以伤害合计代替；
+    max_chars > 0 时继续减少保留的回合，直到整段日志（含全场统计）不超过该长度，必要时一个回合都不保留。
+    """
+    names = (pet1['pet_name'], pet2['pet_name'])
+    header = (f"战斗开始！\n「{names[0]}」(Lv.{pet1['level']} {attr1}系) vs "
+              f"「{names[1]}」(Lv.{pet2['level']} {attr2}系)")
+    footer = f"\n战斗结束！胜利者是「{names[result.winner]}」！"
+    events, turns = result.events, result.turns
+    fixed = _text_length([header, footer])
+
+    # 多数战斗第一次就放得下：直接渲染要保留的回合；每回合至少有一行回合标题，明显放不下时跳过这一步
+    keep = turns if max_rounds <= 0 else min(turns, max_rounds)
+    direct = max_chars <= 0 or fixed + keep * _ROUND_MIN_CHARS <= max_chars
+    if direct and keep == turns:
+        lines = [header]
+        _render_round(lines, events, 0, len(events), names, list(result.start_hp))
+        lines.append(footer)
+        if max_chars <= 0 or _text_length(lines) <= max_chars:
+            return lines
+
+    summary = (f"\n全场共 {turns} 回合，「{names[0]}」造成 {result.damage[0]} 点伤害，"
+               f"「{names[1]}」造成 {result.damage[1]} 点伤害。")
+    # dealt[side][t] 为该方在前 t 回合造成的伤害合计；最后一回合后手方可能没有出手
+    step = 2 * EVENT_FIELDS
+    dealt = (list(accumulate(events[2::step], initial=0)),
+             list(accumulate(events[EVENT_FIELDS + 2::step], initial=0)))
+    dealt[1].extend([dealt[1][-1]] * (turns + 1 - len(dealt[1])))
+
+    def render_rounds(first: int, last: int) -> list[str]:
+        # 任意回合开始时的 HP 都能由伤害合计得出，各段回合可以独立渲染
+        hp = [result.start_hp[0] - dealt[1][first - 1], result.start_hp[1] - dealt[0][first - 1]]
+        lines = []
+        _render_round(lines, events, BattleResult.round_start(first),
+                      min(BattleResult.round_start(last + 1), len(events)), names, hp)
+        return lines
+
+    def gap(head: int, tail: int) -> str:
+        # 被省略的回合只给出伤害合计，后面显示的剩余 HP 仍然正确
+        skipped = (dealt[0][turns - tail] - dealt[0][head], dealt[1][turns - tail] - dealt[1][head])
+        return (f"\n……（省略第 {head + 1}~{turns - tail} 回合）……\n"
+                f"期间「{names[0]}」共造成 {skipped[0]} 点伤害，「{names[1]}」共造成 {skipped[1]} 点伤害。")
+
+    def assemble(head: int, tail: int, head_lines: list[str], tail_lines: list[str]) -> list[str]:
+        if head + tail == turns:
+            return [header, *head_lines, *tail_lines, footer]
+        return [header, *head_lines, gap(head, tail), *tail_lines, summary, footer]
+
+    head, tail = (keep + 1) // 2, keep // 2
+    if direct and keep < turns:
+        lines = assemble(head, tail, render_rounds(1, head), render_rounds(turns - tail + 1, turns))
+        if max_chars <= 0 or _text_length(lines) <= max_chars:
+            return lines
+
+    def render_side(turns_in_order) -> tuple[list[list[str]], list[int]]:
+        # 保留的回合只会从 keep 开始减少；单侧文字超出 max_chars 后更多的回合不可能被保留，不再渲染
+        rounds, lengths = [], [0]
+        for turn in turns_in_order:
+            if lengths[-1] > max_chars:
+                break
+            rounds.append(render_rounds(turn, turn))
+            lengths.append(lengths[-1] + _text_length(rounds[-1]))
+        return rounds, lengths
+
+    # 放不下时每个可能保留的回合只渲染一次，保留多少回合由各回合文字的累计长度直接算出
+    head_rounds, head_length = render_side(range(1, head + 1))
+    tail_rounds, tail_length = render_side(range(turns, turns - tail, -1))
+
+    def fits(head: int, tail: int) -> bool:
+        if head >= len(head_length) or tail >= len(tail_length):
+            return False
+        extra = [] if head + tail == turns else [gap(head, tail), summary]
+        return fixed + head_length[head] + tail_length[tail] + _text_length(extra) <= max_chars
+
+    # 每次少保留两个回合（开头、结尾各一个），直到放得下；一个回合都不保留时只剩伤害合计
+    while keep > 0:
+        keep = max(0, keep - 2)
+        head, tail = (keep + 1) // 2, keep // 2
+        if fits(head, tail):
+            break
+    return assemble(head, tail, [line for lines in head_rounds[:head] for line in lines],
+                    [line for lines in reversed(tail_rounds[:tail]) for line in lines])
+
+
+# --- 战报卡数据 ---
+def hp_curve(result: BattleResult) -> tuple[list[int], list[int]]:
+    """双方开战时和每回合结束后的 HP（不低于 0），两个列表长度均为回合数 + 1。"""
+    hp = list(result.start_hp)
+    curves = ([hp[0]], [hp[1]])
+    events = result.events
+    for i in range(0, len(events), EVENT_FIELDS):
+        turn, actor, dmg = events[i:i + 3]
+        hp[1 - actor] -= dmg
+        if actor == 1 or i + EVENT_FIELDS >= len(events):
+            curves[0].append(max(0, hp[0]))
+            curves[1].append(max(0, hp[1]))
+    return curves
+
+
+def key_moments(result: BattleResult, names: tuple[str, str], curves: tuple[list[int], list[int]]) -> list[str]:
+    """挑出至多两个关键时刻：全场最高的一击，以及胜者的绝地反击或压倒性胜利。"""
+    events = result.events
+    best = max(range(0, len(events), EVENT_FIELDS), key=lambda i: events[i + 2])
+    turn, actor, dmg, flag = events[best:best + EVENT_FIELDS]
+    moments = [f"第 {turn} 回合「{names[actor]}」打出全场最高的 {dmg} 点伤害"
+               f"{'，效果拔群' if flag == EFFECT_SUPER else ''}"]
+    winner = result.winner
+    start = result.start_hp[winner]
+    lowest = min(curves[winner])
+    if lowest * 4 < start:
+        moments.append(f"「{names[winner]}」一度只剩 {lowest} 点HP，绝地反击！")
+    elif curves[winner][-1] * 4 >= start * 3:
+        moments.append(f"「{names[winner]}」几乎毫发无伤，取得压倒性胜利。")
+    return moments
+
+
+@dataclass(frozen=True, slots=True)
+class Battle:
+    """一场打完的战斗及双方的宠物数据和属性，供日志、摘要和战报卡使用。"""
+    result: BattleResult
+    pet1: dict
+    pet2: dict
+    attr1: str
+    attr2: str
+
+    @property
+    def names(self) -> tuple[str, str]:
+        return self.pet1['pet_name'], self.pet2['pet_name']
+
+    @property
+    def winner_name(self) -> str:
+        return self.names[self.result.winner]
+
+    def log(self, max_rounds: int = 0, max_chars: int = 0) -> list[str]:
+        return render_battle_log(self.result, self.pet1, self.pet2, self.attr1, self.attr2, max_rounds, max_chars)
+
+
+def battle_brief(battle: Battle) -> str:
+    """一行战斗摘要，战报卡无法生成时代替完整日志发送。"""
+    names, pet1, pet2 = battle.names, battle.pet1, battle.pet2
+    return (f"「{names[0]}」(Lv.{pet1['level']} {battle.attr1}系) vs "
+            f"「{names[1]}」(Lv.{pet2['level']} {battle.attr2}系)："
+            f"激战 {battle.result.turns} 回合，「{battle.winner_name}」获胜！")
+
+
+def battle_card_data(battle: Battle, images: tuple[str, str], notes: list[str]) -> dict:
+    """渲染战报卡所需的全部数据，只包含可以 pickle 的基本类型。notes 为结算、升级等附加说明。"""
+    result, names = battle.result, battle.names
+    curves = hp_curve(result)
+    return {
+        "names": names,
+        "levels": (battle.pet1['level'], battle.pet2['level']),
+        "attributes": (battle.attr1, battle.attr2),
+        "images": images,
+        "start_hp": result.start_hp,
+        "curves": curves,
+        "turns": result.turns,
+        "winner": result.winner,
+        "lines": key_moments(result, names, curves) + notes,
+    }
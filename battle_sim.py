@@ -0,0 +1,186 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+# 单场战斗的回合上限，仅作为防止死循环的保险；按现有伤害公式每回合至少造成 1 点伤害，正常不会触达
+MAX_TURNS = 100_000
+
+
+@dataclass
+class BattleStats:
+    """批量模拟的逐场结果，每个数组的长度都等于模拟场数。"""
+    p1_wins: np.ndarray      # bool，先手方是否获胜
+    turns: np.ndarray        # int，战斗持续的回合数
+    p1_damage: np.ndarray    # int，先手方造成的总伤害
+    p2_damage: np.ndarray    # int，后手方造成的总伤害
+    p1_hits: np.ndarray      # int，先手方出手次数
+    p2_hits: np.ndarray      # int，后手方出手次数
+
+    @property
+    def win_rate(self) -> float:
+        return float(self.p1_wins.mean())
+
+    def summary(self) -> dict:
+        """胜率、回合数分布和伤害统计的汇总。"""
+        turns = self.turns
+        return {
+            "battles": int(turns.size),
+            "p1_win_rate": self.win_rate,
+            "turns_mean": float(turns.mean()),
+            "turns_p50": float(np.percentile(turns, 50)),
+            "turns_p90": float(np.percentile(turns, 90)),
+            "turns_max": int(turns.max()),
+            "turns_hist": np.bincount(turns).tolist(),
+            "p1_damage_per_hit": float(self.p1_damage.sum() / max(1, self.p1_hits.sum())),
+            "p2_damage_per_hit": float(self.p2_damage.sum() / max(1, self.p2_hits.sum())),
+            "p1_damage_mean": float(self.p1_damage.mean()),
+            "p2_damage_mean": float(self.p2_damage.mean()),
+        }
+
+
+def attribute_matrix(attributes: list[str], multipliers: dict[tuple[str, str], float]) -> np.ndarray:
+    """把 battle.ATTRIBUTE_MULTIPLIERS 形式的倍率表按属性下标展开为矩阵：matrix[攻击方, 防御方]。"""
+    return np.array([[multipliers.get((a, d), 1.0) for d in attributes] for a in attributes], dtype=np.float64)
+
+
+def simulate_battles(p1_attack, p1_defense, p1_level, p1_satiety, p1_attr,
+                     p2_attack, p2_defense, p2_level, p2_satiety, p2_attr,
+                     multipliers: np.ndarray, n: int | None = None,
+                     rng: np.random.Generator | None = None) -> BattleStats:
+    """
+    同时模拟 n 场战斗，规则与 battle.run_battle_core 完全一致：
+    HP = 等级*10 + 饱食度；先手方先攻击，后手方存活时反击；
+    基础伤害 = max(1, int(攻击 * U(0.8, 1.2) - 对方防御 * 0.5))，最终伤害 = int(基础伤害 * 属性倍率)。
+    所有参数都可以是标量或长度为 n 的数组（属性参数为 multipliers 的下标）。
+    """
+    arrays = np.broadcast_arrays(*(np.asarray(v) for v in (
+        p1_attack, p1_defense, p1_level, p1_satiety, p1_attr,
+        p2_attack, p2_defense, p2_level, p2_satiety, p2_attr)))
+    size = n if n is not None else arrays[0].size
+    a1, d1, l1, s1, r1, a2, d2, l2, s2, r2 = (np.broadcast_to(v, (size,)).ravel() for v in arrays)
+    rng = rng or np.random.default_rng()
+
+    a1 = a1.astype(np.float64)
+    a2 = a2.astype(np.float64)
+    # 防御减伤与属性倍率在整场战斗中不变，提前算好
+    def_cut_on_p2 = d2 * 0.5
+    def_cut_on_p1 = d1 * 0.5
+    mult_1 = multipliers[r1.astype(np.intp), r2.astype(np.intp)]
+    mult_2 = multipliers[r2.astype(np.intp), r1.astype(np.intp)]
+
+    hp1 = (l1 * 10 + s1).astype(np.int64)
+    hp2 = (l2 * 10 + s2).astype(np.int64)
+    turns = np.zeros(size, dtype=np.int64)
+    dmg1 = np.zeros(size, dtype=np.int64)
+    dmg2 = np.zeros(size, dtype=np.int64)
+    hits1 = np.zeros(size, dtype=np.int64)
+    hits2 = np.zeros(size, dtype=np.int64)
+
+    # 只对仍在进行中的战斗做计算
+    active = np.flatnonzero((hp1 > 0) & (hp2 > 0))
+    while active.size and turns[active[0]] < MAX_TURNS:
+        turns[active] += 1
+
+        roll = rng.uniform(0.8, 1.2, active.size)
+        base = np.maximum(1, np.trunc(a1[active] * roll - def_cut_on_p2[active]))
+        hit = np.trunc(base * mult_1[active]).astype(np.int64)
+        hp2[active] -= hit
+        dmg1[active] += hit
+        hits1[active] += 1
+
+        # 后手方被击倒的战斗立即结束，其余战斗进行反击
+        active = active[hp2[active] > 0]
+        roll = rng.uniform(0.8, 1.2, active.size)
+        base = np.maximum(1, np.trunc(a2[active] * roll - def_cut_on_p1[active]))
+        hit = np.trunc(base * mult_2[active]).astype(np.int64)
+        hp1[active] -= hit
+        dmg2[active] += hit
+        hits2[active] += 1
+
+        active = active[hp1[active] > 0]
+
+    return BattleStats(p1_wins=hp1 > 0, turns=turns, p1_damage=dmg1, p2_damage=dmg2, p1_hits=hits1, p2_hits=hits2)
+
+
+def typical_stats(pet_info: dict, level: int) -> tuple[int, int]:
+    """某种族在给定等级下的期望攻防：初始值加上每级平均 1.5 点成长。"""
+    growth = round(1.5 * (level - 1))
+    stats = pet_info['initial_stats']
+    return stats['attack'] + growth, stats['defense'] + growth
+
+
+def matchup_table(pet_types: dict, multipliers: dict[tuple[str, str], float], level_a: int, level_b: int,
+                  battles: int = 10000, satiety: int = 100, rng: np.random.Generator | None = None) -> list[dict]:
+    """
+    计算所有种族两两对战（A 先手）的胜率表。
+    双方均使用 typical_stats 给出的期望属性和相同的饱食度。
+    """
+    rng = rng or np.random.default_rng()
+    species = list(pet_types)
+    attributes = sorted({info['attribute'] for info in pet_types.values()})
+    attr_index = {attr: i for i, attr in enumerate(attributes)}
+    matrix = attribute_matrix(attributes, multipliers)
+
+    rows = []
+    for name_a in species:
+        atk_a, def_a = typical_stats(pet_types[name_a], level_a)
+        for name_b in species:
+            atk_b, def_b = typical_stats(pet_types[name_b], level_b)
+            stats = simulate_battles(
+                atk_a, def_a, level_a, satiety, attr_index[pet_types[name_a]['attribute']],
+                atk_b, def_b, level_b, satiety, attr_index[pet_types[name_b]['attribute']],
+                matrix, n=battles, rng=rng)
+            summary = stats.summary()
+            rows.append({"attacker": name_a, "defender": name_b, **summary})
+    return rows
+
+
+@dataclass
+class RaidStats:
+    """一次世界 Boss 讨伐的逐人结果，数组长度等于参与人数。"""
+    damage: np.ndarray       # int，每人对 Boss 造成的总伤害
+    knocked_out: np.ndarray  # bool，是否被 Boss 击倒
+    rounds: int              # 讨伐持续的回合数
+    boss_hp: int             # Boss 剩余 HP
+    defeated: bool           # Boss 是否被击败
+
+
+def simulate_raid(attack, defense, level, satiety, attr, boss_attack: int, boss_defense: int, boss_attr: int,
+                  boss_hp: int, multipliers: np.ndarray, max_rounds: int,
+                  rng: np.random.Generator | None = None) -> RaidStats:
+    """
+    所有参与者同时与一个共享 HP 的 Boss 交战，每回合对全部参与者做一次向量化计算。
+    伤害公式与 battle.run_battle_core 一致：参与者先攻击，Boss 再对每名仍然站着的参与者反击；
+    参与者 HP = 等级*10 + 饱食度，被击倒后不再出手。Boss HP 归零或达到 max_rounds 回合时结束。
+    参与者参数是长度为 n 的数组（attr 为 multipliers 的下标）。
+    """
+    rng = rng or np.random.default_rng()
+    attack = np.asarray(attack, dtype=np.float64)
+    size = attack.size
+    hp = (np.asarray(level) * 10 + np.asarray(satiety)).astype(np.int64)
+    attr = np.asarray(attr, dtype=np.intp)
+    mult_out = multipliers[attr, boss_attr]
+    mult_in = multipliers[boss_attr, attr]
+    cut_on_boss = boss_defense * 0.5
+    cut_on_pets = np.asarray(defense) * 0.5
+
+    damage = np.zeros(size, dtype=np.int64)
+    active = np.flatnonzero(hp > 0)
+    rounds = 0
+    while active.size and boss_hp > 0 and rounds < max_rounds:
+        rounds += 1
+        roll = rng.uniform(0.8, 1.2, active.size)
+        base = np.maximum(1, np.trunc(attack[active] * roll - cut_on_boss))
+        hit = np.trunc(base * mult_out[active]).astype(np.int64)
+        damage[active] += hit
+        boss_hp -= int(hit.sum())
+        if boss_hp <= 0:
+            break
+
+        roll = rng.uniform(0.8, 1.2, active.size)
+        base = np.maximum(1, np.trunc(boss_attack * roll - cut_on_pets[active]))
+        hp[active] -= np.trunc(base * mult_in[active]).astype(np.int64)
+        active = active[hp[active] > 0]
+
+    return RaidStats(damage=damage, knocked_out=hp <= 0, rounds=rounds, boss_hp=max(0, boss_hp),
+                     defeated=boss_hp <= 0)
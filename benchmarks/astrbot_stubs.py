@@ -0,0 +1,147 @@
+"""
+离线运行基准测试用的 astrbot 替身模块。
+只提供插件导入和调用命令处理函数时用到的最小接口，数据目录指向临时目录。
+"""
+import importlib
+import logging
+import sys
+import types
+from pathlib import Path
+
+ASTRBOT_MODULES = (
+    "astrbot",
+    "astrbot.api",
+    "astrbot.api.event",
+    "astrbot.api.star",
+    "astrbot.api.message_components",
+    "astrbot.core",
+    "astrbot.core.message",
+    "astrbot.core.message.components",
+    "astrbot.core.platform",
+    "astrbot.core.platform.sources",
+    "astrbot.core.platform.sources.aiocqhttp",
+    "astrbot.core.platform.sources.aiocqhttp.aiocqhttp_message_event",
+    "astrbot.core.star",
+)
+
+
+class _Filter:
+    class PermissionType:
+        ADMIN = "admin"
+        MEMBER = "member"
+
+    def command(self, *args, **kwargs):
+        return lambda func: func
+
+    def permission_type(self, *args, **kwargs):
+        return lambda func: func
+
+
+class At:
+    def __init__(self, qq):
+        self.qq = qq
+
+
+class Plain:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class Image:
+    def __init__(self, file):
+        self.file = file
+
+    @classmethod
+    def fromBytes(cls, data: bytes):
+        return cls(data)
+
+    @classmethod
+    def fromFileSystem(cls, path: str):
+        return cls(path)
+
+
+class MessageChain(list):
+    def message(self, text: str):
+        self.append(Plain(text))
+        return self
+
+
+class FakeEvent:
+    """模拟一条群消息，命令处理函数产出的结果以 (类型, 内容) 元组返回。"""
+
+    def __init__(self, sender_id: str, group_id: str, at: str | None = None, sender_name: str = "tester"):
+        self.sender_id = sender_id
+        self.group_id = group_id
+        self.sender_name = sender_name
+        self.messages = [At(at)] if at else []
+        self.unified_msg_origin = f"fake:GroupMessage:{group_id}"
+
+    def get_sender_id(self):
+        return self.sender_id
+
+    def get_group_id(self):
+        return self.group_id
+
+    def get_sender_name(self):
+        return self.sender_name
+
+    def get_self_id(self):
+        return "0"
+
+    def get_messages(self):
+        return self.messages
+
+    def plain_result(self, text):
+        return "text", text
+
+    def image_result(self, path):
+        return "image", path
+
+    def chain_result(self, chain):
+        return "chain", chain
+
+
+class Star:
+    def __init__(self, context):
+        self.context = context
+
+
+def install(data_root: Path):
+    """注册 astrbot 替身模块；StarTools.get_data_dir 返回 data_root 下的子目录。"""
+    modules = {}
+    for name in ASTRBOT_MODULES:
+        modules[name] = sys.modules[name] = types.ModuleType(name)
+
+    api = modules["astrbot.api"]
+    api.logger = logging.getLogger("astrbot")
+    api.AstrBotConfig = dict
+
+    event = modules["astrbot.api.event"]
+    event.filter = _Filter()
+    event.AstrMessageEvent = FakeEvent
+    event.MessageChain = MessageChain
+
+    star = modules["astrbot.api.star"]
+    star.Context = object
+    star.Star = Star
+    star.register = lambda *args, **kwargs: (lambda cls: cls)
+
+    components = modules["astrbot.api.message_components"]
+    components.At, components.Plain, components.Image = At, Plain, Image
+    modules["astrbot.core.message.components"].At = At
+    modules["astrbot.core.platform.sources.aiocqhttp.aiocqhttp_message_event"].AiocqhttpMessageEvent = FakeEvent
+
+    class StarTools:
+        @staticmethod
+        def get_data_dir(name: str) -> Path:
+            return Path(data_root) / name
+
+    modules["astrbot.core.star"].StarTools = StarTools
+
+
+def load_plugin(plugin_root: Path, package: str = "pet_plugin"):
+    """把插件目录作为包导入（插件内部使用相对导入），返回 main 模块。"""
+    pkg = types.ModuleType(package)
+    pkg.__path__ = [str(plugin_root)]
+    sys.modules[package] = pkg
+    return importlib.import_module(f"{package}.main")
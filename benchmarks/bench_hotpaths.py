@@ -0,0 +1,321 @@
+"""
+插件热点路径的微基准测试，不需要安装 AstrBot，也不会接触真实的数据目录。
+
+用法（在插件根目录下执行）：
+    python benchmarks/bench_hotpaths.py                   # 运行全部用例，并与 baseline.json 对比
+    python benchmarks/bench_hotpaths.py -k battle -n 500  # 只运行名称包含 battle 的用例
+    python benchmarks/bench_hotpaths.py --save-baseline   # 把本次结果保存为新的基线
+
+与基线对比时按 p50 耗时折算吞吐量，并先用一段固定的纯 Python 校准负载换算两台机器的速度差异：
+基线吞吐量乘以 (本机校准速度 / 基线校准速度) 作为本机的预期值，低于预期超过 --tolerance 的用例会被标出。
+校准只能消除整体的快慢差异：数据库、图片渲染与纯 Python 代码的速度比例在不同机器上并不相同，
+单次耗时超过调度时间片的用例（如 status_image_cold）还会受机器负载影响，默认容差因此取 30%。
+"""
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+PLUGIN_ROOT = BENCH_DIR.parent
+DEFAULT_BASELINE = BENCH_DIR / "baseline.json"
+
+sys.path.insert(0, str(BENCH_DIR))
+import astrbot_stubs  # noqa: E402
+
+
+class _NoProvider:
+    def get_using_provider(self):
+        return None
+
+    async def send_message(self, *args, **kwargs):
+        pass
+
+
+def _llm_output(size_kb: int) -> str:
+    """构造一段很长的 LLM 回复：大量叙述文字，末尾才是 JSON 代码块。"""
+    filler = "今天天气晴朗，宠物们在草地上奔跑，{追逐} 着蝴蝶。" * (size_kb * 1024 // 60)
+    events = [{"description": f"{{pet_name}}遇到了第{i}只小鸟。", "reward_type": "mood",
+               "reward_value": 10, "money_gain": 3} for i in range(5)]
+    return f"{filler}\n```json\n{json.dumps(events, ensure_ascii=False, indent=2)}\n```\n"
+
+
+async def _drain(handler) -> list:
+    return [result async for result in handler]
+
+
+async def build_cases(main, plugin, walks: int) -> dict:
+    """准备测试数据，返回 用例名 -> 无参协程函数。walks 为散步用例最多会执行的次数。"""
+    group = "10000"
+    now = datetime.now()
+
+    # 两只常驻缓存的宠物：一只刚结算过衰减，一只已离线 50 小时
+    for user_id in ("1", "2"):
+        await _drain(plugin.adopt_pet(astrbot_stubs.FakeEvent(user_id, group), f"宠物{user_id}"))
+    await plugin.cache.update_pet("1", group, last_updated_time=now.isoformat())
+    await plugin.cache.update_pet("2", group, last_updated_time=(now - timedelta(hours=50)).isoformat())
+    await plugin.cache.adjust_pet("1", group, money=10 ** 9)
+    await plugin.cache.add_item("1", group, "普通口粮", 10 ** 9)
+    # 另一个群的 100 只宠物，用于测量批量落盘
+    flush_group = "20000"
+    for user_id in range(100):
+        await _drain(plugin.adopt_pet(astrbot_stubs.FakeEvent(str(user_id), flush_group), f"落盘{user_id}"))
+    # 散步结算以数据库中的冷却为准，每次都换一只冷却已经结束的宠物
+    walk_group = "30000"
+    for user_id in range(walks):
+        await _drain(plugin.adopt_pet(astrbot_stubs.FakeEvent(str(user_id), walk_group), f"散步{user_id}"))
+    await plugin.cache.flush()
+
+    level_up_pet = {"pet_name": "升级", "level": 5, "exp": 0, "attack": 10, "defense": 10}
+    multi_level_exp = sum(main.exp_for_next_level(level) for level in range(5, 15)) + 7
+
+    balanced = ({"pet_name": "甲", "pet_type": "水灵灵", "level": 20, "attack": 38, "defense": 42, "satiety": 100},
+                {"pet_name": "乙", "pet_type": "火小犬", "level": 20, "attack": 42, "defense": 38, "satiety": 100})
+    high_defense = ({"pet_name": "矛", "pet_type": "草叶猫", "level": 30, "attack": 25, "defense": 200, "satiety": 100},
+                    {"pet_name": "盾", "pet_type": "草叶猫", "level": 30, "attack": 25, "defense": 200, "satiety": 100})
+
+    status_pet = await plugin._get_pet("1", group)
+    cold_counter = iter(range(10 ** 9))
+    llm_text = _llm_output(200)
+    brace_text = llm_text.replace("```json", "").replace("```", "")
+    encounters = sys.modules[main.__package__ + ".encounters"]
+    stat_names = plugin.content.current.stat_names
+    walker = astrbot_stubs.FakeEvent("1", group)
+    walkers = iter([astrbot_stubs.FakeEvent(str(user_id), walk_group) for user_id in range(walks)])
+    ratelimit = sys.modules[main.__package__ + ".ratelimit"]
+    spam_gate = ratelimit.RateGate(plugin.rate_gate.cooldowns, user_rate=1e-9, user_burst=1, group_rate=0)
+    spammer = astrbot_stubs.FakeEvent("1", group)
+
+    async def get_pet_fresh():
+        await plugin._get_pet("1", group)
+
+    async def get_pet_decay():
+        await plugin._get_pet("2", group)
+
+    async def level_up_multi():
+        pet = dict(level_up_pet, exp=multi_level_exp)
+        plugin._apply_level_up(pet)
+
+    async def battle_balanced():
+        plugin._run_battle(*balanced)
+
+    async def battle_high_defense():
+        plugin._run_battle(*high_defense)
+
+    async def status_image_cold():
+        # 每次经验值都不同，缓存键随之变化，必然触发一次完整渲染
+        pet = dict(status_pet, exp=next(cold_counter))
+        await plugin._generate_pet_status_image(pet, "tester")
+
+    async def status_image_warm():
+        await plugin._generate_pet_status_image(status_pet, "tester")
+
+    async def extract_json_codeblock():
+        for _ in encounters.iter_json_objects(llm_text):
+            pass
+
+    async def extract_json_braces():
+        for _ in encounters.iter_json_objects(brace_text):
+            pass
+
+    async def parse_encounter_batch():
+        for data in encounters.iter_json_objects(llm_text):
+            encounters.parse_encounter(data, stat_names)
+
+    async def buy_item():
+        await _drain(plugin.buy_item(walker, "普通口粮", 1))
+
+    async def feed_pet_item():
+        await _drain(plugin.feed_pet_item(walker, "普通口粮"))
+
+    async def walk_settle():
+        # 包含奇遇/野外战斗和一次完整的结算事务
+        await _drain(plugin.walk_pet(next(walkers)))
+
+    async def rate_gate_reject():
+        # 令牌已耗尽的玩家请求状态卡，在入口被拒绝，不触及缓存、数据库和渲染
+        gate, plugin.rate_gate = plugin.rate_gate, spam_gate
+        try:
+            await _drain(plugin.my_pet_status(spammer))
+        finally:
+            plugin.rate_gate = gate
+
+    async def cache_flush_100():
+        for user_id in range(100):
+            await plugin.cache.adjust_pet(str(user_id), flush_group, money=1)
+        await plugin.cache.flush()
+
+    return {
+        "get_pet_fresh": get_pet_fresh,
+        "get_pet_decay": get_pet_decay,
+        "level_up_multi": level_up_multi,
+        "battle_balanced": battle_balanced,
+        "battle_high_defense": battle_high_defense,
+        "status_image_cold": status_image_cold,
+        "status_image_warm": status_image_warm,
+        "extract_json_codeblock": extract_json_codeblock,
+        "extract_json_braces": extract_json_braces,
+        "parse_encounter_batch": parse_encounter_batch,
+        "buy_item": buy_item,
+        "feed_pet_item": feed_pet_item,
+        "walk_settle": walk_settle,
+        "rate_gate_reject": rate_gate_reject,
+        "cache_flush_100": cache_flush_100,
+    }
+
+
+def _calibration_workload():
+    """与插件代码无关的固定负载：字典、字符串格式化、排序和 JSON，覆盖热点路径中最常见的解释器操作。"""
+    table = {f"key{i}": i * 7 % 101 for i in range(200)}
+    text = "".join(f"{key}={value};" for key, value in table.items())
+    ranked = sorted(table.items(), key=lambda item: (-item[1], item[0]))
+    return json.loads(json.dumps({"text": text, "ranked": ranked[:50]}))
+
+
+def calibrate(iterations: int = 2000) -> float:
+    """校准负载按 p50 耗时折算的每秒执行次数；与用例的统计方式一致，其他进程抢占 CPU 时两者受到的影响相同。"""
+    samples = []
+    perf_counter_ns = time.perf_counter_ns
+    for _ in range(iterations):
+        start = perf_counter_ns()
+        _calibration_workload()
+        samples.append(perf_counter_ns() - start)
+    return 1e9 / statistics.median(samples)
+
+
+# 渲染和数据库用例单次耗时较长，迭代次数按比例缩小
+SLOW_CASES = {"status_image_cold": 0.05, "walk_settle": 0.25, "cache_flush_100": 0.25}
+
+
+def iterations_for(name: str, n: int) -> int:
+    return max(10, int(n * SLOW_CASES.get(name, 1.0)))
+
+
+async def measure(func, iterations: int, warmup: int) -> dict:
+    for _ in range(warmup):
+        await func()
+    samples = []
+    perf_counter_ns = time.perf_counter_ns
+    for _ in range(iterations):
+        start = perf_counter_ns()
+        await func()
+        samples.append(perf_counter_ns() - start)
+    samples.sort()
+    total_s = sum(samples) / 1e9
+
+    def pct(q: float) -> float:
+        return samples[min(len(samples) - 1, int(q * len(samples)))] / 1000
+
+    return {
+        "iterations": iterations,
+        "ops_per_sec": iterations / total_s if total_s else float("inf"),
+        "mean_us": statistics.fmean(samples) / 1000,
+        "p50_us": pct(0.50),
+        "p95_us": pct(0.95),
+        "p99_us": pct(0.99),
+        "max_us": samples[-1] / 1000,
+    }
+
+
+def print_report(results: dict, baseline: dict | None, tolerance: float, calibration: float) -> int:
+    """打印结果表格，返回按 p50 折算的吞吐量比基线预期下降超过 tolerance 的用例数。"""
+    base_cases = (baseline or {}).get("cases", {})
+    speed = 1.0
+    if baseline and baseline.get("calibration"):
+        speed = calibration / baseline["calibration"]
+        print(f"本机速度为基线机器的 {speed:.2f} 倍（校准负载），基线吞吐量已按此换算")
+    elif baseline:
+        print("基线中没有校准数据，直接与基线的数值对比")
+    print(f"{'case':<24}{'ops/s':>12}{'p50 us':>11}{'p95 us':>11}{'p99 us':>11}{'vs base':>10}")
+    regressions = 0
+    for name, res in results.items():
+        delta = ""
+        base = base_cases.get(name)
+        if base:
+            # 均值容易被个别慢样本（GC、磁盘）拉偏，对比用 p50 折算的吞吐量
+            change = base["p50_us"] / (res["p50_us"] * speed) - 1
+            delta = f"{change:+.0%}"
+            if change < -tolerance:
+                delta += " !"
+                regressions += 1
+        print(f"{name:<24}{res['ops_per_sec']:>12.1f}{res['p50_us']:>11.1f}{res['p95_us']:>11.1f}"
+              f"{res['p99_us']:>11.1f}{delta:>10}")
+    return regressions
+
+
+async def run(args) -> int:
+    random.seed(args.seed)
+    calibration = calibrate()
+    with tempfile.TemporaryDirectory(prefix="pet_bench_") as data_root:
+        astrbot_stubs.install(Path(data_root))
+        main = astrbot_stubs.load_plugin(PLUGIN_ROOT)
+        # 入口限流会拦下同一玩家的反复调用，测量命令本身时关闭；闸门另有单独的用例
+        config = {"encounter_pool_size": 0, "encounter_latency_budget": 0.5, "pet_cache_flush_interval": 3600,
+                  "rate_limit_user_rate": 0, "rate_limit_group_rate": 0}
+        plugin = main.PetPlugin(_NoProvider(), config)
+        await plugin.initialize()
+        try:
+            walks = iterations_for("walk_settle", args.n) * 11 // 10 + 1
+            cases = await build_cases(main, plugin, walks)
+            if args.k:
+                cases = {name: func for name, func in cases.items() if args.k in name}
+            # 缺少素材（如未放置 font.ttf）时渲染用例无法运行，直接跳过
+            probe = await plugin._generate_pet_status_image(await plugin._get_pet("1", "10000"), "probe")
+            if isinstance(probe, str):
+                print(f"跳过状态卡用例: {probe}")
+                cases = {name: func for name, func in cases.items() if not name.startswith("status_image")}
+
+            results = {}
+            for name, func in cases.items():
+                iterations = iterations_for(name, args.n)
+                results[name] = await measure(func, iterations, warmup=max(1, iterations // 10))
+        finally:
+            await plugin.terminate()
+    # 运行前后各校准一次，取较快的一次，减少机器负载波动的影响
+    calibration = max(calibration, calibrate())
+
+    baseline = None
+    if args.baseline.exists() and not args.save_baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    regressions = print_report(results, baseline, args.tolerance, calibration)
+
+    if args.save_baseline:
+        payload = {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "calibration": calibration,
+            "cases": results,
+        }
+        args.baseline.write_text(json.dumps(payload, indent=2) + "\n", encoding="utf-8")
+        print(f"基线已保存到 {args.baseline}")
+    elif regressions:
+        print(f"{regressions} 个用例的吞吐量比基线预期下降超过 {args.tolerance:.0%}")
+        return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="宠物插件热点路径基准测试")
+    parser.add_argument("-n", type=int, default=2000, help="每个用例的迭代次数（慢用例按比例减少）")
+    parser.add_argument("-k", default="", help="只运行名称包含该字符串的用例")
+    parser.add_argument("--seed", type=int, default=20240601)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.3,
+                        help="允许的吞吐量下降比例（按校准换算后），超过时返回非零退出码")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
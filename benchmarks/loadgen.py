@@ -0,0 +1,298 @@
+"""
+端到端的群聊流量模拟：用伪造的群消息事件驱动真实的命令处理函数，LLM 由本地替身代替。
+按泊松过程到达的命令并发执行，最后报告吞吐量、各命令耗时分位数、事件循环延迟和数据库写锁等待。
+
+用法（在插件根目录下执行）：
+    python benchmarks/loadgen.py --groups 200 --users 20 --rate 300 --duration 30
+    python benchmarks/loadgen.py --mix "我的宠物=40,散步=30,对决=10,购买=10,投喂=10" --llm-latency 2 --llm-fail 0.1
+    python benchmarks/loadgen.py --config '{"storage_backend": "mysql", "mysql_password": "pet"}'
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+PLUGIN_ROOT = BENCH_DIR.parent
+
+sys.path.insert(0, str(BENCH_DIR))
+import astrbot_stubs  # noqa: E402
+
+DEFAULT_MIX = "领养宠物=5,我的宠物=30,散步=25,对决=10,购买=15,投喂=15"
+
+
+class StubResponse:
+    def __init__(self, text: str):
+        self.completion_text = text
+
+
+class StubProvider:
+    """本地 LLM 替身：延迟服从对数正态分布，按给定概率失败，按提示词要求的数量返回事件。"""
+
+    def __init__(self, latency: float, failure_rate: float, rng: random.Random):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.rng = rng
+        self.calls = 0
+        self.failures = 0
+
+    async def text_chat(self, prompt: str = "", **kwargs) -> StubResponse:
+        self.calls += 1
+        if self.latency > 0:
+            await asyncio.sleep(self.rng.lognormvariate(0, 0.5) * self.latency)
+        if self.rng.random() < self.failure_rate:
+            self.failures += 1
+            raise RuntimeError("stub provider failure")
+        match = re.search(r"生成 (\d+) 个", prompt)
+        count = int(match.group(1)) if match else 1
+        events = [{
+            "description": f"{{pet_name}}在路上遇到了第{self.rng.randint(1, 999)}号小伙伴。",
+            "reward_type": self.rng.choice(["exp", "mood", "satiety"]),
+            "reward_value": self.rng.randint(5, 30),
+            "money_gain": self.rng.randint(0, 10),
+        } for _ in range(count)]
+        return StubResponse(f"好的，这是新的奇遇：\n```json\n{json.dumps(events, ensure_ascii=False)}\n```")
+
+
+class StubContext:
+    def __init__(self, provider: StubProvider):
+        self.provider = provider
+
+    def get_using_provider(self):
+        return self.provider
+
+    async def send_message(self, *args, **kwargs):
+        pass
+
+
+class TimedLock(asyncio.Lock):
+    """记录每次获取锁前等待时间的 asyncio.Lock。"""
+
+    def __init__(self):
+        super().__init__()
+        self.waits: list[float] = []
+
+    async def acquire(self):
+        start = time.perf_counter()
+        result = await super().acquire()
+        self.waits.append(time.perf_counter() - start)
+        return result
+
+
+def parse_mix(text: str) -> dict[str, float]:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def percentiles(values: list[float], scale: float = 1000.0) -> dict:
+    """以毫秒为单位的分位数统计。"""
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def pct(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * scale, 2)
+
+    return {"count": len(ordered), "mean": round(statistics.fmean(ordered) * scale, 2),
+            "p50": pct(0.50), "p95": pct(0.95), "p99": pct(0.99), "max": round(ordered[-1] * scale, 2)}
+
+
+class LoadGenerator:
+    def __init__(self, plugin, args, rng: random.Random):
+        self.plugin = plugin
+        self.args = args
+        self.rng = rng
+        self.mix = parse_mix(args.mix)
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+        self.loop_lag: list[float] = []
+
+    def _random_player(self) -> tuple[str, str]:
+        group = 100000 + self.rng.randrange(self.args.groups)
+        user = 10_000_000 + (group - 100000) * self.args.users + self.rng.randrange(self.args.users)
+        return str(user), str(group)
+
+    def _handler(self, command: str):
+        user_id, group_id = self._random_player()
+        plugin = self.plugin
+        if command == "领养宠物":
+            return plugin.adopt_pet(astrbot_stubs.FakeEvent(user_id, group_id), None)
+        if command == "我的宠物":
+            return plugin.my_pet_status(astrbot_stubs.FakeEvent(user_id, group_id))
+        if command == "散步":
+            return plugin.walk_pet(astrbot_stubs.FakeEvent(user_id, group_id))
+        if command == "对决":
+            # 同群内随机挑一名对手，事件中带有 At 消息段
+            target = str(int(user_id) - int(user_id) % self.args.users + self.rng.randrange(self.args.users))
+            return plugin.duel_pet(astrbot_stubs.FakeEvent(user_id, group_id, at=target))
+        if command == "购买":
+            return plugin.buy_item(astrbot_stubs.FakeEvent(user_id, group_id), "普通口粮", self.rng.randint(1, 3))
+        if command == "投喂":
+            return plugin.feed_pet_item(astrbot_stubs.FakeEvent(user_id, group_id), "普通口粮")
+        if command == "宠物排行":
+            return plugin.pet_ranking(astrbot_stubs.FakeEvent(user_id, group_id))
+        raise ValueError(f"未知命令: {command}")
+
+    async def _run_command(self, command: str):
+        start = time.perf_counter()
+        try:
+            async for _ in self._handler(command):
+                pass
+        except Exception as e:
+            self.errors[command] += 1
+            logging.getLogger("loadgen").debug(f"{command} 失败: {e!r}")
+        self.latencies[command].append(time.perf_counter() - start)
+
+    async def _monitor_loop_lag(self, interval: float = 0.01):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(interval)
+            self.loop_lag.append(max(0.0, loop.time() - start - interval))
+
+    async def seed_players(self):
+        """先让一部分玩家领养宠物并放一些钱和口粮，模拟已经运行了一段时间的群。"""
+        count = int(self.args.groups * self.args.users * self.args.seed_fraction)
+        players = set()
+        while len(players) < count:
+            players.add(self._random_player())
+        # 预先领养不算玩家流量，暂时换上不限流的闸门
+        gate = self.plugin.rate_gate
+        self.plugin.rate_gate = type(gate)(gate.cooldowns, user_rate=0, group_rate=0)
+        try:
+            for user_id, group_id in players:
+                async for _ in self.plugin.adopt_pet(astrbot_stubs.FakeEvent(user_id, group_id), None):
+                    pass
+                await self.plugin.cache.adjust_pet(user_id, group_id, money=200)
+                await self.plugin.cache.add_item(user_id, group_id, "普通口粮", 5)
+        finally:
+            self.plugin.rate_gate = gate
+        await self.plugin.cache.flush()
+        return len(players)
+
+    async def run(self) -> float:
+        """按泊松过程发送命令，直到 duration 秒后停止发送并等待所有命令完成，返回总耗时。"""
+        commands, weights = list(self.mix), list(self.mix.values())
+        monitor = asyncio.create_task(self._monitor_loop_lag())
+        tasks = set()
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        next_arrival = start
+        while next_arrival - start < self.args.duration:
+            delay = next_arrival - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            command = self.rng.choices(commands, weights)[0]
+            task = asyncio.create_task(self._run_command(command))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            next_arrival += self.rng.expovariate(self.args.rate)
+        if tasks:
+            await asyncio.gather(*tasks)
+        elapsed = loop.time() - start
+        monitor.cancel()
+        return elapsed
+
+
+async def main_async(args) -> dict:
+    rng = random.Random(args.seed)
+    random.seed(args.seed)
+    with tempfile.TemporaryDirectory(prefix="pet_load_") as data_root:
+        astrbot_stubs.install(Path(data_root))
+        main = astrbot_stubs.load_plugin(PLUGIN_ROOT)
+        provider = StubProvider(args.llm_latency, args.llm_fail, rng)
+        config = json.loads(args.config) if args.config else {}
+        plugin = main.PetPlugin(StubContext(provider), config)
+        await plugin.initialize()
+        write_lock = TimedLock()
+        # 只有 SQLite 后端使用进程内的写锁；MySQL 后端的写入等待体现在连接池和行锁上
+        if hasattr(plugin.repo, "_write_lock"):
+            plugin.repo._write_lock = write_lock
+        try:
+            generator = LoadGenerator(plugin, args, rng)
+            seeded = await generator.seed_players()
+            write_lock.waits.clear()
+            elapsed = await generator.run()
+        finally:
+            await plugin.terminate()
+
+    completed = sum(len(v) for v in generator.latencies.values())
+    return {
+        "config": {k: v for k, v in vars(args).items() if k != "json"},
+        "seeded_players": seeded,
+        "elapsed_s": round(elapsed, 2),
+        "completed": completed,
+        "throughput_per_s": round(completed / elapsed, 1),
+        "commands": {name: {**percentiles(values), "errors": generator.errors.get(name, 0)}
+                     for name, values in sorted(generator.latencies.items())},
+        "event_loop_lag_ms": percentiles(generator.loop_lag),
+        "db_write_lock_wait_ms": percentiles(write_lock.waits),
+        "llm": {"calls": provider.calls, "failures": provider.failures, **plugin.encounters.stats()},
+        "card_cache": {"hits": plugin.card_cache.hits, "misses": plugin.card_cache.misses},
+        "rate_limited": rejections(plugin.metrics),
+    }
+
+
+def rejections(metrics) -> dict:
+    """入口闸门按原因（user / group / cooldown）拒绝的命令数。"""
+    totals = {}
+    for (name, labels), value in metrics._counters.items():
+        if name == "ratelimit_rejections_total":
+            reason = dict(labels)["reason"]
+            totals[reason] = totals.get(reason, 0) + int(value)
+    return totals
+
+
+def print_report(report: dict):
+    print(f"持续 {report['elapsed_s']}s，完成 {report['completed']} 条命令，"
+          f"吞吐量 {report['throughput_per_s']}/s（预先领养 {report['seeded_players']} 只宠物）")
+    print(f"\n{'command':<10}{'count':>8}{'mean':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}{'errors':>8}  (ms)")
+    for name, stats in report["commands"].items():
+        print(f"{name:<10}{stats['count']:>8}{stats['mean']:>9}{stats['p50']:>9}{stats['p95']:>9}"
+              f"{stats['p99']:>9}{stats['max']:>9}{stats['errors']:>8}")
+    for title, key in (("事件循环延迟", "event_loop_lag_ms"), ("数据库写锁等待", "db_write_lock_wait_ms")):
+        stats = report[key]
+        if stats["count"]:
+            print(f"\n{title}: 次数 {stats['count']}  p50 {stats['p50']}ms  p95 {stats['p95']}ms  "
+                  f"p99 {stats['p99']}ms  max {stats['max']}ms")
+    print(f"\nLLM: {report['llm']}")
+    print(f"状态卡缓存: {report['card_cache']}")
+    print(f"入口拦截: {report['rate_limited']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="宠物插件端到端负载模拟")
+    parser.add_argument("--groups", type=int, default=200, help="群数量")
+    parser.add_argument("--users", type=int, default=20, help="每个群的活跃用户数")
+    parser.add_argument("--seed-fraction", type=float, default=0.8, help="开始前已经领养宠物的用户比例")
+    parser.add_argument("--rate", type=float, default=200.0, help="平均每秒到达的命令数")
+    parser.add_argument("--duration", type=float, default=20.0, help="发送命令的持续时间（秒）")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="命令权重，例如 \"我的宠物=30,散步=25\"")
+    parser.add_argument("--llm-latency", type=float, default=1.5, help="替身 LLM 的中位延迟（秒）")
+    parser.add_argument("--llm-fail", type=float, default=0.05, help="替身 LLM 的失败概率")
+    parser.add_argument("--config", default="", help="以 JSON 传入的插件配置，例如 '{\"render_workers\": 4}'")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", type=Path, help="把完整报告写入该 JSON 文件")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.ERROR)
+
+    report = asyncio.run(main_async(args))
+    print_report(report)
+    if args.json:
+        args.json.write_text(json.dumps(report, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
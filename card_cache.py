@@ -0,0 +1,184 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Awaitable, Callable
+
+# 状态卡的布局或绘制逻辑变化时递增，使旧缓存全部失效
+CARD_LAYOUT_VERSION = 1
+
+
+class CardCache:
+    """
+    按内容寻址的状态卡缓存。
+    缓存键由图上实际绘制的字段计算得到，字段不变时直接复用已有图片，不做任何 Pillow 工作；
+    总大小和条目年龄都有上限，超出时按最近最少使用淘汰。
+    in_memory 为 True 时图片字节只保存在内存中，完全不读写磁盘；否则保存为 cache_dir 下的文件。
+    被淘汰的文件在 unlink_delay 秒后才删除，刚返回给调用方、还没发送出去的图片不会消失。
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int = 64 * 1024 * 1024, max_age: float = 86400.0,
+                 prefix: str = "card_", suffix: str = ".png", in_memory: bool = False,
+                 unlink_delay: float = 60.0):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.prefix = prefix
+        self.suffix = suffix
+        self.in_memory = in_memory
+        self.unlink_delay = unlink_delay
+        # key -> (大小, 生成时间, 内存模式下的图片字节)，按最近访问顺序排列
+        self._entries: OrderedDict[str, tuple[int, float, bytes | None]] = OrderedDict()
+        self._total_bytes = 0
+        # 已淘汰、等待删除的文件 -> 可以删除的时刻（time.monotonic()）
+        self._doomed: dict[Path, float] = {}
+        self._inflight: dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(fields: dict) -> str:
+        payload = json.dumps([CARD_LAYOUT_VERSION, fields], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def path_for(self, key: str) -> Path:
+        return self.cache_dir / f"{self.prefix}{key}{self.suffix}"
+
+    def load(self):
+        """
+        扫描缓存目录恢复索引（按修改时间排序），并清理旧版本按玩家命名的状态图和未完成的临时文件。
+        涉及文件 I/O，应在线程中调用。
+        """
+        for stale in (*self.cache_dir.glob("status_*.png"), *self.cache_dir.glob("*.tmp")):
+            stale.unlink(missing_ok=True)
+        if self.in_memory:
+            return
+        found = []
+        for path in self.cache_dir.glob(f"{self.prefix}*{self.suffix}"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            key = path.name[len(self.prefix):-len(self.suffix)]
+            found.append((stat.st_mtime, key, stat.st_size))
+        for mtime, key, size in sorted(found):
+            self._entries[key] = (size, mtime, None)
+            self._total_bytes += size
+        self._unlink(self._evict())
+
+    def _drop(self, key: str) -> Path | None:
+        """从索引中移除条目，返回需要删除的文件（内存模式下为 None）。"""
+        size, _, _ = self._entries.pop(key)
+        self._total_bytes -= size
+        return None if self.in_memory else self.path_for(key)
+
+    def _evict(self) -> list[Path]:
+        """
+        先淘汰过期条目，再从最久未访问的开始淘汰，直到总大小回到上限以内。
+        只修改索引，返回需要删除的文件，由调用方在线程中删除。
+        """
+        deadline = time.time() - self.max_age
+        dropped = [self._drop(k) for k in [k for k, (_, created, _) in self._entries.items() if created < deadline]]
+        while self._total_bytes > self.max_bytes and self._entries:
+            dropped.append(self._drop(next(iter(self._entries))))
+        return [path for path in dropped if path is not None]
+
+    @staticmethod
+    def _unlink(paths: list[Path]):
+        for path in paths:
+            path.unlink(missing_ok=True)
+
+    async def _remove_files(self, paths: list[Path]):
+        """把淘汰的文件记为待删除，并删除其中已经到期的；没有后台任务，到期的文件在之后的调用中顺带删除。"""
+        now = time.monotonic()
+        for path in paths:
+            self._doomed.setdefault(path, now + self.unlink_delay)
+        due = [path for path, deadline in self._doomed.items() if deadline <= now]
+        for path in due:
+            del self._doomed[path]
+        if due:
+            await asyncio.to_thread(self._unlink, due)
+
+    @staticmethod
+    def _write_file(path: Path, data: bytes):
+        """先写临时文件再原子替换，缓存目录里不会出现写了一半的图片；失败时删除临时文件。"""
+        tmp_path = path.with_name(f"{path.name}.{time.monotonic_ns():x}.tmp")
+        try:
+            tmp_path.write_bytes(data)
+            tmp_path.replace(path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+    async def lookup(self, key: str) -> Path | bytes | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        _, created, data = entry
+        if created < time.time() - self.max_age:
+            await self._remove_files([path for path in (self._drop(key),) if path is not None])
+            return None
+        if data is None:
+            path = self.path_for(key)
+            if not await asyncio.to_thread(path.exists):  # 被外部清理过
+                stale = self._entries.pop(key, None)
+                if stale is not None:
+                    self._total_bytes -= stale[0]
+                return None
+            data = path
+        if key in self._entries:
+            self._entries.move_to_end(key)
+        return data
+
+    def store(self, key: str, data: bytes) -> list[Path]:
+        """记录一个条目，返回因此被淘汰、需要删除的文件。"""
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._total_bytes -= old[0]
+        self._entries[key] = (len(data), time.time(), data if self.in_memory else None)
+        self._total_bytes += len(data)
+        return self._evict()
+
+    async def get_or_render(self, key: str, render: Callable[[], Awaitable[bytes]]) -> Path | bytes:
+        """
+        命中则直接返回文件路径或图片字节；否则调用 render 生成图片字节。
+        文件模式下图片在线程中写入缓存目录后返回路径；内存模式下直接返回字节。
+        单张图片就超过 max_bytes 时不缓存，直接返回字节。相同键的并发请求只渲染一次。
+        """
+        cached = await self.lookup(key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.hits += 1
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            # 渲染超时后工作线程仍可能在运行，因此由缓存自己写文件，放弃等待的渲染不会在磁盘上留下任何东西
+            data = await render()
+            result: Path | bytes = data
+            if len(data) <= self.max_bytes:
+                if not self.in_memory:
+                    result = self.path_for(key)
+                    # 同一个键刚被淘汰又重新渲染时，新写入的文件不能再被删除
+                    self._doomed.pop(result, None)
+                    await asyncio.to_thread(self._write_file, result, data)
+                await self._remove_files(self.store(key, data))
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # 没有其他等待者时避免警告
+            raise
+        finally:
+            del self._inflight[key]
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
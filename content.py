@@ -0,0 +1,281 @@
+import asyncio
+import json
+import shutil
+from dataclasses import dataclass
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Callable, Mapping
+
+import numpy as np
+import yaml
+from watchfiles import awatch
+
+from astrbot.api import logger
+
+from .battle import build_multipliers
+from .battle_sim import attribute_matrix
+
+# 插件自带的默认内容，首次启动时复制到数据目录
+DEFAULT_CONTENT_PATH = Path(__file__).parent / "game_content.yaml"
+CONTENT_FILE_NAMES = ("game_content.yaml", "game_content.yml", "game_content.json")
+# 奇遇奖励和投喂会修改的状态，每个都必须有中文名
+STAT_KEYS = ("exp", "mood", "satiety")
+
+
+class ContentError(ValueError):
+    """游戏内容文件不合法，消息中指出出错的位置。"""
+
+
+@dataclass(frozen=True, slots=True)
+class GameContent:
+    """
+    校验并编译后的游戏内容，所有表都是只读视图，重新加载时整体替换而不是原地修改。
+    pet_types / shop_items 与原先的 PET_TYPES / SHOP_ITEMS 结构相同（进化阶段的键为整数）。
+    """
+    pet_types: Mapping[str, Mapping[str, Any]]
+    species: tuple[str, ...]  # 全部种族，野外遭遇时从中随机抽取
+    starters: tuple[str, ...]  # 可以被领养到的种族
+    multipliers: Mapping[tuple[str, str], float]  # (攻击方属性, 防御方属性) -> 伤害倍率
+    attribute_index: Mapping[str, int]  # 属性 -> attribute_matrix 的下标
+    attribute_matrix: np.ndarray  # 只读，批量模拟使用的倍率矩阵 [攻击方, 防御方]
+    shop_items: Mapping[str, Mapping[str, Any]]
+    foods: Mapping[str, Mapping[str, Any]]  # 可以投喂的物品
+    stat_names: Mapping[str, str]
+
+    def evolution(self, pet_type: str, stage: int) -> Mapping[str, Any]:
+        return self.pet_types[pet_type]['evolutions'][stage]
+
+
+def freeze(value):
+    """把嵌套的 dict / list 转换为只读的 MappingProxyType / tuple。"""
+    if isinstance(value, dict):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+def thaw(value):
+    """freeze 的逆操作，得到可以 pickle（传给渲染进程）的普通 dict / list。"""
+    if isinstance(value, Mapping):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(v) for v in value]
+    return value
+
+
+# --- 校验 ---
+def _mapping(value, where: str) -> dict:
+    if not isinstance(value, dict) or not value:
+        raise ContentError(f"{where} 必须是非空的映射")
+    return value
+
+
+def _text(value, where: str) -> str:
+    if not isinstance(value, str) or not value.strip():
+        raise ContentError(f"{where} 必须是非空字符串")
+    return value
+
+
+def _int(value, where: str, minimum: int = 0) -> int:
+    if isinstance(value, bool) or not isinstance(value, int) or value < minimum:
+        raise ContentError(f"{where} 必须是不小于 {minimum} 的整数")
+    return value
+
+
+def _number(value, where: str) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ContentError(f"{where} 必须是数字")
+    return float(value)
+
+
+def _compile_pet_type(name: str, info, attributes: set[str], assets_dir: Path | None) -> dict:
+    where = f"pet_types.{name}"
+    info = _mapping(info, where)
+    attribute = _text(info.get('attribute'), f"{where}.attribute")
+    if attributes and attribute not in attributes:
+        logger.warning(f"{where} 的属性「{attribute}」不在克制表中，与所有属性的倍率均为 1。")
+    stats = _mapping(info.get('initial_stats'), f"{where}.initial_stats")
+    initial_stats = {key: _int(stats.get(key), f"{where}.initial_stats.{key}", 1) for key in ("attack", "defense")}
+
+    raw_evolutions = _mapping(info.get('evolutions'), f"{where}.evolutions")
+    try:
+        stages = sorted(int(stage) for stage in raw_evolutions)  # JSON 的键只能是字符串
+    except (TypeError, ValueError):
+        raise ContentError(f"{where}.evolutions 的键必须是进化阶段序号") from None
+    if stages != list(range(1, len(stages) + 1)):
+        raise ContentError(f"{where}.evolutions 的阶段必须从 1 开始连续编号")
+    evolutions = {}
+    for stage, (key, evo) in zip(stages, sorted(raw_evolutions.items(), key=lambda item: int(item[0]))):
+        evo_where = f"{where}.evolutions.{key}"
+        evo = _mapping(evo, evo_where)
+        image = _text(evo.get('image'), f"{evo_where}.image")
+        if assets_dir is not None and not (assets_dir / image).is_file():
+            raise ContentError(f"{evo_where}.image 指向的图片 {image} 不存在")
+        evolve_level = evo.get('evolve_level')
+        if stage == stages[-1]:
+            if evolve_level is not None:
+                raise ContentError(f"{evo_where}.evolve_level 是最终形态，必须为 null")
+        else:
+            _int(evolve_level, f"{evo_where}.evolve_level", 1)
+        evolutions[stage] = {"name": _text(evo.get('name'), f"{evo_where}.name"), "image": image,
+                             "evolve_level": evolve_level}
+
+    adoptable = info.get('adoptable', True)
+    if not isinstance(adoptable, bool):
+        raise ContentError(f"{where}.adoptable 必须是 true 或 false")
+    return {
+        "attribute": attribute,
+        "description": str(info.get('description') or ""),
+        "initial_stats": initial_stats,
+        "evolutions": evolutions,
+        "adoptable": adoptable,
+    }
+
+
+def _compile_shop_item(name: str, item) -> dict:
+    where = f"shop_items.{name}"
+    item = _mapping(item, where)
+    return {
+        "price": _int(item.get('price'), f"{where}.price", 1),
+        "type": _text(item.get('type'), f"{where}.type"),
+        "satiety": _int(item.get('satiety', 0), f"{where}.satiety"),
+        "mood": _int(item.get('mood', 0), f"{where}.mood"),
+        "description": str(item.get('description') or ""),
+    }
+
+
+def compile_content(raw, assets_dir: Path | None = None) -> GameContent:
+    """校验原始内容并编译为 GameContent；给出 assets_dir 时同时检查立绘文件是否存在。"""
+    raw = _mapping(raw, "内容文件")
+
+    attrs = _mapping(raw.get('attributes'), "attributes")
+    effectiveness = _mapping(attrs.get('effectiveness'), "attributes.effectiveness")
+    for attacker, defender in effectiveness.items():
+        _text(attacker, "attributes.effectiveness 的键")
+        _text(defender, f"attributes.effectiveness.{attacker}")
+    super_effective = _number(attrs.get('super_effective', 1.2), "attributes.super_effective")
+    not_effective = _number(attrs.get('not_effective', 0.8), "attributes.not_effective")
+    if not super_effective > 1 > not_effective > 0:
+        raise ContentError("attributes 中必须满足 super_effective > 1 > not_effective > 0")
+    attributes = set(effectiveness) | set(effectiveness.values())
+
+    pet_types = {_text(name, "pet_types 的键"): _compile_pet_type(name, info, attributes, assets_dir)
+                 for name, info in _mapping(raw.get('pet_types'), "pet_types").items()}
+    starters = tuple(name for name, info in pet_types.items() if info['adoptable'])
+    if not starters:
+        raise ContentError("pet_types 中至少要有一个可以领养的种类")
+
+    shop_items = {_text(name, "shop_items 的键"): _compile_shop_item(name, item)
+                  for name, item in _mapping(raw.get('shop_items'), "shop_items").items()}
+
+    stat_names = _mapping(raw.get('stat_names'), "stat_names")
+    missing = [key for key in STAT_KEYS if key not in stat_names]
+    if missing:
+        raise ContentError(f"stat_names 缺少 {', '.join(missing)}")
+
+    multipliers = build_multipliers(effectiveness, (info['attribute'] for info in pet_types.values()),
+                                    super_effective, not_effective)
+    attribute_names = sorted({attacker for attacker, _ in multipliers})
+    matrix = attribute_matrix(attribute_names, multipliers)
+    matrix.flags.writeable = False
+    return GameContent(
+        pet_types=freeze(pet_types),
+        species=tuple(pet_types),
+        starters=starters,
+        multipliers=MappingProxyType(multipliers),
+        attribute_index=MappingProxyType({name: i for i, name in enumerate(attribute_names)}),
+        attribute_matrix=matrix,
+        shop_items=freeze(shop_items),
+        foods=freeze({name: item for name, item in shop_items.items() if item['type'] == 'food'}),
+        stat_names=freeze({key: _text(stat_names[key], f"stat_names.{key}") for key in STAT_KEYS}),
+    )
+
+
+def load_content(path: Path, assets_dir: Path | None = None) -> GameContent:
+    """读取并编译内容文件（按扩展名解析 YAML 或 JSON）。涉及文件 I/O，应在线程中调用。"""
+    text = path.read_text(encoding="utf-8")
+    try:
+        raw = json.loads(text) if path.suffix == ".json" else yaml.safe_load(text)
+    except (json.JSONDecodeError, yaml.YAMLError) as e:
+        raise ContentError(f"无法解析 {path.name}: {e}") from None
+    return compile_content(raw, assets_dir)
+
+
+def check_compatible(old: GameContent, new: GameContent):
+    """已有的种类和进化阶段可能正被玩家的宠物使用，新内容中必须保留。"""
+    for name, info in old.pet_types.items():
+        if name not in new.pet_types:
+            raise ContentError(f"不能删除已有的宠物种类「{name}」")
+        if len(new.pet_types[name]['evolutions']) < len(info['evolutions']):
+            raise ContentError(f"不能删除「{name}」已有的进化阶段")
+
+
+def find_content_file(data_dir: Path) -> Path:
+    """返回数据目录中的内容文件；不存在时复制一份默认内容。"""
+    for name in CONTENT_FILE_NAMES:
+        path = data_dir / name
+        if path.exists():
+            return path
+    path = data_dir / DEFAULT_CONTENT_PATH.name
+    shutil.copyfile(DEFAULT_CONTENT_PATH, path)
+    return path
+
+
+class ContentStore:
+    """
+    持有当前生效的游戏内容。
+    内容文件变化时在后台重新加载，校验通过后原子地替换 current；校验失败则保留旧内容并记录错误。
+    命令处理函数应在开头读取一次 current，整个命令使用同一份内容。
+    """
+
+    def __init__(self, data_dir: Path, assets_dir: Path | None = None,
+                 on_reload: Callable[[GameContent], None] | None = None):
+        self.path = find_content_file(data_dir)
+        self.assets_dir = assets_dir
+        self.on_reload = on_reload
+        try:
+            self.current = load_content(self.path, assets_dir)
+        except (OSError, ContentError) as e:
+            logger.error(f"加载游戏内容 {self.path} 失败，暂时使用插件自带的默认内容: {e}")
+            self.current = load_content(DEFAULT_CONTENT_PATH, assets_dir)
+        self._stop: asyncio.Event | None = None
+        self._watch_task: asyncio.Task | None = None
+
+    # --- 生命周期 ---
+    def start(self):
+        """开始监视内容文件（重复调用无副作用）。"""
+        if self._watch_task is None or self._watch_task.done():
+            self._stop = asyncio.Event()
+            self._watch_task = asyncio.create_task(self._watch_loop())
+
+    async def close(self):
+        if self._watch_task is not None:
+            self._stop.set()
+            self._watch_task.cancel()
+            try:
+                await self._watch_task
+            except asyncio.CancelledError:
+                pass
+            self._watch_task = None
+
+    async def _watch_loop(self):
+        # 监视所在目录而不是文件本身：编辑器保存时常常是写临时文件再改名替换
+        async for _ in awatch(self.path.parent, recursive=False, stop_event=self._stop,
+                              watch_filter=lambda _change, changed: Path(changed).name == self.path.name):
+            await self.reload()
+
+    # --- 重新加载 ---
+    async def reload(self) -> bool:
+        """重新读取内容文件，成功替换时返回 True。"""
+        try:
+            content = await asyncio.to_thread(load_content, self.path, self.assets_dir)
+            check_compatible(self.current, content)
+        except (OSError, ContentError) as e:
+            logger.error(f"重新加载游戏内容失败，继续使用原有内容: {e}")
+            return False
+        self.current = content
+        if self.on_reload is not None:
+            self.on_reload(content)
+        logger.info(f"游戏内容已重新加载：{len(content.species)} 种宠物，{len(content.shop_items)} 种商品。")
+        return True
@@ -0,0 +1,335 @@
+import asyncio
+import json
+import random
+import re
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+from astrbot.api import logger
+
+# 宠物名占位符，生成时保留，在具体某次散步消费事件时才替换
+PET_NAME_PLACEHOLDER = "{pet_name}"
+
+def build_prompt(count: int) -> str:
+    """一次生成 count 条奇遇事件的提示词，要求以 JSON 数组返回。"""
+    return (
+        f"你是一个宠物游戏的世界事件生成器。请为宠物在散步时生成 {count} 个互不相同的随机奇遇故事，"
+        "每个故事简短有趣（50字以内），故事中用 {pet_name} 指代宠物。"
+        "将所有事件放进一个JSON数组，并使用markdown的json代码块返回。数组中每个对象包含四个字段："
+        "\"description\" (string, 故事描述), "
+        "\"reward_type\" (string, 从 'exp', 'mood', 'satiety' 中随机选择), "
+        "\"reward_value\" (integer, 奖励数值), "
+        "和 \"money_gain\" (integer, 获得的金钱)。\n\n"
+        "示例回复格式：\n"
+        "```json\n"
+        "[\n"
+        "    {\"description\": \"{pet_name}在河边发现了一颗闪亮的石头，心情大好！\", "
+        "\"reward_type\": \"mood\", \"reward_value\": 15, \"money_gain\": 5},\n"
+        "    {\"description\": \"{pet_name}帮老奶奶找回了走丢的小猫。\", "
+        "\"reward_type\": \"exp\", \"reward_value\": 30, \"money_gain\": 10}\n"
+        "]\n"
+        "```"
+    )
+
+
+# JSON 对象的开头：左花括号后紧跟一个字段名，叙述文字里的 {pet_name} 之类不会被当成候选
+_OBJECT_START = re.compile(r'\{\s*"')
+
+
+def iter_json_objects(text: str):
+    """
+    逐个解析文本中的顶层 JSON 对象。
+    不要求整个数组完整合法：被截断的回复或混入了坏对象的数组，其中完整的对象仍会被依次产出。
+    有 ```json 代码块时只扫描代码块开始之后的部分（被截断的代码块可能没有结尾标记）。
+    """
+    block = text.find("```json")
+    if block != -1:
+        text = text[block + len("```json"):]
+    decoder = json.JSONDecoder()
+    match = _OBJECT_START.search(text)
+    while match:
+        try:
+            obj, end = decoder.raw_decode(text, match.start())
+        except json.JSONDecodeError:
+            # 解析失败的代价与失败位置之前的文本长度有关，只对候选位置尝试
+            match = _OBJECT_START.search(text, match.start() + 1)
+            continue
+        if isinstance(obj, dict):
+            yield obj
+        match = _OBJECT_START.search(text, end)
+
+
+# 各奖励类型允许的数值范围（含两端），超出范围的事件视为无效
+REWARD_RANGES = {"exp": (1, 100), "mood": (1, 50), "satiety": (1, 50)}
+MONEY_RANGE = (0, 50)
+MAX_DESCRIPTION_LENGTH = 120
+
+# LLM 不可用时使用的本地奇遇模板：(故事描述, 奖励类型)
+LOCAL_ENCOUNTERS = (
+    ("{pet_name}在草丛里追了一下午蝴蝶，玩得不亦乐乎。", "mood"),
+    ("{pet_name}在河边发现了一颗闪亮的石头，心情大好！", "mood"),
+    ("{pet_name}路过面包店，老板送了它一块刚出炉的面包。", "satiety"),
+    ("{pet_name}在树下找到了几颗野果，吃得饱饱的。", "satiety"),
+    ("{pet_name}帮迷路的小鸟找到了回家的路，收获满满。", "exp"),
+    ("{pet_name}跟着一只老猫学会了新的跳跃技巧。", "exp"),
+)
+
+
+@dataclass(frozen=True)
+class Encounter:
+    """一条已经校验过的奇遇事件，描述中保留宠物名占位符。"""
+    description: str
+    reward_type: str
+    reward_value: int
+    money_gain: int
+
+    def describe(self, pet_name: str) -> str:
+        return self.description.replace(PET_NAME_PLACEHOLDER, pet_name)
+
+
+def parse_encounter(data: dict, stat_map: dict[str, str]) -> Encounter:
+    """把 LLM 返回的 JSON 对象校验为 Encounter，不合法时抛出 ValueError。"""
+    if not isinstance(data, dict):
+        raise ValueError("奇遇事件不是一个JSON对象")
+    try:
+        description = str(data['description']).strip()
+        reward_type = data['reward_type']
+        reward_value = int(data['reward_value'])
+        money_gain = int(data.get('money_gain', 0))
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"奇遇事件缺少字段或字段类型错误: {e}") from e
+
+    if reward_type not in stat_map or reward_type not in REWARD_RANGES:
+        raise ValueError(f"未知的奖励类型: {reward_type}")
+    low, high = REWARD_RANGES[reward_type]
+    if not low <= reward_value <= high:
+        raise ValueError(f"奖励数值超出范围: {reward_type}={reward_value}")
+    if not MONEY_RANGE[0] <= money_gain <= MONEY_RANGE[1]:
+        raise ValueError(f"金钱奖励超出范围: {money_gain}")
+    if not description or len(description) > MAX_DESCRIPTION_LENGTH:
+        raise ValueError("故事描述为空或过长")
+    return Encounter(description, reward_type, reward_value, money_gain)
+
+
+def local_encounter(stat_map: dict[str, str], rng: random.Random | None = None) -> Encounter:
+    """不依赖 LLM，从本地模板随机生成一条奇遇事件，奖励数值取合法范围的前半段。"""
+    rng = rng or random
+    description, reward_type = rng.choice([t for t in LOCAL_ENCOUNTERS if t[1] in stat_map])
+    low, high = REWARD_RANGES[reward_type]
+    return Encounter(description, reward_type, rng.randint(low, (low + high) // 2),
+                     rng.randint(MONEY_RANGE[0], MONEY_RANGE[1] // 5))
+
+
+class ProviderUnavailableError(Exception):
+    """熔断器处于打开状态，暂不调用 LLM。"""
+
+
+class CircuitBreaker:
+    """
+    简单的熔断器：连续失败 failure_threshold 次后打开，期间拒绝所有调用；
+    reset_timeout 秒后进入半开状态，只放行一次试探调用，成功则关闭，失败则重新打开。
+    """
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 60.0):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.trips = 0
+        self._opened_at = 0.0
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            return True
+        return False
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.trips += 1
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+
+
+class EncounterPool:
+    """
+    预生成的奇遇事件池。
+    每次调用 LLM 最多生成 batch_size 条事件（只要池子剩余的空位那么多），后台任务持续把池子补到 capacity 条，
+    散步时直接取用；
+    池子为空时当场补充，同一时间最多只有一个请求在进行，并发的散步共享它的结果。
+    散步最多等待 latency_budget 秒，超时、LLM 出错或熔断时改用本地模板生成事件，保证总能及时回复。
+    """
+
+    def __init__(self, complete: Callable[[str], Awaitable[str | None]], stat_map: dict[str, str],
+                 capacity: int = 20, batch_size: int = 5, latency_budget: float = 3.0,
+                 provider_timeout: float = 30.0, breaker: CircuitBreaker | None = None,
+                 max_backoff: float = 60.0):
+        self.complete = complete  # 调用 LLM，返回补全文本；没有可用的提供商时返回 None
+        self.stat_map = stat_map
+        self.capacity = capacity
+        self.batch_size = max(1, batch_size)
+        self.latency_budget = latency_budget
+        self.provider_timeout = provider_timeout
+        self.breaker = breaker or CircuitBreaker()
+        self.max_backoff = max_backoff
+        # capacity 为 0 时不预生成，当场生成的一批事件仍可以留给之后的散步
+        self.limit = max(self.batch_size, capacity)
+        self._pool: deque[Encounter] = deque()
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._inflight: asyncio.Future | None = None
+        self.provider_calls = 0
+        self.provider_failures = 0
+        self.provider_timeouts = 0  # 单次 LLM 调用超过 provider_timeout
+        self.budget_timeouts = 0    # 散步等待超过 latency_budget
+        self.fallbacks = 0          # 使用本地模板的次数
+        self.rejected = 0
+        self.discarded = 0  # 池子已满，多出来的合法事件
+
+    def __len__(self) -> int:
+        return len(self._pool)
+
+    def start(self):
+        if self.capacity > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._refill_loop())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def take(self) -> Encounter | None:
+        """从池中取出一条事件，池空时返回 None。"""
+        if not self._pool:
+            return None
+        encounter = self._pool.popleft()
+        self._wakeup.set()
+        return encounter
+
+    async def acquire(self) -> Encounter:
+        """
+        取出一条事件。池空时在 latency_budget 内等待一次（可能与其他请求共享的）批量生成，
+        仍然拿不到时返回本地模板事件，因此不会抛出异常，耗时也不会超过 latency_budget。
+        """
+        encounter = self.take()
+        if encounter is not None:
+            return encounter
+        try:
+            await asyncio.wait_for(self.refill(), self.latency_budget)
+        except asyncio.TimeoutError:
+            # 批量生成仍在后台继续，结果会进入池中供之后的散步使用
+            self.budget_timeouts += 1
+        except ProviderUnavailableError:
+            pass
+        except Exception as e:
+            logger.warning(f"生成奇遇事件失败，改用本地事件: {e}")
+        encounter = self.take()
+        if encounter is None:
+            self.fallbacks += 1
+            encounter = local_encounter(self.stat_map)
+        return encounter
+
+    async def refill(self):
+        """补充一批事件；已有请求在进行时直接等待它完成，熔断时抛出 ProviderUnavailableError。"""
+        if self._inflight is None:
+            if not self.breaker.allow():
+                raise ProviderUnavailableError()
+            self._inflight = asyncio.ensure_future(self._generate_batch())
+            self._inflight.add_done_callback(self._clear_inflight)
+        await asyncio.shield(self._inflight)
+
+    def _clear_inflight(self, future: asyncio.Future):
+        self._inflight = None
+        if not future.cancelled():
+            future.exception()  # 异常已由等待者处理，避免无人等待时的警告
+
+    async def _generate_batch(self):
+        """调用一次 LLM 并把其中所有合法的事件放入池中，并把结果计入熔断器。"""
+        self.provider_calls += 1
+        try:
+            accepted = await self._request_batch()
+        except asyncio.TimeoutError:
+            self.provider_timeouts += 1
+            self.provider_failures += 1
+            self.breaker.record_failure()
+            raise ValueError(f"LLM调用超过 {self.provider_timeout} 秒未返回") from None
+        except Exception:
+            self.provider_failures += 1
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        return accepted
+
+    async def _request_batch(self) -> int:
+        count = max(1, min(self.batch_size, self.limit - len(self._pool)))
+        completion_text = await asyncio.wait_for(self.complete(build_prompt(count)), self.provider_timeout)
+        if completion_text is None:
+            raise ValueError("没有可用的LLM提供商")
+        accepted = 0
+        for data in iter_json_objects(completion_text):
+            try:
+                encounter = parse_encounter(data, self.stat_map)
+            except ValueError as e:
+                self.rejected += 1
+                logger.warning(f"丢弃无效的LLM奇遇事件: {e}")
+                continue
+            accepted += 1
+            # LLM 返回的事件可能比要求的多，超出上限的部分不放入池中
+            if len(self._pool) < self.limit:
+                self._pool.append(encounter)
+            else:
+                self.discarded += 1
+        if not accepted:
+            logger.error(f"LLM响应中没有合法的奇遇事件: {completion_text}")
+            raise ValueError("未能解析LLM的响应格式")
+        return accepted
+
+    def stats(self) -> dict:
+        return {
+            "pool_size": len(self._pool),
+            "breaker_state": self.breaker.state,
+            "breaker_trips": self.breaker.trips,
+            "provider_calls": self.provider_calls,
+            "provider_failures": self.provider_failures,
+            "provider_timeouts": self.provider_timeouts,
+            "budget_timeouts": self.budget_timeouts,
+            "fallbacks": self.fallbacks,
+            "rejected": self.rejected,
+            "discarded": self.discarded,
+        }
+
+    async def _refill_loop(self):
+        backoff = 1.0
+        while True:
+            if len(self._pool) >= self.capacity:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            try:
+                await self.refill()
+                backoff = 1.0
+            except asyncio.CancelledError:
+                raise
+            except ProviderUnavailableError:
+                # 熔断期间不再重试，等到可以试探时再说
+                await asyncio.sleep(self.breaker.reset_timeout)
+            except Exception as e:
+                # 提供商不可用或连续返回无效内容时指数退避，避免空转刷接口
+                logger.warning(f"预生成奇遇事件失败，{backoff:.0f} 秒后重试: {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(self.max_backoff, backoff * 2)
@@ -0,0 +1,117 @@
+import asyncio
+from bisect import bisect_left, insort
+from typing import Awaitable, Callable
+
+from .storage import PetRepository
+
+# 排行榜指标：名称 -> 排序字段（依次比较，均为降序）
+RANK_METRICS = {
+    "等级": ("level", "exp"),
+    "金钱": ("money",),
+    "胜场": ("duel_wins",),
+}
+# 榜单上展示的字段
+RANK_FIELDS = ("user_id", "pet_name", "pet_type", "level", "exp", "money", "duel_wins")
+
+
+class _Board:
+    """
+    单个群、单个指标的前 K 名窗口，按 (排序键, user_id) 升序保存，末尾为第一名。
+    floor 为窗口外所有宠物排序键的上界；None 表示窗口里已经包含了该群的全部宠物。
+    """
+    __slots__ = ("order", "members", "floor", "loading", "pending")
+
+    def __init__(self):
+        self.order: list[tuple[tuple, int]] = []
+        self.members: dict[int, tuple[tuple[tuple, int], dict]] = {}
+        self.floor: tuple | None = None
+        self.loading = True
+        self.pending: dict[int, dict] = {}  # 加载期间发生的修改，加载完成后重放
+
+    def remove(self, user_id: int):
+        item, _ = self.members.pop(user_id)
+        del self.order[bisect_left(self.order, item)]
+
+    def insert(self, user_id: int, key: tuple, row: dict):
+        item = (key, user_id)
+        insort(self.order, item)
+        self.members[user_id] = (item, row)
+
+
+class Leaderboard:
+    """
+    按群维护的增量排行榜。
+    每个群、每个指标首次查询时用索引查询读取前 size + slack 名，之后所有宠物修改都通过 update 增量维护，
+    查询不再访问数据库；只有窗口因名次下降缩小到 size 以下时才重新加载一次。
+    """
+
+    def __init__(self, repo: PetRepository, size: int = 10, slack: int = 10,
+                 before_load: Callable[[], Awaitable[None]] | None = None):
+        self.repo = repo
+        self.size = size
+        self.capacity = size + slack
+        # 加载前调用（通常是把状态缓存落盘），保证数据库中的排名不落后于内存
+        self.before_load = before_load
+        self._boards: dict[tuple[int, str], _Board] = {}
+        self._load_lock = asyncio.Lock()
+
+    @staticmethod
+    def _key(row: dict, metric: str) -> tuple:
+        return tuple(row.get(field) or 0 for field in RANK_METRICS[metric])
+
+    def update(self, pet: dict):
+        """某只宠物的数据发生变化后调用，更新其所在群已加载的各个榜单。"""
+        group_id, user_id = int(pet['group_id']), int(pet['user_id'])
+        row = {field: pet.get(field) for field in RANK_FIELDS}
+        for metric in RANK_METRICS:
+            board = self._boards.get((group_id, metric))
+            if board is None:
+                continue
+            if board.loading:
+                board.pending[user_id] = row
+            else:
+                self._apply(board, user_id, row, metric)
+
+    def _apply(self, board: _Board, user_id: int, row: dict, metric: str):
+        key = self._key(row, metric)
+        if user_id in board.members:
+            board.remove(user_id)
+        # 排序键不高于窗口外的上界时，无法确定它与窗口外宠物的先后，留在窗口外
+        if board.floor is not None and key <= board.floor:
+            return
+        board.insert(user_id, key, row)
+        if len(board.order) > self.capacity:
+            dropped_key, dropped_id = board.order[0]
+            board.remove(dropped_id)
+            board.floor = dropped_key if board.floor is None else max(board.floor, dropped_key)
+
+    async def _load(self, group_id: int, metric: str) -> _Board:
+        board = _Board()
+        self._boards[group_id, metric] = board
+        try:
+            if self.before_load is not None:
+                await self.before_load()
+            rows = await self.repo.top_pets(group_id, RANK_METRICS[metric], self.capacity)
+        except BaseException:
+            del self._boards[group_id, metric]
+            raise
+        for row in rows:
+            board.insert(int(row['user_id']), self._key(row, metric), {f: row.get(f) for f in RANK_FIELDS})
+        if len(rows) >= self.capacity:
+            board.floor = board.order[0][0]
+        board.loading = False
+        pending, board.pending = board.pending, {}
+        for user_id, row in pending.items():
+            self._apply(board, user_id, row, metric)
+        return board
+
+    async def top(self, group_id: str, metric: str) -> list[dict]:
+        """返回某群某指标的前 size 名，从第一名开始。"""
+        key = (int(group_id), metric)
+        board = self._boards.get(key)
+        if board is None or board.loading or (board.floor is not None and len(board.order) < self.size):
+            async with self._load_lock:
+                board = self._boards.get(key)
+                if board is None or (board.floor is not None and len(board.order) < self.size):
+                    board = await self._load(*key)
+        return [board.members[user_id][1] for _, user_id in reversed(board.order[-self.size:])]
@@ -0,0 +1,41 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Hashable
+
+
+class KeyedLocks:
+    """
+    按键分配的 asyncio 互斥锁，用于串行化同一玩家的所有修改。
+    同时持有多个键时总是按排序后的顺序加锁，任意两组调用都不会互相等待形成死锁；
+    没有协程持有或等待的锁会被立即回收，内存占用只与并发数有关。
+    """
+
+    def __init__(self):
+        self._locks: dict[Hashable, list] = {}  # key -> [锁, 持有或等待的协程数]
+
+    def locked(self, key: Hashable) -> bool:
+        slot = self._locks.get(key)
+        return slot is not None and slot[0].locked()
+
+    @asynccontextmanager
+    async def hold(self, *keys: Hashable):
+        ordered = sorted(set(keys))
+        counted, acquired = [], []
+        try:
+            for key in ordered:
+                slot = self._locks.get(key)
+                if slot is None:
+                    slot = self._locks[key] = [asyncio.Lock(), 0]
+                slot[1] += 1
+                counted.append(key)
+                await slot[0].acquire()
+                acquired.append(key)
+            yield
+        finally:
+            for key in reversed(acquired):
+                self._locks[key][0].release()
+            for key in counted:
+                slot = self._locks[key]
+                slot[1] -= 1
+                if slot[1] == 0:
+                    del self._locks[key]
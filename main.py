@@ -1,61 +1,35 @@
-import sqlite3
+import asyncio
 import random
-import io
-import json
-import re
+import time
+from collections.abc import Mapping
 from datetime import datetime, timedelta
 from pathlib import Path
-from PIL import Image, ImageDraw, ImageFont
-from astrbot.api.event import filter, AstrMessageEvent
+import numpy as np
+from astrbot.api.event import filter, AstrMessageEvent, MessageChain
 from astrbot.api.star import Context, Star, register
 from astrbot.core.message.components import At
 from astrbot.core.platform.sources.aiocqhttp.aiocqhttp_message_event import AiocqhttpMessageEvent
 from astrbot.core.star import StarTools
-from astrbot.api import logger
-
-# --- 静态游戏数据定义 ---
-# 定义了所有可用的宠物类型及其基础属性、进化路径和图片资源
-PET_TYPES = {
-    "水灵灵": {
-        "attribute": "水",
-        "description": "由纯净之水汇聚而成的元素精灵，性格温和，防御出众。",
-        "initial_stats": {"attack": 8, "defense": 12},
-        "evolutions": {
-            1: {"name": "水灵灵", "image": "WaterSprite_1.png", "evolve_level": 30},
-            2: {"name": "源流之精", "image": "WaterSprite_2.png", "evolve_level": None}
-        }
-    },
-    "火小犬": {
-        "attribute": "火",
-        "description": "体内燃烧着不灭之火的幼犬，活泼好动，攻击性强。",
-        "initial_stats": {"attack": 12, "defense": 8},
-        "evolutions": {
-            1: {"name": "火小犬", "image": "FirePup_1.png", "evolve_level": 30},
-            2: {"name": "烈焰魔犬", "image": "FirePup_2.png", "evolve_level": None}
-        }
-    },
-    "草叶猫": {
-        "attribute": "草",
-        "description": "能进行光合作用的奇特猫咪，攻守均衡，喜欢打盹。",
-        "initial_stats": {"attack": 10, "defense": 10},
-        "evolutions": {
-            1: {"name": "草叶猫", "image": "LeafyCat_1.png", "evolve_level": 30},
-            2: {"name": "丛林之王", "image": "LeafyCat_2.png", "evolve_level": None}
-        }
-    }
-}
-# --- 新增：静态游戏数据定义 (商店) ---
-SHOP_ITEMS = {
-    "普通口粮": {"price": 10, "type": "food", "satiety": 20, "mood": 5, "description": "能快速填饱肚子的基础食物。"},
-    "美味罐头": {"price": 30, "type": "food", "satiety": 50, "mood": 15, "description": "营养均衡，宠物非常爱吃。"},
-    "心情饼干": {"price": 25, "type": "food", "satiety": 10, "mood": 30, "description": "能让宠物心情愉悦的神奇零食。"},
-}
-# --- 新增：静态游戏数据定义 (状态中文名映射) ---
-STAT_MAP = {
-    "exp": "经验值",
-    "mood": "心情值",
-    "satiety": "饱食度"
-}
+from astrbot.api import logger, AstrBotConfig
+import astrbot.api.message_components as Comp
+
+from .storage import PetRepository, SQLitePetRepository
+from .pet_cache import PetStateCache, apply_deltas
+from .battle import Battle, battle_brief, battle_card_data, run_battle_core
+from .battle_sim import matchup_table, simulate_raid
+from .card_cache import CardCache
+from .content import ContentStore, GameContent, thaw
+from .encounters import CircuitBreaker, Encounter, EncounterPool
+from .leaderboard import RANK_METRICS, Leaderboard
+from .locks import KeyedLocks
+from .metrics import Metrics, format_duration, instrumented
+from .raid import RAID_MAX_ROUNDS, RAID_MVP_MONEY, Raid, boss_max_hp, make_boss, raid_rewards
+from .render import EncodeOptions, RenderBusyError, RenderPool, battle_card_job, bracket_job, status_card_job
+from .ratelimit import RENDER_COST, CooldownIndex, RateGate, format_wait, rate_limited
+from .rules import (DUEL_COOLDOWN, WALK_COOLDOWN, exp_for_next_level, resolve_level_up, roll_level_up_stats,
+                    with_decay)
+from .tournament import PLACE_MONEY, TOURNAMENT_MIN_ENTRANTS, WIN_EXP, WIN_MONEY, run_bracket, tournament_rewards
+
 
 @register(
     "简易群宠物游戏",
@@ -65,8 +39,9 @@ STAT_MAP = {
     "https://github.com/DITF16/astrbot_plugin_pet"
 )
 class PetPlugin(Star):
-    def __init__(self, context: Context):
+    def __init__(self, context: Context, config: AstrBotConfig | None = None):
         super().__init__(context)
+        self.config = config or {}
         # --- 初始化路径和数据库 ---
         self.data_dir = StarTools.get_data_dir("astrbot_plugin_pet")
         self.data_dir.mkdir(parents=True, exist_ok=True)
@@ -76,199 +51,211 @@ class PetPlugin(Star):
         # 假设 assets 文件夹与插件目录同级
         self.assets_dir = Path(__file__).parent / "assets"
         self.db_path = self.data_dir / "pets.db"
+        # 宠物种类、商店物品等游戏内容从数据目录中的文件加载，文件修改后自动重新加载
+        self.content = ContentStore(self.data_dir, self.assets_dir, on_reload=self._on_content_reload)
+        # 常驻开启的性能指标，定期以 Prometheus 文本格式写入数据目录
+        self.metrics = Metrics()
+        self.metrics_path = self.data_dir / "metrics.prom"
+        self.metrics.add_collector(self._collect_metrics)
+        # 状态卡在独立的有界工作池中渲染，素材只加载一次，之后每次渲染复用
+        self.render_pool = RenderPool(
+            self.assets_dir,
+            thaw(self.content.current.pet_types),
+            mode=self.config.get("render_pool_mode", "thread"),
+            workers=self.config.get("render_workers", 2),
+            max_pending=self.config.get("render_queue_size", 8),
+            timeout=self.config.get("render_timeout", 10.0),
+        )
+        # 状态卡输出格式；memory 模式下直接发送内存中的图片字节，不读写磁盘
+        self.card_options = EncodeOptions(
+            format=self.config.get("card_format", "png"),
+            quality=self.config.get("card_quality", 85),
+            width=self.config.get("card_width", 800),
+        )
+        # 战斗结果的发送方式：text 为文字日志，image 为一张战报卡（失败时退回一行摘要）
+        self.battle_images = self.config.get("battle_output", "text") == "image"
+        # 按绘制内容寻址的状态卡缓存，内容不变时不重新渲染
+        self.card_cache = CardCache(
+            self.cache_dir,
+            max_bytes=int(self.config.get("card_cache_max_mb", 64) * 1024 * 1024),
+            max_age=self.config.get("card_cache_max_age_hours", 24) * 3600,
+            suffix=self.card_options.suffix,
+            in_memory=self.config.get("card_output", "file") == "memory",
+        )
 
-        self._init_database()
+        # 数据库连接在首次使用（或 initialize）时异步建立，避免阻塞插件加载
+        self.repo = self._create_repo()
+        # 热点玩家的状态常驻内存，修改定期批量落盘
+        # 共享的 MySQL 数据库可能被其他实例修改，缓存只短暂复用读到的数据，修改立即落盘
+        self.cache = PetStateCache(
+            self.repo,
+            capacity=self.config.get("pet_cache_size", 2048),
+            flush_interval=self.config.get("pet_cache_flush_interval", 5.0),
+            shared=self.repo.shared,
+            max_staleness=self.config.get("mysql_cache_staleness", 1.0),
+        )
+        # 各群排行榜常驻内存，随缓存中的每次修改增量更新；首次加载前先落盘，保证数据库中的排名是最新的
+        self.leaderboard = Leaderboard(
+            self.repo,
+            size=self.config.get("leaderboard_size", 10),
+            before_load=self.cache.flush,
+        )
+        self.cache.on_change = self.leaderboard.update
+        # 命令入口的限流与冷却索引，刷屏和冷却中的请求在读库、渲染之前就被拒绝
+        self.rate_gate = RateGate(
+            CooldownIndex({"walk": WALK_COOLDOWN, "duel": DUEL_COOLDOWN}),
+            user_rate=self.config.get("rate_limit_user_rate", 0.5),
+            user_burst=self.config.get("rate_limit_user_burst", 5),
+            group_rate=self.config.get("rate_limit_group_rate", 5.0),
+            group_burst=self.config.get("rate_limit_group_burst", 20),
+        )
+        # 同一玩家的修改类命令串行执行；涉及多名玩家时按固定顺序加锁
+        self.player_locks = KeyedLocks()
+        # 集结中的世界Boss讨伐（群号 -> 讨伐）与各群下次可以召唤 Boss 的时刻
+        self.raids: dict[str, Raid] = {}
+        self._raid_ready_at: dict[str, float] = {}
+        self._raid_tasks: set[asyncio.Task] = set()
+        # 正在进行锦标赛的群与各群下次可以举办锦标赛的时刻
+        self._tournaments: set[str] = set()
+        self._tournament_ready_at: dict[str, float] = {}
+        # 散步奇遇事件由后台预先生成，散步时直接取用，不必等待 LLM
+        self.encounters = EncounterPool(
+            self._llm_complete,
+            self.content.current.stat_names,
+            capacity=self.config.get("encounter_pool_size", 20),
+            batch_size=self.config.get("encounter_batch_size", 5),
+            latency_budget=self.config.get("encounter_latency_budget", 3.0),
+            provider_timeout=self.config.get("encounter_provider_timeout", 30.0),
+            breaker=CircuitBreaker(
+                failure_threshold=self.config.get("encounter_breaker_threshold", 3),
+                reset_timeout=self.config.get("encounter_breaker_reset", 60.0),
+            ),
+        )
         logger.info("群宠物对决版插件已加载。")
 
-    # --- 数据库初始化与辅助函数 ---
-    def _init_database(self):
-        """初始化数据库，创建宠物表。"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            # 数据库中依旧使用 INTEGER 存储ID，效率更高
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS pets (
-                    user_id INTEGER NOT NULL,
-                    group_id INTEGER NOT NULL,
-                    pet_name TEXT NOT NULL,
-                    pet_type TEXT NOT NULL,
-                    level INTEGER DEFAULT 1,
-                    exp INTEGER DEFAULT 0,
-                    mood INTEGER DEFAULT 100,
-                    satiety INTEGER DEFAULT 80,
-                    attack INTEGER DEFAULT 10,
-                    defense INTEGER DEFAULT 10,
-                    evolution_stage INTEGER DEFAULT 1,
-                    last_fed_time TEXT,
-                    last_walk_time TEXT,
-                    last_duel_time TEXT,
-                    PRIMARY KEY (user_id, group_id)
-                )
-            """)
-            # 修改 pets 表，如果不存在则添加 money 和 last_updated_time 字段
-            try:
-                cursor.execute("ALTER TABLE pets ADD COLUMN money INTEGER DEFAULT 50")
-            except sqlite3.OperationalError:
-                pass  # 如果字段已存在，会报错，忽略即可
-            try:
-                cursor.execute("ALTER TABLE pets ADD COLUMN last_updated_time TEXT")
-            except sqlite3.OperationalError:
-                pass
-
-            # 创建背包表
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS inventory (
-                    user_id INTEGER NOT NULL,
-                    group_id INTEGER NOT NULL,
-                    item_name TEXT NOT NULL,
-                    quantity INTEGER NOT NULL,
-                    PRIMARY KEY (user_id, group_id, item_name)
-                )
-            """)
-            conn.commit()
-
-    def _get_pet(self, user_id: str, group_id: str) -> dict | None:
+    async def initialize(self):
+        """插件激活时调用，提前建立数据库连接并完成建表。"""
+        await self.repo.connect()
+        self.cache.start()
+        self.encounters.start()
+        self.metrics.start(self.metrics_path, self.config.get("metrics_export_interval", 60.0))
+        if self.config.get("content_hot_reload", True):
+            self.content.start()
+        await asyncio.to_thread(self.card_cache.load)
+        try:
+            await self.render_pool.preload(self.content.current.pet_types)
+        except Exception as e:
+            logger.error(f"预加载状态卡素材失败，将在首次渲染时重试: {e}")
+
+    def _on_content_reload(self, content: GameContent):
+        """游戏内容重新加载后，把新的状态名同步给奇遇事件池。"""
+        self.encounters.stat_map = content.stat_names
+
+    # --- 数据库辅助函数 ---
+    def _create_repo(self) -> PetRepository:
+        """按 storage_backend 配置选择存储后端：默认为数据目录下的 SQLite，mysql 供多个实例共用数据。"""
+        if self.config.get("storage_backend", "sqlite") == "mysql":
+            # 只有使用 MySQL 时才需要 aiomysql
+            from .storage_mysql import MySQLPetRepository
+            return MySQLPetRepository(
+                host=self.config.get("mysql_host", "127.0.0.1"),
+                port=self.config.get("mysql_port", 3306),
+                user=self.config.get("mysql_user", "root"),
+                password=self.config.get("mysql_password", ""),
+                database=self.config.get("mysql_database", "astrbot_pet"),
+                pool_size=self.config.get("mysql_pool_size", 5),
+                metrics=self.metrics,
+            )
+        return SQLitePetRepository(
+            self.db_path,
+            busy_timeout_ms=self.config.get("db_busy_timeout_ms", 5000),
+            read_pool_size=self.config.get("db_read_pool_size", 2),
+            metrics=self.metrics,
+        )
+
+    async def _get_pet(self, user_id: str, group_id: str) -> dict | None:
         """
-        [修改] 根据ID获取宠物信息，并自动处理离线期间的状态衰减。
+        根据ID获取宠物信息。离线期间的状态衰减在读取时即时计算，不会写库；
+        只有当这一行因为其他修改需要落盘时，衰减结果才会一并写入。
         """
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-
-            # 先从数据库获取原始数据
-            cursor.execute("SELECT * FROM pets WHERE user_id = ? AND group_id = ?", (int(user_id), int(group_id)))
-            row = cursor.fetchone()
-            if not row:
-                return None
-
-            pet_dict = dict(row)
-            now = datetime.now()
-
-            # 初始化或获取上次更新时间
-            last_updated_str = pet_dict.get('last_updated_time')
-            if not last_updated_str:
-                last_updated_time = now
-                # 首次为新字段写入当前时间
-                cursor.execute("UPDATE pets SET last_updated_time = ? WHERE user_id = ? AND group_id = ?",
-                               (now.isoformat(), int(user_id), int(group_id)))
-            else:
-                last_updated_time = datetime.fromisoformat(last_updated_str)
-
-            # 计算离线时间并应用衰减
-            hours_passed = (now - last_updated_time).total_seconds() / 3600
-            if hours_passed >= 1:
-                hours_to_decay = int(hours_passed)
-                satiety_decay = 3 * hours_to_decay  # 每小时降低3点饱食度
-                mood_decay = 2 * hours_to_decay  # 每小时降低2点心情
+        stored = await self.cache.get_pet(user_id, group_id)
+        if not stored:
+            return None
 
-                # 计算新值，确保不低于0
-                new_satiety = max(0, pet_dict['satiety'] - satiety_decay)
-                new_mood = max(0, pet_dict['mood'] - mood_decay)
+        now = datetime.now()
+        pet_dict = with_decay(stored, now)
 
-                # 更新数据库
-                cursor.execute(
-                    "UPDATE pets SET satiety = ?, mood = ?, last_updated_time = ? WHERE user_id = ? AND group_id = ?",
-                    (new_satiety, new_mood, now.isoformat(), int(user_id), int(group_id))
-                )
-                logger.info(
-                    f"宠物 {pet_dict['pet_name']} 离线{hours_to_decay}小时，饱食度降低{satiety_decay}, 心情降低{mood_decay}")
+        # 补全其他可能为空的时间戳
+        pet_dict.setdefault('last_fed_time', now.isoformat())
+        pet_dict.setdefault('last_walk_time', now.isoformat())
+        pet_dict.setdefault('last_duel_time', now.isoformat())
 
-                # 更新返回给程序的字典
-                pet_dict['satiety'] = new_satiety
-                pet_dict['mood'] = new_mood
+        return pet_dict
 
-            conn.commit()
+    def _apply_level_up(self, pet: dict) -> list[str]:
+        """
+        在宠物数据上结算升级（直接修改传入的字典），返回升级消息列表。
+        无论一次获得多少经验，都只查一次累计经验表。
+        """
+        old_level = pet['level']
+        new_level, remaining_exp = resolve_level_up(old_level, pet['exp'])
+        levels_gained = new_level - old_level
+        if levels_gained <= 0:
+            return []
 
-            # 补全其他可能为空的时间戳
-            pet_dict.setdefault('last_fed_time', now.isoformat())
-            pet_dict.setdefault('last_walk_time', now.isoformat())
-            pet_dict.setdefault('last_duel_time', now.isoformat())
+        attack_gain, defense_gain = roll_level_up_stats(levels_gained)
+        pet.update(level=new_level, exp=remaining_exp,
+                   attack=pet['attack'] + attack_gain, defense=pet['defense'] + defense_gain)
 
-            return pet_dict
+        logger.info(f"宠物升级: {pet['pet_name']} 从 {old_level} 级升到了 {new_level} 级！")
+        if levels_gained == 1:
+            return [f"🎉 恭喜！你的宠物「{pet['pet_name']}」升级到了 Lv.{new_level}！"]
+        return [f"🎉 恭喜！你的宠物「{pet['pet_name']}」连升 {levels_gained} 级，升级到了 Lv.{new_level}！"]
 
-    def _exp_for_next_level(self, level: int) -> int:
-        """计算升到下一级所需的总经验。"""
-        return int(10 * (level ** 1.5))
+    @staticmethod
+    def _player_key(user_id: str, group_id: str) -> tuple[str, str]:
+        return str(user_id), str(group_id)
 
-    def _check_level_up(self, user_id: str, group_id: str) -> list[str]:
-        """
-        检查并处理宠物升级，此函数现在返回一个包含升级消息的列表，而不是直接发送。
-        接收str类型的ID。
-        """
-        level_up_messages = []
-        while True:
-            pet = self._get_pet(user_id, group_id)
-            if not pet:
-                break
-
-            exp_needed = self._exp_for_next_level(pet['level'])
-            if pet['exp'] >= exp_needed:
-                new_level = pet['level'] + 1
-                remaining_exp = pet['exp'] - exp_needed
-                new_attack = pet['attack'] + random.randint(1, 2)
-                new_defense = pet['defense'] + random.randint(1, 2)
-
-                with sqlite3.connect(self.db_path) as conn:
-                    # 在更新数据库时，将str转换为int
-                    conn.execute(
-                        "UPDATE pets SET level = ?, exp = ?, attack = ?, defense = ? WHERE user_id = ? AND group_id = ?",
-                        (new_level, remaining_exp, new_attack, new_defense, int(user_id), int(group_id))
-                    )
-                    conn.commit()
-
-                logger.info(f"宠物升级: {pet['pet_name']} 升到了 {new_level} 级！")
-                level_up_messages.append(f"🎉 恭喜！你的宠物「{pet['pet_name']}」升级到了 Lv.{new_level}！")
-            else:
-                break
-        return level_up_messages
+    async def _locked(self, keys: list[tuple[str, str]], handler) -> list:
+        """持有这些玩家的锁运行一个命令的处理逻辑，锁释放后再由调用方发出回复。"""
+        async with self.player_locks.hold(*keys):
+            return [result async for result in handler]
 
     # --- 图片生成 ---
-    def _generate_pet_status_image(self, pet_data: dict, sender_name: str) -> Path | str:
+    async def _generate_pet_status_image(self, pet_data: dict, sender_name: str) -> Path | bytes | str:
         """
-        [修正] 根据宠物数据生成一张状态图并保存为文件。
-        成功则返回文件路径(Path)，失败则返回错误信息字符串(str)。
+        [修正] 根据宠物数据生成一张状态图。
+        绘制与编码都在渲染工作池中完成，不占用事件循环。
+        成功则返回文件路径(Path)或内存中的图片字节(bytes)，失败则返回错误信息字符串(str)。
         """
         try:
-            W, H = 800, 600
-            bg_path = self.assets_dir / "background.png"
-            font_path = self.assets_dir / "font.ttf"
-
-            img = Image.open(bg_path).resize((W, H))
-            draw = ImageDraw.Draw(img)
-
-            font_title = ImageFont.truetype(str(font_path), 40)
-            font_text = ImageFont.truetype(str(font_path), 28)
-
-            pet_type_info = PET_TYPES[pet_data['pet_type']]
-            evo_info = pet_type_info['evolutions'][pet_data['evolution_stage']]
-            pet_img_path = self.assets_dir / evo_info['image']
-            pet_img = Image.open(pet_img_path).convert("RGBA").resize((300, 300))
-            img.paste(pet_img, (50, 150), pet_img)
-
-            draw.text((W / 2, 50), f"{pet_data['pet_name']}的状态", font=font_title, fill="white", anchor="mt")
-            draw.text((400, 150), f"主人: {sender_name}", font=font_text, fill="white")
-            draw.text((400, 200), f"种族: {evo_info['name']} ({pet_data['pet_type']})", font=font_text, fill="white")
-            draw.text((400, 250), f"等级: Lv.{pet_data['level']}", font=font_text, fill="white")
-
-            exp_needed = self._exp_for_next_level(pet_data['level'])
-            exp_ratio = min(1.0, pet_data['exp'] / exp_needed)
-            draw.text((400, 300), f"经验: {pet_data['exp']} / {exp_needed}", font=font_text, fill="white")
-            draw.rectangle([400, 340, 750, 360], outline="white", fill="gray")
-            draw.rectangle([400, 340, 400 + 350 * exp_ratio, 360], fill="#66ccff")
-
-            draw.text((400, 390), f"攻击: {pet_data['attack']}", font=font_text, fill="white")
-            draw.text((600, 390), f"防御: {pet_data['defense']}", font=font_text, fill="white")
-            draw.text((400, 440), f"心情: {pet_data['mood']}/100", font=font_text, fill="white")
-            draw.text((600, 440), f"饱食度: {pet_data['satiety']}/100", font=font_text, fill="white")
-
-            # [新增] 显示金钱
-            draw.text((400, 490), f"金钱: ${pet_data.get('money', 0)}", font=font_text, fill="#FFD700")
-
-            # [修正] 将图片保存到缓存文件夹，而不是内存
-            output_path = self.cache_dir / f"status_{pet_data['group_id']}_{pet_data['user_id']}.png"
-            img.save(output_path, format='PNG')
-            return output_path
+            # 转为普通字典，进程模式下需要 pickle 传给渲染进程
+            evo_info = dict(self.content.current.evolution(pet_data['pet_type'], pet_data['evolution_stage']))
+            exp_needed = exp_for_next_level(pet_data['level'])
+            # 缓存键只由图上实际绘制的内容决定
+            card_fields = {
+                "pet_name": pet_data['pet_name'], "pet_type": pet_data['pet_type'],
+                "evo_name": evo_info['name'], "evo_image": evo_info['image'],
+                "level": pet_data['level'], "exp": pet_data['exp'], "exp_needed": exp_needed,
+                "attack": pet_data['attack'], "defense": pet_data['defense'],
+                "mood": pet_data['mood'], "satiety": pet_data['satiety'],
+                "money": pet_data.get('money', 0), "sender_name": sender_name,
+                "output": self.card_options,
+            }
+
+            async def render() -> bytes:
+                with self.metrics.timer("render", kind="status_card"):
+                    return await self.render_pool.submit(status_card_job, pet_data, evo_info, sender_name,
+                                                         exp_needed, self.card_options)
 
+            return await self.card_cache.get_or_render(CardCache.make_key(card_fields), render)
+
+        except RenderBusyError:
+            logger.warning(f"状态图渲染队列已满（{self.render_pool.pending} 个任务），拒绝本次请求。")
+            return "现在查看宠物状态的人太多啦，请稍后再试~"
+        except asyncio.TimeoutError:
+            logger.error(f"生成状态图超时（超过 {self.render_pool.timeout} 秒）。")
+            return "生成状态图超时了，请稍后再试。"
         except FileNotFoundError as e:
             logger.error(f"生成状态图失败，缺少素材文件: {e}")
             return f"生成状态图失败，请检查插件素材文件是否完整：\n{e}"
@@ -278,139 +265,100 @@ class PetPlugin(Star):
 
     # --- 属性克制计算 ---
     def _get_attribute_multiplier(self, attacker_attr: str, defender_attr: str) -> float:
-        """根据攻击方和防御方的属性，计算伤害倍率。"""
-        effectiveness = {
-            "水": "火",  # 水克火
-            "火": "草",  # 火克草
-            "草": "水"  # 草克水
-        }
-        if effectiveness.get(attacker_attr) == defender_attr:
-            return 1.2  # 克制，伤害加成20%
-        if effectiveness.get(defender_attr) == attacker_attr:
-            return 0.8  # 被克制，伤害减少20%
-        return 1.0  # 无克制关系
+        """根据攻击方和防御方的属性，计算伤害倍率（查预先算好的倍率表）。"""
+        return self.content.current.multipliers.get((attacker_attr, defender_attr), 1.0)
 
     # --- 核心逻辑：对战系统 ---
+    def _battle(self, pet1: dict, pet2: dict) -> Battle:
+        """执行两个宠物之间的对战，集成属性克制逻辑。战斗核心只产生紧凑的事件数组，不生成任何文字。"""
+        content = self.content.current
+        p1_attr = content.pet_types[pet1['pet_type']]['attribute']
+        p2_attr = content.pet_types[pet2['pet_type']]['attribute']
+        return Battle(run_battle_core(pet1, pet2, p1_attr, p2_attr, content.multipliers), pet1, pet2, p1_attr, p2_attr)
+
+    def _battle_log(self, battle: Battle) -> list[str]:
+        """文字日志在战斗结束后按长度限制统一渲染。"""
+        return battle.log(max_rounds=self.config.get("battle_log_max_rounds", 6),
+                          max_chars=self.config.get("battle_log_max_chars", 1500))
+
     def _run_battle(self, pet1: dict, pet2: dict) -> tuple[list[str], str]:
-        """执行两个宠物之间的对战，集成属性克制逻辑。"""
-        log = []
-        p1_hp = pet1['level'] * 10 + pet1['satiety']
-        p2_hp = pet2['level'] * 10 + pet2['satiety']
-        p1_name = pet1['pet_name']
-        p2_name = pet2['pet_name']
-
-        # 获取双方属性
-        p1_attr = PET_TYPES[pet1['pet_type']]['attribute']
-        p2_attr = PET_TYPES[pet2['pet_type']]['attribute']
-
-        log.append(
-            f"战斗开始！\n「{p1_name}」(Lv.{pet1['level']} {p1_attr}系) vs 「{p2_name}」(Lv.{pet2['level']} {p2_attr}系)")
-
-        turn = 0
-        while p1_hp > 0 and p2_hp > 0:
-            turn += 1
-            log.append(f"\n--- 第 {turn} 回合 ---")
-
-            # 宠物1攻击
-            multiplier1 = self._get_attribute_multiplier(p1_attr, p2_attr)
-            base_dmg_to_p2 = max(1, int(pet1['attack'] * random.uniform(0.8, 1.2) - pet2['defense'] * 0.5))
-            final_dmg_to_p2 = int(base_dmg_to_p2 * multiplier1)
-            p2_hp -= final_dmg_to_p2
-
-            log.append(f"「{p1_name}」发起了攻击！")
-            if multiplier1 > 1.0:
-                log.append("效果拔群！")
-            elif multiplier1 < 1.0:
-                log.append("效果不太理想…")
-            log.append(f"对「{p2_name}」造成了 {final_dmg_to_p2} 点伤害！(剩余HP: {max(0, p2_hp)})")
-
-            if p2_hp <= 0:
-                break
-
-            # 宠物2攻击
-            multiplier2 = self._get_attribute_multiplier(p2_attr, p1_attr)
-            base_dmg_to_p1 = max(1, int(pet2['attack'] * random.uniform(0.8, 1.2) - pet1['defense'] * 0.5))
-            final_dmg_to_p1 = int(base_dmg_to_p1 * multiplier2)
-            p1_hp -= final_dmg_to_p1
-
-            log.append(f"「{p2_name}」进行了反击！")
-            if multiplier2 > 1.0:
-                log.append("效果拔群！")
-            elif multiplier2 < 1.0:
-                log.append("效果不太理想…")
-            log.append(f"对「{p1_name}」造成了 {final_dmg_to_p1} 点伤害！(剩余HP: {max(0, p1_hp)})")
-
-        winner_name = p1_name if p1_hp > 0 else p2_name
-        log.append(f"\n战斗结束！胜利者是「{winner_name}」！")
-        return log, winner_name
-
-    def _extract_json_from_text(self, text: str) -> str | None:
+        """执行对战并返回 (文字日志, 胜者名字)。"""
+        battle = self._battle(pet1, pet2)
+        return self._battle_log(battle), battle.winner_name
+
+    async def _battle_reply(self, event: AstrMessageEvent, battle: Battle, notes: list[str]):
         """
-        从包含额外文本的字符串中稳健地提取出第一个完整的JSON对象字符串。
-        优先匹配 ```json ... ``` 代码块。
+        把一场战斗连同结算说明渲染为一张战报卡，无论打了多少回合都只发一条消息；
+        渲染失败时退回一行摘要加结算说明。
         """
-        # 优先策略：寻找markdown json代码块
-        match = re.search(r"```json\s*([\s\S]*?)\s*```", text)
-        if match:
-            return match.group(1).strip()
-
-        # 后备策略：寻找第一个 '{' 并进行括号匹配
+        notes = [note.strip() for note in notes if note.strip()]
+        content = self.content.current
+        images = tuple(content.evolution(pet['pet_type'], pet.get('evolution_stage') or 1)['image']
+                       for pet in (battle.pet1, battle.pet2))
         try:
-            start_index = text.find('{')
-            if start_index == -1:
-                return None
-
-            brace_level = 0
-            for i, char in enumerate(text[start_index:]):
-                if char == '{':
-                    brace_level += 1
-                elif char == '}':
-                    brace_level -= 1
-
-                if brace_level == 0:
-                    return text[start_index: start_index + i + 1]
-            return None  # 括号不匹配
-        except Exception:
+            with self.metrics.timer("render", kind="battle_card"):
+                image = await self.render_pool.submit(battle_card_job, battle_card_data(battle, images, notes),
+                                                      self.card_options)
+            return event.chain_result([Comp.Image.fromBytes(image)])
+        except RenderBusyError:
+            logger.warning(f"渲染队列已满（{self.render_pool.pending} 个任务），战报改为文字摘要。")
+        except asyncio.TimeoutError:
+            logger.error(f"生成战报卡超时（超过 {self.render_pool.timeout} 秒），改为文字摘要。")
+        except Exception as e:
+            logger.error(f"生成战报卡失败，改为文字摘要: {e}")
+        return event.plain_result("\n".join([battle_brief(battle), *notes]))
+
+    async def _llm_complete(self, prompt: str) -> str | None:
+        """调用当前使用的 LLM 提供商，没有可用的提供商时返回 None。"""
+        provider = self.context.get_using_provider()
+        if provider is None:
             return None
+        with self.metrics.timer("llm"):
+            llm_response = await provider.text_chat(prompt=prompt)
+        return llm_response.completion_text
 
     @filter.command("领养宠物")
+    @instrumented
+    @rate_limited()
     async def adopt_pet(self, event: AstrMessageEvent, pet_name: str | None = None):
         """领养一只随机的初始宠物"""
         user_id, group_id = event.get_sender_id(), event.get_group_id()
         if not group_id:
             yield event.plain_result("该功能仅限群聊使用哦。")
             return
+        for result in await self._locked([self._player_key(user_id, group_id)], self._adopt(event, pet_name)):
+            yield result
 
-        if self._get_pet(user_id, group_id):
+    async def _adopt(self, event: AstrMessageEvent, pet_name: str | None):
+        user_id, group_id = event.get_sender_id(), event.get_group_id()
+        if await self._get_pet(user_id, group_id):
             yield event.plain_result("你在这个群里已经有一只宠物啦！发送 /我的宠物 查看。")
             return
 
-        initial_pet_types = ["水灵灵", "火小犬", "草叶猫"]
-        type_name = random.choice(initial_pet_types)
+        content = self.content.current
+        type_name = random.choice(content.starters)
 
         if not pet_name:
             pet_name = type_name
 
-        pet_info = PET_TYPES[type_name]
+        pet_info = content.pet_types[type_name]
         stats = pet_info['initial_stats']
         now = datetime.now()
         cooldown_expired_time_iso = (now - timedelta(hours=2)).isoformat()
         now_iso = now.isoformat()
 
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute(
-                """INSERT INTO pets (user_id, group_id, pet_name, pet_type, attack, defense, 
-                                     last_fed_time, last_walk_time, last_duel_time) 
-                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                (int(user_id), int(group_id), pet_name, type_name, stats['attack'], stats['defense'],
-                 now_iso, cooldown_expired_time_iso, cooldown_expired_time_iso))
-            conn.commit()
+        await self.repo.create_pet(user_id, group_id, pet_name, type_name, stats['attack'], stats['defense'],
+                                   now_iso, cooldown_expired_time_iso)
+        # 领养直接写库，再把数据库补齐默认值后的完整记录放入缓存
+        self.cache.put_pet(await self.repo.get_pet(user_id, group_id))
 
         logger.info(f"新宠物领养: 群 {group_id} 用户 {user_id} 随机领养了 {type_name} - {pet_name}")
         yield event.plain_result(
             f"恭喜你，{event.get_sender_name()}！命运让你邂逅了「{pet_name}」({type_name})！\n发送 /我的宠物 查看它的状态吧。")
 
     @filter.command("我的宠物")
+    @instrumented
+    @rate_limited(cost=RENDER_COST)
     async def my_pet_status(self, event: AstrMessageEvent):
         user_id, group_id = event.get_sender_id(), event.get_group_id()
 
@@ -418,101 +366,76 @@ class PetPlugin(Star):
             yield event.plain_result("该功能仅限群聊使用哦。")
             return
 
-        pet = self._get_pet(user_id, group_id)
+        pet = await self._get_pet(user_id, group_id)
         if not pet:
             yield event.plain_result("你还没有宠物哦，快发送 /领养宠物 来选择一只吧！")
             return
 
-        result = self._generate_pet_status_image(pet, event.get_sender_name())
+        result = await self._generate_pet_status_image(pet, event.get_sender_name())
         if isinstance(result, Path):
             yield event.image_result(str(result))
+        elif isinstance(result, bytes):
+            yield event.chain_result([Comp.Image.fromBytes(result)])
         else:
             yield event.plain_result(result)
 
     @filter.command("散步")
+    @instrumented
+    @rate_limited(cooldown="walk", cooldown_message="刚散步回来，让宠物休息一下吧，还需等待 {remaining}。")
     async def walk_pet(self, event: AstrMessageEvent):
         """带宠物散步，触发LLM生成的奇遇或PVE战斗"""
         user_id, group_id = event.get_sender_id(), event.get_group_id()
         if not group_id:
             return
+        # 加锁前先做一次不加锁的检查，没有宠物或冷却中的请求不必等待奇遇事件
+        pet = await self._get_pet(user_id, group_id)
+        if not pet:
+            yield event.plain_result("你还没有宠物，不能去散步哦。")
+            return
+        # 把读到的冷却记进入口的冷却索引，冷却期间的后续请求不必再读取宠物
+        self.rate_gate.cooldowns.observe(pet)
+        if datetime.now() - datetime.fromisoformat(pet['last_walk_time']) < WALK_COOLDOWN:
+            yield event.plain_result(f"刚散步回来，让「{pet['pet_name']}」休息一下吧。")
+            return
+
+        # 奇遇事件可能要等待 LLM（最多 latency_budget 秒），在加锁之前取好，等待期间不阻塞该玩家的其他命令。
+        # 优先使用预生成的事件；池子为空时当场批量生成，超出时间预算或 LLM 不可用时使用本地事件
+        encounter = await self.encounters.acquire() if random.random() < 0.7 else None
+        for result in await self._locked([self._player_key(user_id, group_id)], self._walk(event, encounter)):
+            yield result
 
-        pet = self._get_pet(user_id, group_id)
+    async def _walk(self, event: AstrMessageEvent, encounter: Encounter | None):
+        """持锁重新读取宠物并检查冷却，然后结算奇遇（encounter 不为 None 时）或野外战斗。"""
+        user_id, group_id = event.get_sender_id(), event.get_group_id()
+        pet = await self._get_pet(user_id, group_id)
         if not pet:
             yield event.plain_result("你还没有宠物，不能去散步哦。")
             return
 
         now = datetime.now()
         last_walk = datetime.fromisoformat(pet['last_walk_time'])
-        if now - last_walk < timedelta(minutes=5):
+        if now - last_walk < WALK_COOLDOWN:
             yield event.plain_result(f"刚散步回来，让「{pet['pet_name']}」休息一下吧。")
             return
 
+        content = self.content.current
         final_reply = []
-        if random.random() < 0.7:
-            prompt = (
-                f"你是一个宠物游戏的世界事件生成器。请为一只名为'{pet['pet_name']}'的宠物在散步时，"
-                "生成一个简短、有趣的随机奇遇故事（50字以内）。"
-                "然后，将奖励信息封装成一个JSON对象，并使用markdown的json代码块返回。JSON应包含四个字段："
-                "\"description\" (string, 故事描述), "
-                "\"reward_type\" (string, 从 'exp', 'mood', 'satiety' 中随机选择), "
-                "\"reward_value\" (integer, 奖励数值), "
-                "和 \"money_gain\" (integer, 获得的金钱)。\n\n"
-                "示例回复格式：\n"
-                "这是一个奇妙的下午。\n"
-                "```json\n"
-                "{\n"
-                "    \"description\": \"{pet_name}在河边发现了一颗闪亮的石头，心情大好！\",\n"
-                "    \"reward_type\": \"mood\",\n"
-                "    \"reward_value\": 15,\n"
-                "    \"money_gain\": 5\n"
-                "}\n"
-                "```"
-            )
-
-            completion_text = ""
-            try:
-                llm_response = await self.context.get_using_provider().text_chat(prompt=prompt)
-                completion_text = llm_response.completion_text
-
-                json_str = self._extract_json_from_text(completion_text)
-
-                if not json_str:
-                    logger.error(f"无法从LLM响应中提取JSON: {completion_text}")
-                    raise ValueError("未能解析LLM的响应格式")
-
-                data = json.loads(json_str)
-
-                desc = data['description'].format(pet_name=pet['pet_name'])
-                reward_type = data['reward_type']
-                reward_value = int(data['reward_value'])
-                money_gain = int(data.get('money_gain', 0))
-
-                reward_type_chinese = STAT_MAP.get(reward_type, reward_type)
-                final_reply.append(f"奇遇发生！\n{desc}\n你的宠物获得了 {reward_value} 点{reward_type_chinese}！")
-                if money_gain > 0:
-                    final_reply.append(f"意外之喜！你在路边捡到了 ${money_gain}！")
-
-                with sqlite3.connect(self.db_path) as conn:
-                    update_query = (
-                        f"UPDATE pets SET "
-                        f"{reward_type} = {'MIN(100, ' + reward_type + ' + ?)' if reward_type != 'exp' else (reward_type + ' + ?')}, "
-                        f"money = money + ?, "
-                        f"last_walk_time = ? "
-                        f"WHERE user_id = ? AND group_id = ?"
-                    )
-                    conn.execute(update_query, (reward_value, money_gain, now.isoformat(), int(user_id), int(group_id)))
-                    conn.commit()
-
-                if reward_type == 'exp':
-                    final_reply.extend(self._check_level_up(user_id, group_id))
-
-            except (json.JSONDecodeError, ValueError, KeyError) as e:
-                logger.error(f"LLM奇遇事件处理失败: {e}\n原始返回: {completion_text}")
-                final_reply.append("你的宠物在外面迷路了，好在最后成功找回，但什么也没发生。")
+        rewards = {}
+        battle = None
+        if encounter is not None:
+            desc = encounter.describe(pet['pet_name'])
+            reward_type, reward_value, money_gain = encounter.reward_type, encounter.reward_value, encounter.money_gain
+
+            reward_type_chinese = content.stat_names.get(reward_type, reward_type)
+            final_reply.append(f"奇遇发生！\n{desc}\n你的宠物获得了 {reward_value} 点{reward_type_chinese}！")
+            if money_gain > 0:
+                final_reply.append(f"意外之喜！你在路边捡到了 ${money_gain}！")
+
+            rewards = {reward_type: reward_value, "money": money_gain}
         else:
             npc_level = max(1, pet['level'] + random.randint(-1, 1))
-            npc_type_name = random.choice(list(PET_TYPES.keys()))
-            npc_stats = PET_TYPES[npc_type_name]['initial_stats']
+            npc_type_name = random.choice(content.species)
+            npc_stats = content.pet_types[npc_type_name]['initial_stats']
             npc_pet = {
                 "pet_name": f"野生的{npc_type_name}",
                 "pet_type": npc_type_name,
@@ -522,8 +445,10 @@ class PetPlugin(Star):
                 "satiety": 100
             }
 
-            battle_log, winner_name = self._run_battle(pet, npc_pet)
-            final_reply.extend(battle_log)
+            battle = self._battle(pet, npc_pet)
+            winner_name = battle.winner_name
+            if not self.battle_images:
+                final_reply.extend(self._battle_log(battle))
 
             exp_gain = 0
             money_gain = 0
@@ -535,16 +460,27 @@ class PetPlugin(Star):
                 exp_gain = 1
                 final_reply.append(f"\n很遗憾，你的宠物战败了，但也获得了 {exp_gain} 点经验。")
 
-            with sqlite3.connect(self.db_path) as conn:
-                conn.execute(
-                    "UPDATE pets SET exp = exp + ?, money = money + ?, last_walk_time = ? WHERE user_id = ? AND group_id = ?",
-                    (exp_gain, money_gain, now.isoformat(), int(user_id), int(group_id)))
-                conn.commit()
-            final_reply.extend(self._check_level_up(user_id, group_id))
+            rewards = {"exp": exp_gain, "money": money_gain}
+
+        # 奖励、升级和冷却在一个事务中结算；冷却已被其他结算占用时整个结算作废
+        row = await self.cache.draft(user_id, group_id)
+        apply_deltas(row, **rewards)
+        row['last_walk_time'] = now.isoformat()
+        final_reply.extend(self._apply_level_up(row))
+        cutoff = (now - WALK_COOLDOWN).isoformat()
+        if not await self.cache.settle([row], "last_walk_time", cutoff):
+            yield event.plain_result(f"刚散步回来，让「{pet['pet_name']}」休息一下吧。")
+            return
+        self.rate_gate.cooldowns.observe(row)
 
-        yield event.plain_result("\n".join(final_reply))
+        if battle is not None and self.battle_images:
+            yield await self._battle_reply(event, battle, final_reply)
+        else:
+            yield event.plain_result("\n".join(final_reply))
 
     @filter.command("对决")
+    @instrumented
+    @rate_limited(cooldown="duel", cooldown_message="你的对决技能正在冷却中，还需等待 {remaining}。")
     async def duel_pet(self, event: AiocqhttpMessageEvent):
         """与其他群友的宠物进行对决"""
         user_id, group_id = event.get_sender_id(), event.get_group_id()
@@ -556,8 +492,17 @@ class PetPlugin(Star):
         if not at_info:
             yield event.plain_result("请@一位你想对决的群友。用法: /对决 @某人")
             return
+        remaining = self.rate_gate.cooldowns.remaining(at_info, group_id, "duel")
+        if remaining > 0:
+            yield event.plain_result(f"对方的宠物正在休息，还需等待 {format_wait(remaining)} 才能接受对决。")
+            return
+        keys = [self._player_key(user_id, group_id), self._player_key(at_info, group_id)]
+        for result in await self._locked(keys, self._duel(event, at_info)):
+            yield result
 
-        challenger_pet = self._get_pet(user_id, group_id)
+    async def _duel(self, event: AiocqhttpMessageEvent, at_info: str):
+        user_id, group_id = event.get_sender_id(), event.get_group_id()
+        challenger_pet = await self._get_pet(user_id, group_id)
         if not challenger_pet:
             yield event.plain_result("你还没有宠物，无法发起对决。")
             return
@@ -567,29 +512,32 @@ class PetPlugin(Star):
             yield event.plain_result("不能和自己对决哦。")
             return
 
-        target_pet = self._get_pet(target_id, group_id)
+        target_pet = await self._get_pet(target_id, group_id)
         if not target_pet:
             yield event.plain_result(f"对方还没有宠物呢。")
             return
+        self.rate_gate.cooldowns.observe(challenger_pet)
+        self.rate_gate.cooldowns.observe(target_pet)
 
         now = datetime.now()
 
         # 检查挑战者自己的CD
         last_duel_challenger = datetime.fromisoformat(challenger_pet['last_duel_time'])
-        if now - last_duel_challenger < timedelta(minutes=30):
-            remaining = timedelta(minutes=30) - (now - last_duel_challenger)
+        if now - last_duel_challenger < DUEL_COOLDOWN:
+            remaining = DUEL_COOLDOWN - (now - last_duel_challenger)
             yield event.plain_result(f"你的对决技能正在冷却中，还需等待 {str(remaining).split('.')[0]}。")
             return
 
         # 检查被挑战者的CD
         last_duel_target = datetime.fromisoformat(target_pet['last_duel_time'])
-        if now - last_duel_target < timedelta(minutes=30):
-            remaining = timedelta(minutes=30) - (now - last_duel_target)
+        if now - last_duel_target < DUEL_COOLDOWN:
+            remaining = DUEL_COOLDOWN - (now - last_duel_target)
             yield event.plain_result(
                 f"对方的宠物正在休息，还需等待 {str(remaining).split('.')[0]} 才能接受对决。")
             return
 
-        battle_log, winner_name = self._run_battle(challenger_pet, target_pet)
+        battle = self._battle(challenger_pet, target_pet)
+        winner_name = battle.winner_name
 
         money_gain = 20
         if winner_name == challenger_pet['pet_name']:
@@ -601,46 +549,50 @@ class PetPlugin(Star):
             winner_exp = 10 + challenger_pet['level'] * 2
             loser_exp = 5 + target_pet['level']
 
-        final_reply = list(battle_log)
+        final_reply = [] if self.battle_images else self._battle_log(battle)
         final_reply.append(
             f"\n对决结算：胜利者获得了 {winner_exp} 点经验值和 ${money_gain}，参与者获得了 {loser_exp} 点经验值。")
 
-        with sqlite3.connect(self.db_path) as conn:
-            # 为双方都设置冷却时间
-            conn.execute("UPDATE pets SET last_duel_time = ? WHERE user_id = ? AND group_id = ?",
-                         (now.isoformat(), int(user_id), int(group_id)))
-            conn.execute("UPDATE pets SET last_duel_time = ? WHERE user_id = ? AND group_id = ?",
-                         (now.isoformat(), int(target_id), int(group_id)))
-
-            # 为胜利者增加金钱
-            conn.execute("UPDATE pets SET money = money + ? WHERE user_id = ? AND group_id = ?",
-                         (money_gain, int(winner_id), int(group_id)))
-
-            # 发放经验
-            conn.execute("UPDATE pets SET exp = exp + ? WHERE user_id = ? AND group_id = ?",
-                         (winner_exp, int(winner_id), int(group_id)))
-            conn.execute("UPDATE pets SET exp = exp + ? WHERE user_id = ? AND group_id = ?",
-                         (loser_exp, int(loser_id), int(group_id)))
-            conn.commit()
-
-        final_reply.extend(self._check_level_up(winner_id, group_id))
-        final_reply.extend(self._check_level_up(loser_id, group_id))
+        # 双方的冷却、奖励和升级在一个事务中结算，任一方冷却已被占用时整场对决作废
+        winner_row = await self.cache.draft(winner_id, group_id)
+        loser_row = await self.cache.draft(loser_id, group_id)
+        # 胜者获得金钱与经验，败者获得经验
+        apply_deltas(winner_row, money=money_gain, exp=winner_exp, duel_wins=1)
+        apply_deltas(loser_row, exp=loser_exp)
+        for row in (winner_row, loser_row):
+            row['last_duel_time'] = now.isoformat()
+            final_reply.extend(self._apply_level_up(row))
+        cutoff = (now - DUEL_COOLDOWN).isoformat()
+        if not await self.cache.settle([winner_row, loser_row], "last_duel_time", cutoff):
+            yield event.plain_result("有一方的宠物刚刚完成了另一场对决，请稍后再试。")
+            return
+        self.rate_gate.cooldowns.observe(winner_row)
+        self.rate_gate.cooldowns.observe(loser_row)
 
-        yield event.plain_result("\n".join(final_reply))
+        if self.battle_images:
+            yield await self._battle_reply(event, battle, final_reply)
+        else:
+            yield event.plain_result("\n".join(final_reply))
 
     @filter.command("宠物进化")
+    @instrumented
+    @rate_limited()
     async def evolve_pet(self, event: AstrMessageEvent):
         """让达到条件的宠物进化。"""
         user_id, group_id = event.get_sender_id(), event.get_group_id()
         if not group_id:
             return
+        for result in await self._locked([self._player_key(user_id, group_id)], self._evolve(event)):
+            yield result
 
-        pet = self._get_pet(user_id, group_id)
+    async def _evolve(self, event: AstrMessageEvent):
+        user_id, group_id = event.get_sender_id(), event.get_group_id()
+        pet = await self._get_pet(user_id, group_id)
         if not pet:
             yield event.plain_result("你还没有宠物哦。")
             return
 
-        pet_type_info = PET_TYPES[pet['pet_type']]
+        pet_type_info = self.content.current.pet_types[pet['pet_type']]
         current_evo_info = pet_type_info['evolutions'][pet['evolution_stage']]
 
         evolve_level = current_evo_info['evolve_level']
@@ -657,38 +609,268 @@ class PetPlugin(Star):
         new_attack = pet['attack'] + random.randint(8, 15)
         new_defense = pet['defense'] + random.randint(8, 15)
 
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute(
-                "UPDATE pets SET evolution_stage = ?, attack = ?, defense = ? WHERE user_id = ? AND group_id = ?",
-                (next_evo_stage, new_attack, new_defense, int(user_id), int(group_id)))
-            conn.commit()
+        await self.cache.update_pet(user_id, group_id, evolution_stage=next_evo_stage,
+                                    attack=new_attack, defense=new_defense)
+        if not await self.cache.commit(user_id, group_id):
+            yield event.plain_result("你的宠物数据刚刚在别处被修改过，这次进化没有生效，请重试。")
+            return
 
         logger.info(f"宠物进化成功: {pet['pet_name']} -> {next_evo_info['name']}")
         yield event.plain_result(
             f"光芒四射！你的「{pet['pet_name']}」成功进化为了「{next_evo_info['name']}」！各项属性都得到了巨幅提升！")
 
+    @filter.command("世界Boss")
+    @instrumented
+    @rate_limited()
+    async def world_boss(self, event: AstrMessageEvent):
+        """召唤或加入本群的世界Boss讨伐。"""
+        user_id, group_id = event.get_sender_id(), event.get_group_id()
+        if not group_id:
+            yield event.plain_result("该功能仅限群聊使用哦。")
+            return
+        pet = await self._get_pet(user_id, group_id)
+        if not pet:
+            yield event.plain_result("你还没有宠物，无法参加世界Boss讨伐。")
+            return
+
+        raid = self.raids.get(group_id)
+        if raid is not None:
+            if user_id in raid.participants:
+                yield event.plain_result(f"你已经在讨伐队伍中了，{raid.remaining:.0f} 秒后开战。")
+                return
+            raid.participants[user_id] = pet['pet_name']
+            yield event.plain_result(f"「{pet['pet_name']}」加入了讨伐「{raid.boss.name}」的队伍！"
+                                     f"当前共 {len(raid.participants)} 人，{raid.remaining:.0f} 秒后开战。")
+            return
+
+        wait = self._raid_ready_at.get(group_id, 0.0) - time.monotonic()
+        if wait > 0:
+            yield event.plain_result(f"世界Boss刚刚被讨伐过，还需等待 {timedelta(seconds=int(wait))} 才会再次出现。")
+            return
+
+        window = self.config.get("raid_join_window", 120)
+        boss = make_boss(self.content.current, pet['level'])
+        raid = Raid(group_id=group_id, boss=boss, origin=event.unified_msg_origin,
+                    started_at=datetime.now().isoformat(), ends_at=time.monotonic() + window,
+                    participants={user_id: pet['pet_name']})
+        self.raids[group_id] = raid
+        task = asyncio.create_task(self._run_raid(raid))
+        self._raid_tasks.add(task)
+        task.add_done_callback(self._raid_tasks.discard)
+        yield event.plain_result(
+            f"⚠️ 世界Boss「{boss.name}」(Lv.{boss.level} {boss.attribute}属性) 降临了！\n"
+            f"{window} 秒内发送 /世界Boss 加入讨伐。参战的人越多 Boss 越强，造成的伤害越高奖励越多。")
+
+    async def _run_raid(self, raid: Raid):
+        """集结时间结束后结算讨伐，并把战报发到群里。"""
+        await asyncio.sleep(raid.remaining)
+        self.raids.pop(raid.group_id, None)
+        self._raid_ready_at[raid.group_id] = time.monotonic() + self.config.get("raid_cooldown", 1800)
+        try:
+            report = await self._settle_raid(raid)
+        except Exception as e:
+            logger.error(f"世界Boss讨伐结算失败: {e}")
+            report = "世界Boss讨伐结算时发生错误，本次讨伐作废。"
+        try:
+            await self.context.send_message(raid.origin, MessageChain().message(report))
+        except Exception as e:
+            logger.error(f"发送世界Boss战报失败: {e}")
+
+    async def _settle_raid(self, raid: Raid) -> str:
+        """
+        所有参与者的战斗在一次向量化模拟中完成，奖励、升级和讨伐时间在一个事务中批量写入。
+        结算期间持有全部参与者的锁，与他们的其他修改类命令互斥。
+        """
+        group_id, boss = raid.group_id, raid.boss
+        keys = [self._player_key(user_id, group_id) for user_id in raid.participants]
+        async with self.player_locks.hold(*keys):
+            rows = [await self.cache.draft(user_id, group_id) for user_id in raid.participants]
+            rows = [row for row in rows if row is not None]
+            if not rows:
+                return f"世界Boss「{boss.name}」没有等到挑战者，悄悄离开了。"
+
+            content = self.content.current
+            attr_index = content.attribute_index
+            count = len(rows)
+            max_hp = boss_max_hp(boss, count)
+            # 模拟在线程中运行，持锁期间不占用事件循环
+            stats = await asyncio.to_thread(
+                simulate_raid,
+                np.fromiter((row['attack'] for row in rows), np.float64, count),
+                np.fromiter((row['defense'] for row in rows), np.float64, count),
+                np.fromiter((row['level'] for row in rows), np.int64, count),
+                np.fromiter((row['satiety'] for row in rows), np.int64, count),
+                np.fromiter((attr_index[content.pet_types[row['pet_type']]['attribute']] for row in rows),
+                            np.intp, count),
+                boss.attack, boss.defense, attr_index[boss.attribute], max_hp,
+                content.attribute_matrix, RAID_MAX_ROUNDS)
+            exp, money = raid_rewards(stats.damage, stats.defeated)
+
+            now_iso = datetime.now().isoformat()
+            level_ups = 0
+            for row, exp_gain, money_gain in zip(rows, exp.tolist(), money.tolist()):
+                apply_deltas(row, exp=exp_gain, money=money_gain)
+                row['last_raid_time'] = now_iso
+                if self._apply_level_up(row):
+                    level_ups += 1
+            if not await self.cache.settle(rows, "last_raid_time", raid.started_at):
+                return f"讨伐「{boss.name}」的队伍中有宠物的奖励已经结算过了，本次讨伐作废。"
+
+        total_damage = int(stats.damage.sum())
+        outcome = "成功" if stats.defeated else "失败"
+        top = stats.damage.argsort()[::-1][:3].tolist()
+        ranking = "  ".join(f"{rank}.「{rows[i]['pet_name']}」{int(stats.damage[i])}" for rank, i in enumerate(top, 1))
+        lines = [
+            f"⚔️ 世界Boss「{boss.name}」(Lv.{boss.level} {boss.attribute}属性) 讨伐{outcome}！",
+            f"参战 {count} 人，激战 {stats.rounds} 回合，共造成 {total_damage}/{max_hp} 点伤害，"
+            f"{int(stats.knocked_out.sum())} 只宠物被击倒。",
+            f"🏅 伤害排行：{ranking}",
+            f"全员按伤害获得了经验和金钱{'（讨伐成功，奖励翻倍）' if stats.defeated else ''}，"
+            f"伤害第一额外获得 ${RAID_MVP_MONEY}，共有 {level_ups} 只宠物升级。",
+        ]
+        return "\n".join(lines)
+
+    @filter.command("宠物锦标赛")
+    @instrumented
+    @rate_limited(cost=RENDER_COST)
+    async def pet_tournament(self, event: AstrMessageEvent):
+        """以本群所有宠物举办一场单败淘汰锦标赛。"""
+        group_id = event.get_group_id()
+        if not group_id:
+            yield event.plain_result("该功能仅限群聊使用哦。")
+            return
+        if group_id in self._tournaments:
+            yield event.plain_result("本群的锦标赛正在进行中，请稍候。")
+            return
+        wait = self._tournament_ready_at.get(group_id, 0.0) - time.monotonic()
+        if wait > 0:
+            yield event.plain_result(f"本群刚刚举办过锦标赛，还需等待 {timedelta(seconds=int(wait))} 才能再次举办。")
+            return
+
+        user_ids = await self.repo.group_user_ids(group_id)
+        if len(user_ids) < TOURNAMENT_MIN_ENTRANTS:
+            yield event.plain_result(f"本群至少需要 {TOURNAMENT_MIN_ENTRANTS} 只宠物才能举办锦标赛。")
+            return
+
+        self._tournaments.add(group_id)
+        try:
+            yield event.plain_result(f"🏆 本群宠物锦标赛开幕！共 {len(user_ids)} 只宠物按等级排定种子，单败淘汰，比赛开始！")
+            result = await self._settle_tournament(group_id, [str(user_id) for user_id in user_ids])
+            if isinstance(result, str):
+                yield event.plain_result(result)
+                return
+            self._tournament_ready_at[group_id] = (time.monotonic()
+                                                   + self.config.get("tournament_cooldown", 3600))
+            report, bracket = result
+            yield event.plain_result(report)
+            image = await self._render_bracket(bracket)
+            if image is not None:
+                yield event.chain_result([Comp.Image.fromBytes(image)])
+        finally:
+            self._tournaments.discard(group_id)
+
+    async def _settle_tournament(self, group_id: str, user_ids: list[str]) -> tuple[str, list] | str:
+        """
+        每一轮的全部对局在线程中批量模拟，经验、金钱、升级和比赛时间在一个事务中写入。
+        结算期间持有全部参赛者的锁；返回 (战报, 对阵图数据)，比赛作废时返回说明文字。
+        """
+        keys = [self._player_key(user_id, group_id) for user_id in user_ids]
+        started_at = datetime.now().isoformat()
+        async with self.player_locks.hold(*keys):
+            await self.cache.load_group(group_id)
+            rows = [await self.cache.draft(user_id, group_id) for user_id in user_ids]
+            rows = [row for row in rows if row is not None]
+            if len(rows) < TOURNAMENT_MIN_ENTRANTS:
+                return f"本群至少需要 {TOURNAMENT_MIN_ENTRANTS} 只宠物才能举办锦标赛。"
+            # 按等级、经验排定种子，头号种子在前
+            rows.sort(key=lambda row: (row['level'], row['exp']), reverse=True)
+
+            content = self.content.current
+            attr_index = content.attribute_index
+            count = len(rows)
+            rounds = await asyncio.to_thread(
+                run_bracket,
+                np.fromiter((row['attack'] for row in rows), np.float64, count),
+                np.fromiter((row['defense'] for row in rows), np.float64, count),
+                np.fromiter((row['level'] for row in rows), np.int64, count),
+                np.fromiter((row['satiety'] for row in rows), np.int64, count),
+                np.fromiter((attr_index[content.pet_types[row['pet_type']]['attribute']] for row in rows),
+                            np.intp, count),
+                content.attribute_matrix)
+            exp, money, _ = tournament_rewards(rounds, count)
+
+            now_iso = datetime.now().isoformat()
+            level_ups = 0
+            for row, exp_gain, money_gain in zip(rows, exp.tolist(), money.tolist()):
+                apply_deltas(row, exp=exp_gain, money=money_gain)
+                row['last_tournament_time'] = now_iso
+                if self._apply_level_up(row):
+                    level_ups += 1
+            if not await self.cache.settle(rows, "last_tournament_time", started_at):
+                return "有参赛宠物的锦标赛奖励已经结算过了，本次锦标赛作废。"
+
+        def name(index: int) -> str:
+            return rows[index]['pet_name']
+
+        def result(match) -> str:
+            loser = match.b if match.winner == match.a else match.a
+            return f"「{name(match.winner)}」胜「{name(loser)}」（{match.turns} 回合）"
+
+        final = rounds[-1][0]
+        lines = [
+            f"🏆 锦标赛结束！{count} 只宠物经过 {len(rounds)} 轮角逐，"
+            f"「{name(final.winner)}」(Lv.{rows[final.winner]['level']}) 夺得冠军！",
+            f"决赛：{result(final)}",
+        ]
+        if len(rounds) >= 2:
+            semifinals = [match for match in rounds[-2] if match.b is not None]
+            if semifinals:
+                lines.append(f"半决赛：{'；'.join(result(match) for match in semifinals)}")
+        lines.append(f"全员获得参赛经验，每赢一场再得 {WIN_EXP} 点经验和 ${WIN_MONEY}；"
+                     f"冠军、亚军、四强额外获得 ${PLACE_MONEY[0]}/${PLACE_MONEY[1]}/${PLACE_MONEY[2]}，"
+                     f"共有 {level_ups} 只宠物升级。")
+
+        # 对阵图只画最后四轮（十六强起），人数再多也保持图片大小不变
+        bracket = [[(name(match.a), None if match.b is None else name(match.b), match.winner == match.a)
+                    for match in matches] for matches in rounds[-4:]]
+        return "\n".join(lines), bracket
+
+    async def _render_bracket(self, bracket: list) -> bytes | None:
+        """渲染对阵图，失败时只记录日志，战报仍以文字发出。"""
+        try:
+            with self.metrics.timer("render", kind="bracket"):
+                return await self.render_pool.submit(bracket_job, "本群宠物锦标赛", bracket,
+                                                     self.card_options._replace(width=0))
+        except RenderBusyError:
+            logger.warning(f"渲染队列已满（{self.render_pool.pending} 个任务），跳过锦标赛对阵图。")
+        except asyncio.TimeoutError:
+            logger.error(f"生成锦标赛对阵图超时（超过 {self.render_pool.timeout} 秒）。")
+        except Exception as e:
+            logger.error(f"生成锦标赛对阵图失败: {e}")
+        return None
+
     @filter.command("宠物商店")
+    @instrumented
+    @rate_limited()
     async def shop(self, event: AstrMessageEvent):
         """显示宠物商店中可购买的物品列表。"""
         reply = "欢迎光临宠物商店！\n--------------------\n"
-        for name, item in SHOP_ITEMS.items():
+        for name, item in self.content.current.shop_items.items():
             reply += f"【{name}】 ${item['price']}\n效果: {item['description']}\n"
         reply += "--------------------\n使用 `/购买 [物品名] [数量]` 来购买。"
         yield event.plain_result(reply)
 
     @filter.command("宠物背包")
+    @instrumented
+    @rate_limited()
     async def backpack(self, event: AstrMessageEvent):
         """显示你的宠物背包中的物品。"""
         user_id, group_id = event.get_sender_id(), event.get_group_id()
-        if not self._get_pet(user_id, group_id):
+        if not await self._get_pet(user_id, group_id):
             yield event.plain_result("你还没有宠物，自然也没有背包啦。")
             return
 
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT item_name, quantity FROM inventory WHERE user_id = ? AND group_id = ?",
-                           (int(user_id), int(group_id)))
-            items = cursor.fetchall()
+        items = await self.cache.get_inventory(user_id, group_id)
 
         if not items:
             yield event.plain_result("你的背包空空如也，去商店看看吧！")
@@ -699,91 +881,180 @@ class PetPlugin(Star):
             reply += f"【{item_name}】 x {quantity}\n"
         yield event.plain_result(reply)
 
+    @filter.command("宠物排行")
+    @instrumented
+    @rate_limited()
+    async def pet_ranking(self, event: AstrMessageEvent, metric: str = "等级"):
+        """查看本群宠物排行榜，可按等级、金钱或胜场排序。"""
+        group_id = event.get_group_id()
+        if not group_id:
+            return
+        if metric not in RANK_METRICS:
+            yield event.plain_result(f"可选的排行方式有：{'、'.join(RANK_METRICS)}。")
+            return
+
+        rows = await self.leaderboard.top(group_id, metric)
+        if not rows:
+            yield event.plain_result("本群还没有人领养宠物呢。")
+            return
+
+        reply = [f"🏆 本群宠物{metric}排行榜 🏆", "--------------------"]
+        for rank, row in enumerate(rows, 1):
+            if metric == "金钱":
+                value = f"${row['money'] or 0}"
+            elif metric == "胜场":
+                value = f"{row['duel_wins'] or 0} 胜"
+            else:
+                value = f"Lv.{row['level']} ({row['exp']} exp)"
+            reply.append(f"{rank}. 「{row['pet_name']}」({row['pet_type']}) {value}")
+        yield event.plain_result("\n".join(reply))
+
     @filter.command("购买")
+    @instrumented
+    @rate_limited()
     async def buy_item(self, event: AstrMessageEvent, item_name: str, quantity: int = 1):
         """[修改] 从商店购买物品，使用原子性数据库操作防止竞态条件。"""
         user_id, group_id = event.get_sender_id(), event.get_group_id()
 
-        if item_name not in SHOP_ITEMS:
+        item_info = self.content.current.shop_items.get(item_name)
+        if item_info is None:
             yield event.plain_result(f"商店里没有「{item_name}」这种东西。")
             return
+        for result in await self._locked([self._player_key(user_id, group_id)],
+                                         self._buy(event, item_name, item_info, quantity)):
+            yield result
 
-        if not self._get_pet(user_id, group_id):
+    async def _buy(self, event: AstrMessageEvent, item_name: str, item_info: Mapping, quantity: int):
+        user_id, group_id = event.get_sender_id(), event.get_group_id()
+        if not await self._get_pet(user_id, group_id):
             yield event.plain_result("你还没有宠物，无法购买物品。")
             return
 
-        item_info = SHOP_ITEMS[item_name]
         total_cost = item_info['price'] * quantity
 
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-
-            cursor.execute(
-                "UPDATE pets SET money = money - ? WHERE user_id = ? AND group_id = ? AND money >= ?",
-                (total_cost, int(user_id), int(group_id), total_cost)
-            )
-
-            if cursor.rowcount == 0:
-                yield event.plain_result(f"你的钱不够哦！购买 {quantity} 个「{item_name}」需要 ${total_cost}。")
-                return
-
-            cursor.execute("""
-                    INSERT INTO inventory (user_id, group_id, item_name, quantity) 
-                    VALUES (?, ?, ?, ?)
-                    ON CONFLICT(user_id, group_id, item_name) 
-                    DO UPDATE SET quantity = quantity + excluded.quantity
-                """, (int(user_id), int(group_id), item_name, quantity))
-
-            conn.commit()
+        if not await self.cache.spend_money(user_id, group_id, total_cost):
+            yield event.plain_result(f"你的钱不够哦！购买 {quantity} 个「{item_name}」需要 ${total_cost}。")
+            return
+        await self.cache.add_item(user_id, group_id, item_name, quantity)
+        if not await self.cache.commit(user_id, group_id):
+            yield event.plain_result("你的宠物数据刚刚在别处被修改过，这次购买没有生效，请重试。")
+            return
 
         yield event.plain_result(f"购买成功！你花费 ${total_cost} 购买了 {quantity} 个「{item_name}」。")
 
     @filter.command("投喂")
+    @instrumented
+    @rate_limited()
     async def feed_pet_item(self, event: AstrMessageEvent, item_name: str):
         """[修改] 从背包中使用食物投喂宠物，使用原子性数据库操作防止竞态条件。"""
         user_id, group_id = event.get_sender_id(), event.get_group_id()
-        pet = self._get_pet(user_id, group_id)
+        for result in await self._locked([self._player_key(user_id, group_id)], self._feed(event, item_name)):
+            yield result
+
+    async def _feed(self, event: AstrMessageEvent, item_name: str):
+        user_id, group_id = event.get_sender_id(), event.get_group_id()
+        pet = await self._get_pet(user_id, group_id)
         if not pet:
             yield event.plain_result("你还没有宠物，不能进行投喂哦。")
             return
 
-        if item_name not in SHOP_ITEMS or SHOP_ITEMS[item_name].get('type') != 'food':
+        content = self.content.current
+        item_info = content.foods.get(item_name)
+        if item_info is None:
             yield event.plain_result(f"「{item_name}」不是可以投喂的食物。")
             return
 
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
+        satiety_gain = item_info.get('satiety', 0)
+        mood_gain = item_info.get('mood', 0)
 
-            cursor.execute(
-                "UPDATE inventory SET quantity = quantity - 1 WHERE user_id = ? AND group_id = ? AND item_name = ? AND quantity > 0",
-                (int(user_id), int(group_id), item_name)
-            )
-
-            if cursor.rowcount == 0:
-                yield event.plain_result(f"你的背包里没有「{item_name}」。")
-                return
-
-            item_info = SHOP_ITEMS[item_name]
-            satiety_gain = item_info.get('satiety', 0)
-            mood_gain = item_info.get('mood', 0)
-
-            cursor.execute(
-                "UPDATE pets SET satiety = MIN(100, satiety + ?), mood = MIN(100, mood + ?) WHERE user_id = ? AND group_id = ?",
-                (satiety_gain, mood_gain, int(user_id), int(group_id))
-            )
-
-            cursor.execute(
-                "DELETE FROM inventory WHERE user_id = ? AND group_id = ? AND item_name = ? AND quantity <= 0",
-                (int(user_id), int(group_id), item_name))
-
-            conn.commit()
+        if not await self.cache.take_item(user_id, group_id, item_name):
+            yield event.plain_result(f"你的背包里没有「{item_name}」。")
+            return
+        await self.cache.adjust_pet(user_id, group_id, satiety=satiety_gain, mood=mood_gain)
+        if not await self.cache.commit(user_id, group_id):
+            yield event.plain_result("你的宠物数据刚刚在别处被修改过，这次投喂没有生效，请重试。")
+            return
 
-        satiety_chinese = STAT_MAP.get('satiety', '饱食度')
-        mood_chinese = STAT_MAP.get('mood', '心情值')
+        satiety_chinese = content.stat_names['satiety']
+        mood_chinese = content.stat_names['mood']
         yield event.plain_result(
             f"你给「{pet['pet_name']}」投喂了「{item_name}」，它的{satiety_chinese}增加了 {satiety_gain}，{mood_chinese}增加了 {mood_gain}！")
 
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @filter.command("宠物平衡")
+    @instrumented
+    async def balance_table(self, event: AstrMessageEvent, level_a: int = 20, level_b: int = 20,
+                            battles: int = 10000):
+        """[管理员] 用批量模拟计算各种族两两对战的胜率表。"""
+        battles = max(100, min(battles, 100000))
+        content = self.content.current
+        rows = await asyncio.to_thread(matchup_table, content.pet_types, content.multipliers, level_a, level_b, battles)
+
+        reply = f"对战平衡表（先手 Lv.{level_a} vs 后手 Lv.{level_b}，每组 {battles} 场）\n--------------------\n"
+        for row in rows:
+            reply += (f"{row['attacker']} vs {row['defender']}: 胜率 {row['p1_win_rate']:.1%}，"
+                      f"平均 {row['turns_mean']:.1f} 回合（P90 {row['turns_p90']:.0f}），"
+                      f"场均伤害 {row['p1_damage_mean']:.0f}/{row['p2_damage_mean']:.0f}\n")
+        reply += "--------------------\n属性按种族初始值加每级 1.5 点期望成长计算，饱食度均为 100。"
+        yield event.plain_result(reply)
+
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @filter.command("宠物性能")
+    @instrumented
+    async def performance_stats(self, event: AstrMessageEvent):
+        """[管理员] 查看各命令耗时与数据库、渲染、LLM 的运行统计。"""
+        metrics = self.metrics
+        uptime = (datetime.now().timestamp() - metrics.started) / 3600
+        lines = [f"📊 宠物插件性能统计（已运行 {uptime:.1f} 小时）", "--------------------",
+                 "命令：次数 / 错误 / p50 / p95 / p99 / 平均查询数"]
+        for labels, hist in sorted(metrics.series("command_seconds"), key=lambda item: -item[1].count):
+            command = labels["command"]
+            errors = metrics.counter("commands_total", command=command, status="error")
+            queries = sum(metrics.counter("db_queries_total", command=command, kind=kind) for kind in ("read", "write"))
+            lines.append(f"{command}: {hist.count} / {errors:g} / {format_duration(hist.quantile(0.5))} / "
+                         f"{format_duration(hist.quantile(0.95))} / {format_duration(hist.quantile(0.99))} / "
+                         f"{queries / hist.count:.1f}")
+
+        lines.append("--------------------")
+        for title, name, labels in (("数据库读取", "db_read_seconds", {}),
+                                    ("数据库写事务", "db_transaction_seconds", {}),
+                                    ("写锁等待", "db_lock_wait_seconds", {}),
+                                    ("状态卡渲染", "render_seconds", {"kind": "status_card"}),
+                                    ("战报卡渲染", "render_seconds", {"kind": "battle_card"}),
+                                    ("LLM调用", "llm_seconds", {})):
+            hist = metrics.histogram(name, **labels)
+            lines.append(f"{title}: {hist.summary() if hist else '暂无数据'}")
+
+        card_total = self.card_cache.hits + self.card_cache.misses
+        hit_ratio = self.card_cache.hits / card_total if card_total else 0.0
+        encounter = self.encounters.stats()
+        lines.append(f"状态卡缓存命中率 {hit_ratio:.0%}（{card_total} 次），渲染失败 "
+                     f"{metrics.counter('render_errors_total', kind='status_card'):g} 次，排队 {self.render_pool.pending}")
+        lines.append(f"LLM 失败 {metrics.counter('llm_errors_total'):g} 次，奇遇事件池 {encounter['pool_size']} 条，"
+                     f"本地兜底 {encounter['fallbacks']} 次，熔断器 {encounter['breaker_state']}")
+        rejected = {reason: sum(metrics.counter("ratelimit_rejections_total", command=labels["command"], reason=reason)
+                                for labels, _ in metrics.series("command_seconds"))
+                    for reason in ("user", "group", "cooldown")}
+        lines.append(f"入口拦截：玩家限流 {rejected['user']:g} 次，群限流 {rejected['group']:g} 次，"
+                     f"冷却中 {rejected['cooldown']:g} 次")
+        yield event.plain_result("\n".join(lines))
+
+    def _collect_metrics(self):
+        """把各组件自己维护的计数交给指标导出。"""
+        yield "card_cache_hits_total", "counter", {}, self.card_cache.hits
+        yield "card_cache_misses_total", "counter", {}, self.card_cache.misses
+        yield "render_pending", "gauge", {}, self.render_pool.pending
+        yield "pet_cache_conflicts_total", "counter", {}, self.cache.conflicts
+        stats = self.encounters.stats()
+        yield "encounter_pool_size", "gauge", {}, stats["pool_size"]
+        yield "encounter_breaker_open", "gauge", {}, int(stats["breaker_state"] != "closed")
+        for name in ("breaker_trips", "provider_calls", "provider_failures", "provider_timeouts",
+                     "budget_timeouts", "fallbacks", "rejected", "discarded"):
+            yield f"encounter_{name}_total", "counter", {}, stats[name]
+
     @filter.command("宠物菜单")
+    @instrumented
+    @rate_limited()
     async def pet_menu(self, event: AstrMessageEvent):
         """显示所有可用的宠物插件命令。"""
 
@@ -810,6 +1081,14 @@ class PetPlugin(Star):
     /对决 @某人
     功能：与群内其他玩家的宠物进行一场1v1对决，有1小时冷却时间。
 
+    /宠物排行 [等级/金钱/胜场]
+    功能：查看本群宠物排行榜，默认按等级排序。
+
+    /世界Boss
+    功能：召唤或加入本群的世界Boss讨伐，集结时间结束后全员一起开战，按伤害分配奖励。
+    /宠物锦标赛
+    功能：本群所有宠物按等级排定种子进行单败淘汰赛，按胜场和名次发放奖励。
+
     【商店与喂养】
     /宠物商店
     功能：查看所有可以购买的商品及其价格和效果。
@@ -835,4 +1114,16 @@ class PetPlugin(Star):
 
     async def terminate(self):
         """插件卸载/停用时调用。"""
+        # 先把缓存中尚未落盘的修改写回，再关闭数据库连接
+        # 尚未开战的讨伐直接作废
+        for task in list(self._raid_tasks):
+            task.cancel()
+        await asyncio.gather(*self._raid_tasks, return_exceptions=True)
+        await self.content.close()
+        await self.encounters.close()
+        await self.cache.close()
+        await self.repo.close()
+        self.render_pool.shutdown()
+        export_enabled = self.config.get("metrics_export_interval", 60.0) > 0
+        await self.metrics.close(self.metrics_path if export_enabled else None)
         logger.info("群宠物对决版插件已卸载。")
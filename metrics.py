@@ -0,0 +1,251 @@
+import asyncio
+import functools
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Callable, Iterable
+
+from astrbot.api import logger
+
+# 耗时直方图的桶上限（秒），从内存操作一直覆盖到 LLM 调用
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+METRIC_PREFIX = "astrbot_pet_"
+
+# 当前正在执行的命令，用于把数据库查询等底层调用归到发起它的命令上
+_current_command: ContextVar[str] = ContextVar("pet_current_command", default="background")
+
+Labels = tuple[tuple[str, str], ...]
+# 采集函数在导出时调用，返回 (指标名, 类型, 标签, 数值)，用于暴露其他组件自己维护的计数
+Collector = Callable[[], Iterable[tuple[str, str, dict, float]]]
+
+
+def current_command() -> str:
+    return _current_command.get()
+
+
+def format_duration(seconds: float) -> str:
+    return f"{seconds * 1000:.1f}ms" if seconds < 1 else f"{seconds:.2f}s"
+
+
+def _labels(labels: dict) -> Labels:
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def _format_labels(labels: Labels, extra: str = "") -> str:
+    parts = [f'{k}="{v}"' for k, v in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Histogram:
+    """固定桶的耗时直方图，只记录每个桶的次数，记录一次的开销是一次二分查找。"""
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)  # 最后一个桶对应 +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """按桶内线性插值估算分位数；落在最后一个桶时返回最大的有限桶上限。"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                if i == len(LATENCY_BUCKETS):
+                    return LATENCY_BUCKETS[-1]
+                low = LATENCY_BUCKETS[i - 1] if i else 0.0
+                return low + (LATENCY_BUCKETS[i] - low) * (rank - seen) / n
+            seen += n
+        return LATENCY_BUCKETS[-1]
+
+    def summary(self) -> str:
+        return (f"{self.count} 次，p50 {format_duration(self.quantile(0.5))}，"
+                f"p95 {format_duration(self.quantile(0.95))}，p99 {format_duration(self.quantile(0.99))}")
+
+
+class Metrics:
+    """
+    进程内的指标注册表：计数器和耗时直方图，按指标名和标签区分。
+    所有记录操作都是纯内存的字典更新，可以常驻开启；
+    start 后按固定间隔把全部指标以 Prometheus 文本格式写入文件，供 node_exporter 等采集。
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self._counters: dict[tuple[str, Labels], float] = {}
+        self._histograms: dict[tuple[str, Labels], Histogram] = {}
+        self._collectors: list[Collector] = []
+        self._export_task: asyncio.Task | None = None
+
+    # --- 记录 ---
+    def inc(self, name: str, value: float = 1, **labels):
+        self._inc((name, _labels(labels)), value)
+
+    def observe(self, name: str, seconds: float, **labels):
+        self._observe((name, _labels(labels)), seconds)
+
+    def _inc(self, key: tuple[str, Labels], value: float = 1):
+        self._counters[key] = self._counters.get(key, 0) + value
+
+    def _observe(self, key: tuple[str, Labels], seconds: float):
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = Histogram()
+        histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """记录代码块的耗时到 {name}_seconds，抛出异常时额外计入 {name}_errors_total。"""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.inc(f"{name}_errors_total", **labels)
+            raise
+        finally:
+            self.observe(f"{name}_seconds", time.perf_counter() - start, **labels)
+
+    def add_collector(self, collector: Collector):
+        self._collectors.append(collector)
+
+    # --- 查询 ---
+    def counter(self, name: str, **labels) -> float:
+        return self._counters.get((name, _labels(labels)), 0)
+
+    def histogram(self, name: str, **labels) -> Histogram | None:
+        return self._histograms.get((name, _labels(labels)))
+
+    def series(self, name: str) -> list[tuple[dict, Histogram]]:
+        """返回某个直方图指标的所有标签组合。"""
+        return [(dict(labels), h) for (n, labels), h in self._histograms.items() if n == name]
+
+    def collected(self) -> list[tuple[str, str, Labels, float]]:
+        rows = []
+        for collector in self._collectors:
+            try:
+                rows.extend((name, kind, _labels(labels), value) for name, kind, labels, value in collector())
+            except Exception as e:
+                logger.error(f"采集指标失败: {e}")
+        return rows
+
+    # --- 导出 ---
+    def render_prometheus(self) -> str:
+        """以 Prometheus 文本格式输出全部指标。"""
+        lines = []
+        typed = set()
+
+        def declare(name: str, kind: str):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in sorted(self._counters.items()):
+            declare(METRIC_PREFIX + name, "counter")
+            lines.append(f"{METRIC_PREFIX}{name}{_format_labels(labels)} {value:g}")
+        for name, kind, labels, value in sorted(self.collected()):
+            declare(METRIC_PREFIX + name, kind)
+            lines.append(f"{METRIC_PREFIX}{name}{_format_labels(labels)} {value:g}")
+        for (name, labels), histogram in sorted(self._histograms.items(), key=lambda item: item[0]):
+            full = METRIC_PREFIX + name
+            declare(full, "histogram")
+            cumulative = 0
+            for bound, n in zip((*LATENCY_BUCKETS, "+Inf"), histogram.counts):
+                cumulative += n
+                le = f'le="{bound}"'
+                lines.append(f"{full}_bucket{_format_labels(labels, le)} {cumulative}")
+            lines.append(f"{full}_sum{_format_labels(labels)} {histogram.sum:.6f}")
+            lines.append(f"{full}_count{_format_labels(labels)} {histogram.count}")
+        declare(METRIC_PREFIX + "uptime_seconds", "gauge")
+        lines.append(f"{METRIC_PREFIX}uptime_seconds {time.time() - self.started:.0f}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: Path, text: str):
+        """先写临时文件再原子替换，采集方不会读到写了一半的文件。涉及文件 I/O，应在线程中调用。"""
+        tmp_path = path.with_name(path.name + ".tmp")
+        tmp_path.write_text(text, encoding="utf-8")
+        tmp_path.replace(path)
+
+    async def export(self, path: Path):
+        await asyncio.to_thread(self.write_prometheus, path, self.render_prometheus())
+
+    def start(self, path: Path, interval: float):
+        """启动定时导出任务；interval 不大于 0 时不导出。"""
+        if interval > 0 and (self._export_task is None or self._export_task.done()):
+            self._export_task = asyncio.create_task(self._export_loop(path, interval))
+
+    async def close(self, path: Path | None = None):
+        """停止定时导出，给出 path 时再导出最后一次。"""
+        if self._export_task is not None:
+            self._export_task.cancel()
+            try:
+                await self._export_task
+            except asyncio.CancelledError:
+                pass
+            self._export_task = None
+        if path is not None:
+            await self.export(path)
+
+    async def _export_loop(self, path: Path, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.export(path)
+            except Exception as e:
+                logger.error(f"导出性能指标失败: {e}")
+
+
+def instrumented(func):
+    """
+    命令处理函数的装饰器（放在 @filter.command 之下）：记录耗时、调用次数和错误次数，
+    并在处理期间把当前命令名放进上下文，使数据库查询等底层调用能按命令统计。
+    耗时只累计处理函数自身执行的时间，不包括调用方发送每条回复的时间。
+    """
+    command = func.__name__
+    # 标签在装饰时就确定，记录时不必再拼装
+    latency_key = ("command_seconds", (("command", command),))
+    ok_key = ("commands_total", (("command", command), ("status", "ok")))
+    error_key = ("commands_total", (("command", command), ("status", "error")))
+
+    @functools.wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        handler = func(self, *args, **kwargs)
+        elapsed = 0.0
+        status_key = ok_key
+        exhausted = False
+        perf_counter = time.perf_counter
+        try:
+            while True:
+                token = _current_command.set(command)
+                start = perf_counter()
+                try:
+                    result = await handler.__anext__()
+                except StopAsyncIteration:
+                    exhausted = True
+                    break
+                except Exception:
+                    exhausted = True
+                    status_key = error_key
+                    raise
+                finally:
+                    elapsed += perf_counter() - start
+                    _current_command.reset(token)
+                yield result
+        finally:
+            if not exhausted:
+                await handler.aclose()
+            metrics: Metrics = self.metrics
+            metrics._observe(latency_key, elapsed)
+            metrics._inc(status_key)
+
+    return wrapper
@@ -0,0 +1,141 @@
+from datetime import datetime
+from typing import Awaitable, Callable
+
+import aiosqlite
+
+from astrbot.api import logger
+
+# --- 建表语句 ---
+SQL_CREATE_PETS = """
+    CREATE TABLE IF NOT EXISTS pets (
+        user_id INTEGER NOT NULL,
+        group_id INTEGER NOT NULL,
+        pet_name TEXT NOT NULL,
+        pet_type TEXT NOT NULL,
+        level INTEGER DEFAULT 1,
+        exp INTEGER DEFAULT 0,
+        mood INTEGER DEFAULT 100,
+        satiety INTEGER DEFAULT 80,
+        attack INTEGER DEFAULT 10,
+        defense INTEGER DEFAULT 10,
+        evolution_stage INTEGER DEFAULT 1,
+        last_fed_time TEXT,
+        last_walk_time TEXT,
+        last_duel_time TEXT,
+        PRIMARY KEY (user_id, group_id)
+    )
+"""
+SQL_CREATE_INVENTORY = """
+    CREATE TABLE IF NOT EXISTS inventory (
+        user_id INTEGER NOT NULL,
+        group_id INTEGER NOT NULL,
+        item_name TEXT NOT NULL,
+        quantity INTEGER NOT NULL,
+        PRIMARY KEY (user_id, group_id, item_name)
+    )
+"""
+# 排行榜索引：按群查询前若干名时直接按索引顺序读取，无需全表扫描和排序
+SQL_CREATE_RANK_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_pets_group_level ON pets (group_id, level DESC, exp DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_pets_group_money ON pets (group_id, money DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_pets_group_duel_wins ON pets (group_id, duel_wins DESC)",
+)
+
+
+async def _columns(conn: aiosqlite.Connection, table: str) -> set[str]:
+    async with conn.execute(f"PRAGMA table_info({table})") as cursor:
+        return {row[1] for row in await cursor.fetchall()}
+
+
+async def _add_column(conn: aiosqlite.Connection, table: str, column: str, definition: str):
+    """字段不存在时才添加。没有版本号的旧数据库可能已经带有部分字段，因此不能直接 ALTER。"""
+    if column not in await _columns(conn, table):
+        await conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+# --- 迁移步骤 ---
+# 每个步骤只会执行一次；已经发布的步骤不能再修改，新的表结构变化一律追加新步骤
+async def _v1_baseline(conn: aiosqlite.Connection):
+    """宠物表与背包表，以及后来加入的金钱和衰减结算时间字段。"""
+    await conn.execute(SQL_CREATE_PETS)
+    await _add_column(conn, "pets", "money", "INTEGER DEFAULT 50")
+    await _add_column(conn, "pets", "last_updated_time", "TEXT")
+    await conn.execute(SQL_CREATE_INVENTORY)
+
+
+async def _v2_rankings(conn: aiosqlite.Connection):
+    """对决胜场字段与排行榜索引。"""
+    await _add_column(conn, "pets", "duel_wins", "INTEGER DEFAULT 0")
+    for sql in SQL_CREATE_RANK_INDEXES:
+        await conn.execute(sql)
+
+
+async def _v3_backfill_last_updated(conn: aiosqlite.Connection):
+    """一次性补齐从未结算过衰减的记录，衰减从迁移时刻开始计算，与读取时补写当前时间的旧行为一致。"""
+    await conn.execute("UPDATE pets SET last_updated_time = ? WHERE last_updated_time IS NULL",
+                       (datetime.now().isoformat(),))
+
+
+async def _v4_raids(conn: aiosqlite.Connection):
+    """世界 Boss 讨伐的结算时间字段。"""
+    await _add_column(conn, "pets", "last_raid_time", "TEXT")
+
+
+async def _v5_tournaments(conn: aiosqlite.Connection):
+    """群锦标赛的结算时间字段。"""
+    await _add_column(conn, "pets", "last_tournament_time", "TEXT")
+
+
+async def _v6_backfill_adopted(conn: aiosqlite.Connection):
+    """
+    补齐 v3 之后领养、此后从未写入过的宠物。这些宠物的 last_fed_time 就是领养时刻，
+    衰减从领养时开始计算，与现在领养时直接写入 last_updated_time 的行为一致。
+    """
+    await conn.execute("UPDATE pets SET last_updated_time = COALESCE(last_fed_time, ?) "
+                       "WHERE last_updated_time IS NULL", (datetime.now().isoformat(),))
+
+
+MIGRATIONS: tuple[tuple[str, Callable[[aiosqlite.Connection], Awaitable[None]]], ...] = (
+    ("建立宠物表与背包表", _v1_baseline),
+    ("添加对决胜场与排行榜索引", _v2_rankings),
+    ("补齐衰减结算时间", _v3_backfill_last_updated),
+    ("添加世界Boss讨伐结算时间", _v4_raids),
+    ("添加锦标赛结算时间", _v5_tournaments),
+    ("补齐领养后未结算过的衰减时间", _v6_backfill_adopted),
+)
+# 当前代码对应的数据库版本，记录在 PRAGMA user_version 中
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+async def _user_version(conn: aiosqlite.Connection) -> int:
+    async with conn.execute("PRAGMA user_version") as cursor:
+        return (await cursor.fetchone())[0]
+
+
+async def migrate(conn: aiosqlite.Connection) -> int:
+    """
+    把数据库升级到 SCHEMA_VERSION，返回升级前的版本号。
+    版本号已是最新时只读取一次 user_version，不做任何其他操作；
+    否则在一个 IMMEDIATE 事务中依次执行所有未执行的步骤并更新版本号，任何一步失败都整体回滚。
+    conn 必须处于自动提交模式（isolation_level=None）。
+    """
+    version = await _user_version(conn)
+    if version >= SCHEMA_VERSION:
+        if version > SCHEMA_VERSION:
+            logger.warning(f"数据库版本 {version} 高于插件支持的版本 {SCHEMA_VERSION}，可能是插件被降级了。")
+        return version
+
+    await conn.execute("BEGIN IMMEDIATE")
+    try:
+        # 拿到写锁后再读一次，其他进程可能已经完成了迁移
+        version = await _user_version(conn)
+        for target, (description, step) in enumerate(MIGRATIONS[version:], version + 1):
+            await step(conn)
+            logger.info(f"数据库迁移到版本 {target}：{description}")
+        if version < SCHEMA_VERSION:
+            await conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    except BaseException:
+        await conn.rollback()
+        raise
+    await conn.commit()
+    return version
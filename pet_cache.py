@@ -0,0 +1,384 @@
+import asyncio
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable
+
+from astrbot.api import logger
+
+from .rules import materialize_decay
+from .storage import PetRepository, SettlementConflictError
+
+# 有上限的状态值，增量修改时自动封顶
+STAT_CAPS = {"mood": 100, "satiety": 100}
+
+
+def apply_deltas(pet: dict, **deltas):
+    """在宠物数据上做增量修改，心情、饱食度封顶 100。"""
+    for field, delta in deltas.items():
+        value = (pet.get(field) or 0) + delta
+        cap = STAT_CAPS.get(field)
+        pet[field] = min(cap, value) if cap is not None else value
+
+
+class _Entry:
+    """单个玩家的缓存条目。pet 为 None 表示确认过该玩家没有宠物。"""
+    __slots__ = ("pet", "inventory", "loaded_at")
+
+    def __init__(self, pet: dict | None):
+        self.pet = pet
+        self.inventory: dict[str, int] | None = None  # 首次访问背包时才加载
+        self.loaded_at = time.monotonic()
+
+
+class PetStateCache:
+    """
+    位于 pets / inventory 表之前的进程内状态缓存（write-behind）。
+    读取优先命中内存；修改只落在内存并标记为脏，由后台任务按固定间隔在一个事务里批量写回。
+    超出容量时按 LRU 淘汰不活跃且已落盘的玩家。
+    on_change 在每次宠物数据被修改后以修改后的宠物数据调用，用于维护排行榜等派生数据。
+    shared 为 True 时数据库还会被其他实例修改：已落盘的条目超过 max_staleness 秒就重新读取，
+    命令在修改后调用 commit 立即写回并得知是否成功；被其他实例抢先修改的玩家会丢弃本地修改。
+    """
+
+    def __init__(self, repo: PetRepository, capacity: int = 2048, flush_interval: float = 5.0,
+                 on_change: Callable[[dict], None] | None = None, shared: bool = False,
+                 max_staleness: float = 1.0):
+        self.repo = repo
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self.on_change = on_change
+        self.shared = shared
+        self.max_staleness = max_staleness
+        self.conflicts = 0
+        self._entries: OrderedDict[tuple[int, int], _Entry] = OrderedDict()
+        self._dirty_pets: set[tuple[int, int]] = set()
+        self._dirty_items: dict[tuple[int, int], set[str]] = {}
+        self._loading: dict[tuple[int, int], asyncio.Future] = {}
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: asyncio.Task | None = None
+        # 定期落盘时因行版本冲突被丢弃了修改、还没有通过 commit 告知调用方的玩家
+        self._lost: set[tuple[int, int]] = set()
+
+    # --- 生命周期 ---
+    def start(self):
+        """启动后台定时落盘任务（重复调用无副作用）。"""
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        """停止后台任务，并把所有未落盘的修改写回数据库。"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"宠物状态缓存落盘失败，将在下个周期重试: {e}")
+
+    # --- 加载与淘汰 ---
+    def _is_dirty(self, key: tuple[int, int]) -> bool:
+        return key in self._dirty_pets or key in self._dirty_items
+
+    async def _entry(self, user_id: str, group_id: str) -> _Entry:
+        key = (int(user_id), int(group_id))
+        entry = self._entries.get(key)
+        if entry is not None:
+            # 共享模式下已落盘的旧条目可能已被其他实例修改，重新读取；有未落盘修改的条目一律保留
+            if (self.shared and time.monotonic() - entry.loaded_at > self.max_staleness
+                    and not self._is_dirty(key)):
+                del self._entries[key]
+            else:
+                self._entries.move_to_end(key)
+                return entry
+
+        # 同一玩家的并发加载只查询一次数据库
+        pending = self._loading.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        future = asyncio.get_running_loop().create_future()
+        self._loading[key] = future
+        try:
+            pet = await self.repo.get_pet(user_id, group_id)
+            entry = self._entries.get(key)  # 加载期间可能已被 put_pet 写入
+            if entry is None:
+                entry = _Entry(pet)
+                self._entries[key] = entry
+                self._evict()
+            future.set_result(entry)
+            return entry
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # 避免无人等待时产生未取回异常的警告
+            raise
+        finally:
+            del self._loading[key]
+
+    async def load_group(self, group_id: str):
+        """
+        用一次查询把某群的全部宠物载入缓存，代替逐个玩家查询；已在缓存中的条目以缓存为准
+        （共享模式下只有带未落盘修改的条目以缓存为准，其余条目换成刚读到的数据）。
+        调用方应持有相关玩家的锁，并在之后尽快 draft，避免刚载入的条目被淘汰。
+        """
+        for pet in await self.repo.group_pets(group_id):
+            key = (int(pet['user_id']), int(pet['group_id']))
+            if key in self._loading:
+                continue
+            if key not in self._entries or (self.shared and not self._is_dirty(key)):
+                self._entries[key] = _Entry(pet)
+        self._evict()
+
+    def _evict(self):
+        """淘汰最久未访问的干净条目；脏条目要等落盘后才能被淘汰。"""
+        overflow = len(self._entries) - self.capacity
+        if overflow <= 0:
+            return
+        for key in list(self._entries):
+            if overflow <= 0:
+                break
+            if self._is_dirty(key):
+                continue
+            del self._entries[key]
+            overflow -= 1
+
+    def _begin_write(self, key: tuple[int, int], pet: dict):
+        """
+        即将修改某只宠物时调用：先把读取时惰性计算的离线衰减结算进数据，再标记为脏。
+        纯读取不会经过这里，因此查看类命令不会产生任何写入。
+        """
+        materialize_decay(pet, datetime.now())
+        self._start_changes(key)
+        self._dirty_pets.add(key)
+
+    def _items_changed(self, key: tuple[int, int], item_name: str):
+        self._start_changes(key)
+        self._dirty_items.setdefault(key, set()).add(item_name)
+
+    def _start_changes(self, key: tuple[int, int]):
+        # 开始一批新的修改时，之前丢失的修改与这批无关，不再由 commit 报告
+        if not self._is_dirty(key):
+            self._lost.discard(key)
+
+    def _changed(self, pet: dict):
+        if self.on_change is not None:
+            self.on_change(pet)
+
+    # --- 宠物 ---
+    async def get_pet(self, user_id: str, group_id: str) -> dict | None:
+        """返回缓存中的宠物存储值（未应用衰减），调用方不应直接修改返回的字典。"""
+        return (await self._entry(user_id, group_id)).pet
+
+    def put_pet(self, pet: dict):
+        """放入一条已经写入数据库的完整宠物记录（如刚领养的宠物）。"""
+        key = (int(pet['user_id']), int(pet['group_id']))
+        entry = self._entries.get(key)
+        if entry is None:
+            self._entries[key] = _Entry(pet)
+            self._evict()
+        else:
+            entry.pet = pet
+            entry.loaded_at = time.monotonic()
+            self._entries.move_to_end(key)
+        self._changed(pet)
+
+    async def update_pet(self, user_id: str, group_id: str, **fields) -> dict | None:
+        """覆盖写入若干字段，返回修改后的宠物数据。"""
+        entry = await self._entry(user_id, group_id)
+        if entry.pet is None:
+            return None
+        self._begin_write((int(user_id), int(group_id)), entry.pet)
+        entry.pet.update(fields)
+        self._changed(entry.pet)
+        return entry.pet
+
+    async def adjust_pet(self, user_id: str, group_id: str, **deltas) -> dict | None:
+        """
+        在当前缓存值的基础上做增量修改（心情、饱食度封顶 100）。
+        增量总是作用于最新状态，不会覆盖其他命令在等待期间写入的结果。
+        """
+        entry = await self._entry(user_id, group_id)
+        pet = entry.pet
+        if pet is None:
+            return None
+        self._begin_write((int(user_id), int(group_id)), pet)
+        apply_deltas(pet, **deltas)
+        self._changed(pet)
+        return pet
+
+    async def spend_money(self, user_id: str, group_id: str, amount: int) -> bool:
+        """余额充足时扣款并返回 True，否则不做修改。"""
+        entry = await self._entry(user_id, group_id)
+        pet = entry.pet
+        if pet is None or (pet.get('money') or 0) < amount:
+            return False
+        self._begin_write((int(user_id), int(group_id)), pet)
+        pet['money'] -= amount
+        self._changed(pet)
+        return True
+
+    # --- 结算 ---
+    async def draft(self, user_id: str, group_id: str) -> dict | None:
+        """返回一份已结算离线衰减的宠物数据副本，修改后交给 settle 一次性提交。"""
+        entry = await self._entry(user_id, group_id)
+        if entry.pet is None:
+            return None
+        materialize_decay(entry.pet, datetime.now())
+        return dict(entry.pet)
+
+    async def settle(self, rows: list[dict], guard: str, cutoff: str) -> bool:
+        """
+        把 draft 得到并修改过的若干宠物数据在一个事务中直接写入数据库（不经过定期落盘），
+        成功后更新缓存并视为已落盘。guard 冷却字段在数据库中晚于 cutoff，
+        或（共享模式下）行版本已被其他实例改变时不做任何修改并返回 False。
+        调用方需要持有这些玩家的锁，保证 draft 与 settle 之间没有其他修改。
+        """
+        keys = [(int(row['user_id']), int(row['group_id'])) for row in rows]
+        # 与 flush 互斥，避免定期落盘用旧快照覆盖刚结算的数据
+        async with self._flush_lock:
+            was_dirty = self._dirty_pets.intersection(keys)
+            self._dirty_pets.difference_update(keys)
+            try:
+                await self.repo.settle_pets(rows, guard, cutoff)
+            except SettlementConflictError:
+                self._dirty_pets |= was_dirty
+                # 数据库中的冷却比缓存更新，说明缓存已过期，丢弃没有未落盘修改的条目以便重新加载
+                for key in keys:
+                    if not self._is_dirty(key):
+                        self._entries.pop(key, None)
+                return False
+            except BaseException:
+                self._dirty_pets |= was_dirty
+                raise
+            for key, row in zip(keys, rows):
+                entry = self._entries.get(key)
+                # 条目可能已被淘汰（参与者多于缓存容量时），排行榜等派生数据仍要收到结算后的数据
+                if entry is None:
+                    self._changed(row)
+                    continue
+                if entry.pet is None:
+                    entry.pet = row
+                else:
+                    entry.pet.update(row)
+                entry.loaded_at = time.monotonic()
+                self._changed(entry.pet)
+        return True
+
+    # --- 背包 ---
+    async def _inventory(self, user_id: str, group_id: str) -> dict[str, int]:
+        entry = await self._entry(user_id, group_id)
+        if entry.inventory is None:
+            items = await self.repo.get_inventory(user_id, group_id)
+            if entry.inventory is None:
+                entry.inventory = dict(items)
+        return entry.inventory
+
+    async def get_inventory(self, user_id: str, group_id: str) -> list[tuple[str, int]]:
+        inventory = await self._inventory(user_id, group_id)
+        return [(name, qty) for name, qty in inventory.items() if qty > 0]
+
+    async def add_item(self, user_id: str, group_id: str, item_name: str, quantity: int):
+        inventory = await self._inventory(user_id, group_id)
+        inventory[item_name] = inventory.get(item_name, 0) + quantity
+        self._items_changed((int(user_id), int(group_id)), item_name)
+
+    async def take_item(self, user_id: str, group_id: str, item_name: str) -> bool:
+        """从背包中取出一个物品，没有该物品时返回 False。"""
+        inventory = await self._inventory(user_id, group_id)
+        if inventory.get(item_name, 0) <= 0:
+            return False
+        inventory[item_name] -= 1
+        self._items_changed((int(user_id), int(group_id)), item_name)
+        return True
+
+    # --- 落盘 ---
+    async def flush(self):
+        """把所有脏数据在一个事务中写回数据库。"""
+        async with self._flush_lock:
+            if not self._dirty_pets and not self._dirty_items:
+                return
+            dirty_pets, self._dirty_pets = self._dirty_pets, set()
+            dirty_items, self._dirty_items = self._dirty_items, {}
+            await self._write_back(dirty_pets, dirty_items)
+
+    async def commit(self, user_id: str, group_id: str) -> bool:
+        """
+        共享模式下立即在一个事务中写回该玩家未落盘的修改，写入时检查行版本。
+        其他实例已先修改过该玩家时丢弃本地修改并返回 False，调用方应告知用户操作没有生效。
+        非共享模式下修改照常由定期落盘写回，直接返回 True。调用方需要持有该玩家的锁。
+        """
+        if not self.shared:
+            return True
+        key = (int(user_id), int(group_id))
+        async with self._flush_lock:
+            if key in self._lost:
+                # 修改已经在定期落盘时因冲突被丢弃
+                self._lost.discard(key)
+                return False
+            dirty_pets = {key} if key in self._dirty_pets else set()
+            self._dirty_pets.discard(key)
+            names = self._dirty_items.pop(key, None)
+            dirty_items = {key: names} if names else {}
+            if not dirty_pets and not dirty_items:
+                return True
+            stale = await self._write_back(dirty_pets, dirty_items)
+            self._lost.discard(key)
+            return key not in stale
+
+    async def _write_back(self, dirty_pets: set[tuple[int, int]],
+                          dirty_items: dict[tuple[int, int], set[str]]) -> list[tuple[int, int]]:
+        """写回取出的脏数据，返回因行版本冲突而丢弃了修改的玩家。调用方需持有 _flush_lock。"""
+        # 先在内存中拍下快照，写库期间的新修改会在下一轮落盘。
+        # 共享模式下只改了背包的玩家也带上宠物行，由它的行版本判断背包是否被其他实例改过
+        written = dirty_pets | dirty_items.keys() if self.shared else dirty_pets
+        pet_rows = [dict(self._entries[key].pet) for key in written
+                    if key in self._entries and self._entries[key].pet is not None]
+        item_rows = []
+        for key, names in dirty_items.items():
+            entry = self._entries.get(key)
+            if entry is None or entry.inventory is None:
+                continue
+            item_rows.extend((key[0], key[1], name, entry.inventory.get(name, 0)) for name in names)
+
+        try:
+            stale = await self.repo.write_back(pet_rows, item_rows)
+        except BaseException:
+            # 写入失败时恢复脏标记，下次重试
+            self._dirty_pets |= dirty_pets
+            for key, names in dirty_items.items():
+                self._dirty_items.setdefault(key, set()).update(names)
+            raise
+
+        now = time.monotonic()
+        for row in pet_rows:
+            entry = self._entries.get((int(row['user_id']), int(row['group_id'])))
+            if entry is not None and entry.pet is not None:
+                entry.loaded_at = now
+                if 'row_version' in row:
+                    entry.pet['row_version'] = row['row_version']
+        for key in stale:
+            # 其他实例先修改了这名玩家，本地修改建立在过期数据上，丢弃后从数据库重新读取
+            self.conflicts += 1
+            logger.warning(f"玩家 {key} 的数据已被其他实例修改，丢弃本实例尚未落盘的修改。")
+            self._entries.pop(key, None)
+            self._dirty_pets.discard(key)
+            self._dirty_items.pop(key, None)
+            self._lost.add(key)
+
+        # 清理已经用完的背包物品，并淘汰因脏数据而暂时超出容量的条目
+        for key, names in dirty_items.items():
+            entry = self._entries.get(key)
+            if entry is not None and entry.inventory is not None and key not in self._dirty_items:
+                for name in names:
+                    if entry.inventory.get(name, 0) <= 0:
+                        entry.inventory.pop(name, None)
+        self._evict()
+        return stale
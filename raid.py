@@ -0,0 +1,72 @@
+import random
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from .battle_sim import typical_stats
+from .content import GameContent
+
+# --- 讨伐参数 ---
+RAID_MAX_ROUNDS = 10
+BOSS_LEVEL_BONUS = 5  # Boss 比召唤者的宠物高几级
+BOSS_ATTACK_FACTOR = 1.2  # Boss 攻击力相对同级同种族宠物的倍数
+BOSS_HP_PER_PLAYER_LEVEL = 4  # 每名参与者为 Boss 增加 Boss 等级 * 该值的 HP
+# 奖励：经验 = 基础 + 伤害 / EXP_PER_DAMAGE，金钱 = 基础 + 伤害 / MONEY_PER_DAMAGE；讨伐成功时翻倍
+RAID_BASE_EXP, RAID_EXP_PER_DAMAGE = 5, 4
+RAID_BASE_MONEY, RAID_MONEY_PER_DAMAGE = 2, 20
+RAID_VICTORY_MULTIPLIER = 2
+RAID_MVP_MONEY = 50  # 伤害最高者的额外赏金
+
+
+@dataclass(frozen=True)
+class RaidBoss:
+    name: str
+    pet_type: str
+    attribute: str
+    level: int
+    attack: int
+    defense: int
+
+
+@dataclass
+class Raid:
+    """某个群正在集结中的讨伐。participants 按加入顺序记录 user_id -> 宠物名。"""
+    group_id: str
+    boss: RaidBoss
+    origin: str  # 讨伐结束后发送战报的会话
+    started_at: str  # ISO 时间，结算时用作冷却字段的截止时间
+    ends_at: float  # time.monotonic() 时刻
+    participants: dict[str, str] = field(default_factory=dict)
+
+    @property
+    def remaining(self) -> float:
+        return max(0.0, self.ends_at - time.monotonic())
+
+
+def make_boss(content: GameContent, level: int, rng: random.Random | None = None) -> RaidBoss:
+    """按召唤者的等级随机生成一个 Boss，属性取同种族同等级宠物的期望值再加强攻击。"""
+    rng = rng or random
+    pet_type = rng.choice(content.species)
+    info = content.pet_types[pet_type]
+    boss_level = level + BOSS_LEVEL_BONUS
+    attack, defense = typical_stats(info, boss_level)
+    return RaidBoss(name=f"巨型{pet_type}", pet_type=pet_type, attribute=info['attribute'], level=boss_level,
+                    attack=round(attack * BOSS_ATTACK_FACTOR), defense=defense)
+
+
+def boss_max_hp(boss: RaidBoss, participants: int) -> int:
+    """Boss 的 HP 随参与人数线性增长，人越多越难打，但每个人的期望贡献不变。"""
+    return participants * boss.level * BOSS_HP_PER_PLAYER_LEVEL
+
+
+def raid_rewards(damage: np.ndarray, defeated: bool) -> tuple[np.ndarray, np.ndarray]:
+    """按每人造成的伤害计算 (经验, 金钱) 奖励数组，伤害最高者额外获得赏金。"""
+    exp = RAID_BASE_EXP + damage // RAID_EXP_PER_DAMAGE
+    money = RAID_BASE_MONEY + damage // RAID_MONEY_PER_DAMAGE
+    if defeated:
+        exp = exp * RAID_VICTORY_MULTIPLIER
+        money = money * RAID_VICTORY_MULTIPLIER
+    if damage.size:
+        money[int(damage.argmax())] += RAID_MVP_MONEY
+    return exp, money
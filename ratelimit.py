@@ -0,0 +1,176 @@
+import functools
+import time
+from datetime import datetime, timedelta
+from typing import Hashable, Mapping
+
+# 可以在内存中提前拦截的冷却：动作 -> 宠物数据中记录上次执行时间的字段
+COOLDOWN_COLUMNS = {"walk": "last_walk_time", "duel": "last_duel_time"}
+# 会渲染图片的命令消耗的令牌数
+RENDER_COST = 3
+# 超过这么多条目时顺带清理已经过期（或已回满）的条目
+MAX_TRACKED_KEYS = 50_000
+
+
+def format_wait(seconds: float) -> str:
+    """与原先冷却提示相同的 H:MM:SS 格式。"""
+    return str(timedelta(seconds=int(seconds)))
+
+
+class TokenBuckets:
+    """
+    按键的令牌桶：每个键最多积攒 burst 个令牌，每秒恢复 rate 个。
+    只在被访问时按经过的时间补充令牌，没有后台任务；rate 不大于 0 时不做限制。
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self._buckets: dict[Hashable, list[float]] = {}  # key -> [令牌数, 上次补充的时刻]
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def take(self, key: Hashable, cost: float = 1.0, now: float | None = None) -> float:
+        """取出 cost 个令牌并返回 0；令牌不足时不做修改，返回还需等待的秒数。"""
+        now = time.monotonic() if now is None else now
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= MAX_TRACKED_KEYS:
+                self._prune(now)
+            bucket = self._buckets[key] = [self.burst, now]
+        else:
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        cost = min(cost, self.burst)
+        if bucket[0] < cost:
+            return (cost - bucket[0]) / self.rate
+        bucket[0] -= cost
+        return 0.0
+
+    def refund(self, key: Hashable, cost: float = 1.0):
+        bucket = self._buckets.get(key)
+        if bucket is not None:
+            bucket[0] = min(self.burst, bucket[0] + cost)
+
+    def _prune(self, now: float):
+        """已经回满的桶与新建的桶没有区别，可以直接丢弃。"""
+        full = [key for key, (tokens, stamp) in self._buckets.items()
+                if tokens + (now - stamp) * self.rate >= self.burst]
+        for key in full:
+            del self._buckets[key]
+
+
+class CooldownIndex:
+    """
+    (user_id, group_id, 动作) -> 冷却结束时刻（time.time()）的内存索引。
+    散步、对决读取或结算宠物时通过 observe 从 last_walk_time / last_duel_time 维护，只用于提前拒绝：
+    索引中没有记录或已过期时仍由命令本身读取宠物数据做权威的检查。
+    """
+
+    def __init__(self, durations: Mapping[str, timedelta]):
+        self.durations = {action: duration.total_seconds() for action, duration in durations.items()}
+        self._until: dict[tuple[str, str, str], tuple[str, float]] = {}  # key -> (原始时间字符串, 冷却结束时刻)
+
+    def observe(self, pet: dict):
+        """记录宠物数据中的冷却时间；时间字符串没有变化时不重新解析。"""
+        user_id, group_id = str(pet['user_id']), str(pet['group_id'])
+        for action, column in COOLDOWN_COLUMNS.items():
+            stamp = pet.get(column)
+            if not stamp or action not in self.durations:
+                continue
+            key = (user_id, group_id, action)
+            known = self._until.get(key)
+            if known is not None and known[0] == stamp:
+                continue
+            # 已经结束的冷却也保留，下次看到同一个时间字符串时不必再解析，超出上限时才清理
+            if known is None and len(self._until) >= MAX_TRACKED_KEYS:
+                self._prune()
+            self._until[key] = (stamp, datetime.fromisoformat(stamp).timestamp() + self.durations[action])
+
+    def remaining(self, user_id: str, group_id: str, action: str) -> float:
+        """冷却剩余的秒数，没有记录或已结束时为 0。"""
+        known = self._until.get((str(user_id), str(group_id), action))
+        return max(0.0, known[1] - time.time()) if known is not None else 0.0
+
+    def _prune(self):
+        now = time.time()
+        for key in [key for key, (_, until) in self._until.items() if until <= now]:
+            del self._until[key]
+
+
+class RateGate:
+    """
+    命令入口的闸门，在读取数据库、渲染图片之前依次检查：
+    玩家令牌桶 → 群令牌桶 → 冷却索引。
+    被限流时只在每段限流期间提示一次，之后的刷屏直接丢弃，不再回复。
+    """
+
+    def __init__(self, cooldowns: CooldownIndex, user_rate: float = 0.5, user_burst: float = 5,
+                 group_rate: float = 5.0, group_burst: float = 20):
+        self.cooldowns = cooldowns
+        self.users = TokenBuckets(user_rate, user_burst)
+        self.groups = TokenBuckets(group_rate, group_burst)
+        self._warned_until: dict[tuple[str, str], float] = {}
+
+    def admit(self, user_id: str, group_id: str | None, cost: float = 1.0) -> tuple[str, float] | None:
+        """放行时返回 None，否则返回 (原因, 需要等待的秒数)，原因为 user 或 group。"""
+        now = time.monotonic()
+        user_key = (user_id, group_id or "")
+        if self.users.enabled:
+            wait = self.users.take(user_key, cost, now)
+            if wait:
+                return "user", wait
+        if group_id and self.groups.enabled:
+            wait = self.groups.take(group_id, cost, now)
+            if wait:
+                if self.users.enabled:
+                    self.users.refund(user_key, cost)
+                return "group", wait
+        return None
+
+    def should_warn(self, user_id: str, group_id: str | None, wait: float) -> bool:
+        """同一玩家在一段限流期间只提示一次。"""
+        key = (user_id, group_id or "")
+        now = time.monotonic()
+        if self._warned_until.get(key, 0.0) > now:
+            return False
+        if len(self._warned_until) >= MAX_TRACKED_KEYS:
+            self._warned_until = {k: until for k, until in self._warned_until.items() if until > now}
+        self._warned_until[key] = now + wait
+        return True
+
+
+def rate_limited(cost: float = 1.0, cooldown: str | None = None, cooldown_message: str = ""):
+    """
+    命令处理函数的装饰器（放在 @instrumented 之下）：在处理函数执行前经过 self.rate_gate，
+    被拒绝时不会触及数据库和渲染。cost 为本命令消耗的令牌数（渲染图片的命令更贵）；
+    给出 cooldown 时还会查冷却索引，cooldown_message 中的 {remaining} 替换为剩余时间。
+    """
+    def decorate(func):
+        command = func.__name__
+
+        @functools.wraps(func)
+        async def wrapper(self, event, *args, **kwargs):
+            gate: RateGate = self.rate_gate
+            user_id, group_id = event.get_sender_id(), event.get_group_id()
+            rejected = gate.admit(user_id, group_id, cost)
+            if rejected is not None:
+                reason, wait = rejected
+                self.metrics.inc("ratelimit_rejections_total", command=command, reason=reason)
+                if gate.should_warn(user_id, group_id, wait):
+                    scope = "你" if reason == "user" else "本群"
+                    yield event.plain_result(f"{scope}的操作太频繁了，请 {max(1, round(wait))} 秒后再试。")
+                return
+            if cooldown is not None and group_id:
+                remaining = gate.cooldowns.remaining(user_id, group_id, cooldown)
+                if remaining > 0:
+                    self.metrics.inc("ratelimit_rejections_total", command=command, reason="cooldown")
+                    yield event.plain_result(cooldown_message.format(remaining=format_wait(remaining)))
+                    return
+            async for result in func(self, event, *args, **kwargs):
+                yield result
+
+        return wrapper
+
+    return decorate
@@ -0,0 +1,355 @@
+import asyncio
+import io
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+from typing import NamedTuple
+
+from PIL import Image, ImageDraw, ImageFont
+
+# --- 状态卡布局 ---
+CARD_SIZE = (800, 600)
+SPRITE_SIZE = (300, 300)
+SPRITE_POS = (50, 150)
+EXP_BAR = (400, 340, 750, 360)
+FONT_TITLE_SIZE = 40
+FONT_TEXT_SIZE = 28
+FONT_SMALL_SIZE = 22
+# --- 战报卡布局 ---
+BATTLE_SPRITE_SIZE = (160, 160)
+BATTLE_SPRITE_POS = ((80, 80), (560, 80))
+HP_CHART = (70, 320, 730, 440)
+HP_COLORS = ("#66ccff", "#ff7766")
+BATTLE_LINES_TOP = 462
+BATTLE_LINE_HEIGHT = 27
+BATTLE_MAX_LINES = 5
+BATTLE_LINE_LENGTH = 32  # 小号字体一行大约能放下的汉字数
+# --- 锦标赛对阵图布局 ---
+BRACKET_SLOT_HEIGHT = 48  # 首轮每个签位占的高度，之后每轮翻倍
+BRACKET_COLUMN_WIDTH = 240
+BRACKET_MARGIN = 30
+BRACKET_TOP = 110
+BRACKET_NAME_LENGTH = 7  # 名字超过该长度时截断
+
+
+class EncodeOptions(NamedTuple):
+    """
+    图片输出格式。format 可选 png / png8（256 色调色板 PNG）/ jpeg / webp；
+    quality 只对 jpeg 和 webp 生效；width 为输出宽度，高度按比例缩放。
+    """
+    format: str = "png"
+    quality: int = 85
+    width: int = CARD_SIZE[0]
+
+    @property
+    def suffix(self) -> str:
+        return {"jpeg": ".jpg", "webp": ".webp"}.get(self.format, ".png")
+
+
+def encode_image(img: Image.Image, options: EncodeOptions) -> bytes:
+    """按输出选项缩放并编码图片，直接返回字节，不经过磁盘。"""
+    if options.width and options.width != img.width:
+        height = round(img.height * options.width / img.width)
+        img = img.resize((options.width, height), Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    if options.format == "jpeg":
+        img.convert("RGB").save(buffer, format="JPEG", quality=options.quality, optimize=True)
+    elif options.format == "webp":
+        img.save(buffer, format="WEBP", quality=options.quality, method=4)
+    elif options.format == "png8":
+        img.quantize(colors=256, method=Image.Quantize.FASTOCTREE).save(buffer, format="PNG", optimize=True)
+    else:
+        img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class AssetManager:
+    """
+    状态卡素材的进程内缓存。
+    背景、字体和所有进化形态的立绘只解码、缩放一次；每个种族/进化阶段还缓存一张
+    已经贴好立绘、种族信息和经验条底框的底图，渲染时只需复制底图再画动态文字。
+    """
+
+    def __init__(self, assets_dir: Path):
+        self.assets_dir = assets_dir
+        self._lock = threading.Lock()
+        self._background: Image.Image | None = None
+        # FreeType 字体对象不能被多个线程同时使用，每个渲染线程各持有一份
+        self._local = threading.local()
+        self._sprites: dict[tuple[str, tuple[int, int]], Image.Image] = {}
+        self._templates: dict[tuple[str, str, str], Image.Image] = {}
+        self._battle_templates: dict[tuple[str, str], Image.Image] = {}
+
+    def background(self) -> Image.Image:
+        if self._background is None:
+            with self._lock:
+                if self._background is None:
+                    with Image.open(self.assets_dir / "background.png") as img:
+                        self._background = img.convert("RGBA").resize(CARD_SIZE)
+        return self._background
+
+    def fonts(self) -> tuple[ImageFont.FreeTypeFont, ImageFont.FreeTypeFont]:
+        """返回当前线程的 (标题字体, 正文字体)。"""
+        fonts = getattr(self._local, "fonts", None)
+        if fonts is None:
+            font_path = str(self.assets_dir / "font.ttf")
+            fonts = (ImageFont.truetype(font_path, FONT_TITLE_SIZE), ImageFont.truetype(font_path, FONT_TEXT_SIZE))
+            self._local.fonts = fonts
+        return fonts
+
+    def small_font(self) -> ImageFont.FreeTypeFont:
+        """当前线程的小号正文字体，用于战报卡上的说明文字。"""
+        font = getattr(self._local, "small_font", None)
+        if font is None:
+            font = self._local.small_font = ImageFont.truetype(str(self.assets_dir / "font.ttf"), FONT_SMALL_SIZE)
+        return font
+
+    def sprite(self, image_name: str, size: tuple[int, int] = SPRITE_SIZE) -> Image.Image:
+        """按文件名返回缩放到指定大小（默认 300x300）的 RGBA 立绘。"""
+        key = (image_name, size)
+        sprite = self._sprites.get(key)
+        if sprite is None:
+            with Image.open(self.assets_dir / image_name) as img:
+                sprite = img.convert("RGBA").resize(size)
+            self._sprites[key] = sprite
+        return sprite
+
+    def template(self, pet_type: str, evo_info: dict) -> Image.Image:
+        """某个种族、进化形态的底图，调用方必须 copy() 后再绘制。"""
+        key = (pet_type, evo_info['name'], evo_info['image'])
+        template = self._templates.get(key)
+        if template is None:
+            _, font_text = self.fonts()
+            template = self.background().copy()
+            sprite = self.sprite(evo_info['image'])
+            template.paste(sprite, SPRITE_POS, sprite)
+            draw = ImageDraw.Draw(template)
+            draw.text((400, 200), f"种族: {evo_info['name']} ({pet_type})", font=font_text, fill="white")
+            draw.rectangle(EXP_BAR, outline="white", fill="gray")
+            self._templates[key] = template
+        return template
+
+    def battle_template(self, images: tuple[str, str]) -> Image.Image:
+        """某一对立绘的战报卡底图（背景、双方立绘和 HP 曲线坐标轴），调用方必须 copy() 后再绘制。"""
+        template = self._battle_templates.get(images)
+        if template is None:
+            # 曲线区域压暗一些，方便看清曲线
+            shade = Image.new("RGBA", CARD_SIZE, (0, 0, 0, 0))
+            ImageDraw.Draw(shade).rectangle(HP_CHART, fill=(0, 0, 0, 96))
+            template = Image.alpha_composite(self.background(), shade)
+            for image_name, pos in zip(images, BATTLE_SPRITE_POS):
+                sprite = self.sprite(image_name, BATTLE_SPRITE_SIZE)
+                template.paste(sprite, pos, sprite)
+            left, top, right, bottom = HP_CHART
+            ImageDraw.Draw(template).line((left, top, left, bottom, right, bottom), fill="white", width=2)
+            self._battle_templates[images] = template
+        return template
+
+    def preload(self, pet_types: dict):
+        """预先加载全部素材并合成所有底图，通常在插件启动时放到线程里执行。"""
+        for pet_type, info in pet_types.items():
+            for evo_info in info['evolutions'].values():
+                self.template(pet_type, evo_info)
+
+
+def render_status_card(assets: AssetManager, pet_data: dict, evo_info: dict, sender_name: str,
+                       exp_needed: int) -> Image.Image:
+    """在缓存的底图上绘制宠物的动态信息，返回状态卡图片。"""
+    font_title, font_text = assets.fonts()
+    img = assets.template(pet_data['pet_type'], evo_info).copy()
+    draw = ImageDraw.Draw(img)
+
+    draw.text((CARD_SIZE[0] / 2, 50), f"{pet_data['pet_name']}的状态", font=font_title, fill="white", anchor="mt")
+    draw.text((400, 150), f"主人: {sender_name}", font=font_text, fill="white")
+    draw.text((400, 250), f"等级: Lv.{pet_data['level']}", font=font_text, fill="white")
+
+    exp_ratio = min(1.0, pet_data['exp'] / exp_needed)
+    draw.text((400, 300), f"经验: {pet_data['exp']} / {exp_needed}", font=font_text, fill="white")
+    left, top, right, bottom = EXP_BAR
+    draw.rectangle([left, top, left + (right - left) * exp_ratio, bottom], fill="#66ccff")
+
+    draw.text((400, 390), f"攻击: {pet_data['attack']}", font=font_text, fill="white")
+    draw.text((600, 390), f"防御: {pet_data['defense']}", font=font_text, fill="white")
+    draw.text((400, 440), f"心情: {pet_data['mood']}/100", font=font_text, fill="white")
+    draw.text((600, 440), f"饱食度: {pet_data['satiety']}/100", font=font_text, fill="white")
+
+    # [新增] 显示金钱
+    draw.text((400, 490), f"金钱: ${pet_data.get('money', 0)}", font=font_text, fill="#FFD700")
+    return img
+
+
+def _clip(text: str, length: int) -> str:
+    return text if len(text) <= length else text[:length - 1] + "…"
+
+
+def render_battle_card(assets: AssetManager, data: dict) -> Image.Image:
+    """
+    绘制一场战斗的战报卡：双方立绘与信息、胜负、每回合的 HP 曲线，以及关键时刻和结算说明。
+    无论战斗持续多少回合，输出都是一张固定大小的图片。data 由 battle.battle_card_data 生成。
+    """
+    font_title, font_text = assets.fonts()
+    font_small = assets.small_font()
+    img = assets.battle_template(tuple(data['images'])).copy()
+    draw = ImageDraw.Draw(img)
+    names, winner = data['names'], data['winner']
+
+    draw.text((CARD_SIZE[0] / 2, 110), "VS", font=font_title, fill="white", anchor="mm")
+    draw.text((CARD_SIZE[0] / 2, 170), f"「{_clip(names[winner], 8)}」获胜", font=font_text, fill="#FFD700",
+              anchor="mm")
+    draw.text((CARD_SIZE[0] / 2, 210), f"共 {data['turns']} 回合", font=font_small, fill="white", anchor="mm")
+    for side, (x, _) in enumerate(BATTLE_SPRITE_POS):
+        center = x + BATTLE_SPRITE_SIZE[0] / 2
+        draw.text((center, 262), _clip(names[side], 8), font=font_text, fill=HP_COLORS[side], anchor="mm")
+        draw.text((center, 296), f"Lv.{data['levels'][side]} {data['attributes'][side]}系  "
+                                 f"HP {data['curves'][side][-1]}/{data['start_hp'][side]}",
+                  font=font_small, fill="white", anchor="mm")
+
+    left, top, right, bottom = HP_CHART
+    turns = max(1, data['turns'])
+    for side, curve in enumerate(data['curves']):
+        start = max(1, data['start_hp'][side])
+        points = [(left + (right - left) * turn / turns, bottom - (bottom - top) * hp / start)
+                  for turn, hp in enumerate(curve)]
+        draw.line(points, fill=HP_COLORS[side], width=3, joint="curve")
+
+    for i, line in enumerate(data['lines'][:BATTLE_MAX_LINES]):
+        draw.text((left, BATTLE_LINES_TOP + i * BATTLE_LINE_HEIGHT), _clip(line, BATTLE_LINE_LENGTH),
+                  font=font_small, fill="white")
+    return img
+
+
+def render_bracket(assets: AssetManager, title: str,
+                   rounds: list[list[tuple[str, str | None, bool]]]) -> Image.Image:
+    """
+    绘制淘汰赛对阵图。rounds 从左到右依次为每一轮的对局 (上方选手, 下方选手或 None 表示轮空, 上方是否获胜)，
+    最右侧再画出冠军。
+    """
+    font_title, font_text = assets.fonts()
+    slots = len(rounds[0]) * 2
+    width = BRACKET_MARGIN * 2 + BRACKET_COLUMN_WIDTH * (len(rounds) + 1)
+    height = BRACKET_TOP + BRACKET_SLOT_HEIGHT * slots + BRACKET_MARGIN
+    img = assets.background().resize((width, height))
+    draw = ImageDraw.Draw(img)
+    draw.text((width / 2, 40), title, font=font_title, fill="white", anchor="mt")
+
+    def name_at(x: float, y: float, name: str | None, won: bool):
+        draw.text((x + 6, y - 4), _clip(name, BRACKET_NAME_LENGTH) if name else "轮空", font=font_text,
+                  fill="#FFD700" if won else "#BBBBBB", anchor="ls")
+        draw.line((x, y, x + BRACKET_COLUMN_WIDTH - 20, y), fill="white", width=2)
+
+    champion = None
+    for r, matches in enumerate(rounds):
+        span = BRACKET_SLOT_HEIGHT * 2 ** r
+        x = BRACKET_MARGIN + BRACKET_COLUMN_WIDTH * r
+        right = x + BRACKET_COLUMN_WIDTH - 20
+        for i, (upper, lower, upper_won) in enumerate(matches):
+            y_upper = BRACKET_TOP + span * (2 * i + 1) - span / 2
+            y_lower = y_upper + span
+            name_at(x, y_upper, upper, upper_won)
+            name_at(x, y_lower, lower, not upper_won)
+            draw.line((right, y_upper, right, y_lower), fill="white", width=2)
+            draw.line((right, (y_upper + y_lower) / 2, right + 20, (y_upper + y_lower) / 2), fill="white", width=2)
+            champion = upper if upper_won else lower
+
+    x = BRACKET_MARGIN + BRACKET_COLUMN_WIDTH * len(rounds)
+    y = BRACKET_TOP + BRACKET_SLOT_HEIGHT * slots / 2
+    draw.text((x + 6, y - 44), "冠军", font=font_text, fill="white", anchor="ls")
+    name_at(x, y, champion, True)
+    return img
+
+
+# --- 渲染工作池 ---
+# 工作线程/进程内共享的素材缓存，由 init_worker 在池初始化时建立
+_worker_assets: AssetManager | None = None
+
+
+def init_worker(assets_dir: Path, pet_types: dict | None = None):
+    """工作池初始化函数：建立（或复用）本进程的素材缓存，并可选地预加载全部底图。"""
+    global _worker_assets
+    if _worker_assets is None or _worker_assets.assets_dir != assets_dir:
+        _worker_assets = AssetManager(assets_dir)
+    if pet_types:
+        try:
+            _worker_assets.preload(pet_types)
+        except Exception:
+            pass  # 素材缺失时不能让整个进程池初始化失败，错误会在具体渲染任务中暴露
+
+
+def worker_assets() -> AssetManager:
+    if _worker_assets is None:
+        raise RuntimeError("渲染工作池尚未初始化")
+    return _worker_assets
+
+
+def status_card_job(pet_data: dict, evo_info: dict, sender_name: str, exp_needed: int,
+                    options: EncodeOptions) -> bytes:
+    """在工作线程/进程中渲染并编码状态卡，返回图片字节。参数与返回值均可被 pickle。"""
+    img = render_status_card(worker_assets(), pet_data, evo_info, sender_name, exp_needed)
+    return encode_image(img, options)
+
+
+def battle_card_job(data: dict, options: EncodeOptions) -> bytes:
+    """在工作线程/进程中渲染并编码战报卡，返回图片字节。"""
+    return encode_image(render_battle_card(worker_assets(), data), options)
+
+
+def bracket_job(title: str, rounds: list[list[tuple[str, str | None, bool]]], options: EncodeOptions) -> bytes:
+    """在工作线程/进程中渲染并编码锦标赛对阵图，返回图片字节。"""
+    return encode_image(render_bracket(worker_assets(), title, rounds), options)
+
+
+class RenderBusyError(Exception):
+    """渲染队列已满。"""
+
+
+class RenderPool:
+    """
+    有界的图片渲染工作池，支持线程池或进程池。
+    排队中加运行中的任务数超过 max_pending 时直接拒绝（RenderBusyError），
+    单个任务等待超过 timeout 秒时抛出 asyncio.TimeoutError，事件循环始终不被 Pillow 阻塞。
+    """
+
+    def __init__(self, assets_dir: Path, pet_types: dict, mode: str = "thread", workers: int = 2,
+                 max_pending: int = 8, timeout: float = 10.0):
+        self.mode = mode
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._pending = 0
+        self._executor = self._create_executor(assets_dir, pet_types)
+
+    def _create_executor(self, assets_dir: Path, pet_types: dict) -> Executor:
+        if self.mode == "process":
+            # 使用 spawn，避免在带有事件循环和线程的进程里 fork
+            return ProcessPoolExecutor(max_workers=self.workers, mp_context=get_context("spawn"),
+                                       initializer=init_worker, initargs=(assets_dir, pet_types))
+        # 线程模式下所有线程共享一份素材缓存，在主线程先建好
+        init_worker(assets_dir)
+        return ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="pet-render")
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def _release(self, _future):
+        self._pending -= 1
+
+    async def submit(self, fn, *args):
+        """提交一个渲染任务并等待结果。"""
+        if self._pending >= self.max_pending:
+            raise RenderBusyError()
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, fn, *args)
+        # 名额在任务真正结束时才归还，超时放弃等待的任务仍计入队列，防止后台堆积
+        self._pending += 1
+        future.add_done_callback(self._release)
+        return await asyncio.wait_for(asyncio.shield(future), self.timeout)
+
+    async def preload(self, pet_types: dict):
+        """让工作池预先加载素材。线程模式在一个工作线程里完成；进程模式已在各进程初始化时完成。"""
+        if self.mode != "process":
+            await asyncio.get_running_loop().run_in_executor(self._executor, worker_assets().preload, pet_types)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,100 @@
+import random
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+# --- 离线状态衰减 ---
+# 每小时降低的饱食度与心情
+DECAY_PER_HOUR = {"satiety": 3, "mood": 2}
+
+
+def decay_hours(last_updated: str | None, now: datetime) -> int:
+    """自上次结算以来经过的完整小时数；从未结算过的记录视为 0。"""
+    if not last_updated:
+        return 0
+    seconds = (now - datetime.fromisoformat(last_updated)).total_seconds()
+    return max(0, int(seconds // 3600))
+
+
+def decayed_value(value: int, rate_per_hour: int, hours: int) -> int:
+    """衰减后的数值，不低于 0。"""
+    return max(0, value - rate_per_hour * hours)
+
+
+def with_decay(pet: dict, now: datetime) -> dict:
+    """
+    返回应用了离线衰减后的宠物数据副本，不修改传入的字典。
+    衰减是 (存储值, last_updated_time, now) 的纯函数，读取时即时计算，不需要写库。
+    """
+    view = dict(pet)
+    hours = decay_hours(pet.get('last_updated_time'), now)
+    if hours:
+        for field, rate in DECAY_PER_HOUR.items():
+            view[field] = decayed_value(pet[field], rate, hours)
+    return view
+
+
+def materialize_decay(pet: dict, now: datetime) -> int:
+    """
+    将衰减结果写进宠物数据本身，在该行因为其他原因即将写库时调用。
+    last_updated_time 只前进完整的小时数，不足一小时的部分留到下次结算，
+    因此频繁写入不会让衰减被不断“重置”。返回结算的小时数。
+    """
+    last_updated = pet.get('last_updated_time')
+    if not last_updated:
+        pet['last_updated_time'] = now.isoformat()
+        return 0
+    hours = decay_hours(last_updated, now)
+    if hours:
+        for field, rate in DECAY_PER_HOUR.items():
+            pet[field] = decayed_value(pet[field], rate, hours)
+        pet['last_updated_time'] = (datetime.fromisoformat(last_updated) + timedelta(hours=hours)).isoformat()
+    return hours
+
+
+# --- 冷却 ---
+WALK_COOLDOWN = timedelta(minutes=5)
+DUEL_COOLDOWN = timedelta(minutes=30)
+
+
+# --- 等级与经验 ---
+MAX_LEVEL = 100
+
+
+def _exp_formula(level: int) -> int:
+    return int(10 * (level ** 1.5))
+
+
+# EXP_TO_NEXT[level]：从 level 级升到下一级所需经验（下标 0 不使用）
+EXP_TO_NEXT = (0,) + tuple(_exp_formula(level) for level in range(1, MAX_LEVEL + 1))
+# CUMULATIVE_EXP[level]：从 1 级升到 level 级累计所需经验，即 EXP_TO_NEXT 的前缀和
+CUMULATIVE_EXP = (0,) + tuple(accumulate(EXP_TO_NEXT[1:MAX_LEVEL], initial=0))
+
+
+def exp_for_next_level(level: int) -> int:
+    """计算升到下一级所需的总经验。"""
+    if 1 <= level <= MAX_LEVEL:
+        return EXP_TO_NEXT[level]
+    return _exp_formula(level)
+
+
+def resolve_level_up(level: int, exp: int) -> tuple[int, int]:
+    """
+    根据当前等级和当前等级内的经验，一次性算出最终等级和剩余经验。
+    通过在累计经验表上二分查找完成，耗时与升了多少级无关；达到 MAX_LEVEL 后经验继续累积但不再升级。
+    """
+    if level >= MAX_LEVEL:
+        return level, exp
+    total = CUMULATIVE_EXP[level] + exp
+    new_level = min(MAX_LEVEL, bisect_right(CUMULATIVE_EXP, total, lo=1) - 1)
+    return new_level, total - CUMULATIVE_EXP[new_level]
+
+
+def roll_level_up_stats(levels: int) -> tuple[int, int]:
+    """
+    升 levels 级时攻击、防御的总成长。每级各随机 +1~2，
+    等价于 levels 次独立抛硬币，用一次 getrandbits 完成。
+    """
+    attack = levels + random.getrandbits(levels).bit_count()
+    defense = levels + random.getrandbits(levels).bit_count()
+    return attack, defense
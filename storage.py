@@ -0,0 +1,300 @@
+import asyncio
+import time
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+import aiosqlite
+
+from .metrics import Metrics, current_command
+from .migrations import migrate
+
+# --- SQL 语句 ---
+# 语句文本保持为常量，配合 sqlite3 的 cached_statements 复用已编译的预处理语句
+SQL_SELECT_PET = "SELECT * FROM pets WHERE user_id = ? AND group_id = ?"
+SQL_INSERT_PET = """
+    INSERT INTO pets (user_id, group_id, pet_name, pet_type, attack, defense,
+                      last_fed_time, last_walk_time, last_duel_time, last_updated_time)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+SQL_SELECT_INVENTORY = "SELECT item_name, quantity FROM inventory WHERE user_id = ? AND group_id = ?"
+SQL_UPSERT_ITEM = """
+    INSERT INTO inventory (user_id, group_id, item_name, quantity)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(user_id, group_id, item_name)
+    DO UPDATE SET quantity = excluded.quantity
+"""
+SQL_DELETE_ITEM = "DELETE FROM inventory WHERE user_id = ? AND group_id = ? AND item_name = ?"
+SQL_TOP_PETS = ("SELECT user_id, group_id, pet_name, pet_type, level, exp, money, duel_wins FROM pets "
+                "WHERE group_id = ? ORDER BY {order} LIMIT ?")
+RANK_COLUMNS = ("level", "exp", "money", "duel_wins")
+SQL_GROUP_USER_IDS = "SELECT user_id FROM pets WHERE group_id = ?"
+SQL_GROUP_PETS = "SELECT * FROM pets WHERE group_id = ?"
+
+# 缓存落盘时整行写回的列
+PET_WRITE_COLUMNS = (
+    "pet_name", "pet_type", "level", "exp", "mood", "satiety", "attack", "defense",
+    "evolution_stage", "last_fed_time", "last_walk_time", "last_duel_time", "money", "last_updated_time",
+    "duel_wins", "last_raid_time", "last_tournament_time",
+)
+SQL_WRITE_BACK_PET = (f"UPDATE pets SET {', '.join(f'{col} = ?' for col in PET_WRITE_COLUMNS)} "
+                      f"WHERE user_id = ? AND group_id = ?")
+# 结算时整行写回，但只有冷却字段仍早于截止时间的行才会被更新
+SETTLE_GUARD_COLUMNS = ("last_duel_time", "last_walk_time", "last_raid_time", "last_tournament_time")
+SQL_SETTLE_PET = SQL_WRITE_BACK_PET + " AND ({guard} IS NULL OR {guard} <= ?)"
+
+
+class SettlementConflictError(Exception):
+    """结算时发现冷却条件已不满足（例如被其他实例抢先结算），整个事务已回滚。"""
+
+
+def pet_write_params(row: dict, *extra) -> list:
+    """按 PET_WRITE_COLUMNS 的顺序取出整行写回的参数，extra 追加在后面。"""
+    return [row.get(col) for col in PET_WRITE_COLUMNS] + [row['user_id'], row['group_id'], *extra]
+
+
+class PetRepository(ABC):
+    """
+    pets / inventory 表的异步存储接口，缓存、排行榜和各命令只通过这些方法访问数据。
+    实现需要保证 write_back 与 settle_pets 各自在一个事务中完成，且 settle_pets 的冷却检查与写入是原子的。
+    shared 为 True 的实现允许多个插件实例同时修改同一份数据：宠物行带有 row_version 字段，
+    每次写入都要求行版本与读取时一致并把它加一（同时更新传入的行数据），版本不一致的玩家不会被写入。
+    给出 metrics 时记录每次读取和写事务的耗时、等待写入的时间，以及按命令统计的查询次数。
+    """
+
+    # 数据是否可能被其他进程同时修改
+    shared = False
+
+    def __init__(self, metrics: Metrics | None = None):
+        self.metrics = metrics
+
+    def _record_read(self, start: float):
+        if self.metrics is not None:
+            self.metrics.observe("db_read_seconds", time.perf_counter() - start)
+            self.metrics.inc("db_queries_total", command=current_command(), kind="read")
+
+    def _record_write(self, start: float, acquired: float):
+        if self.metrics is not None:
+            self.metrics.observe("db_lock_wait_seconds", acquired - start)
+            self.metrics.observe("db_transaction_seconds", time.perf_counter() - acquired)
+            self.metrics.inc("db_queries_total", command=current_command(), kind="write")
+
+    # --- 连接管理 ---
+    @abstractmethod
+    async def connect(self):
+        """建立连接并完成表结构迁移，重复调用无副作用。"""
+
+    @abstractmethod
+    async def close(self):
+        """关闭所有连接。"""
+
+    # --- 宠物表 ---
+    @abstractmethod
+    async def get_pet(self, user_id: str, group_id: str) -> dict | None:
+        """读取宠物原始数据，不做任何加工。"""
+
+    @abstractmethod
+    async def create_pet(self, user_id: str, group_id: str, pet_name: str, pet_type: str,
+                         attack: int, defense: int, fed_time: str, cooldown_time: str):
+        """写入新领养的宠物；fed_time 同时作为离线衰减的起点（last_updated_time）。"""
+
+    @abstractmethod
+    async def top_pets(self, group_id: str | int, order_by: tuple[str, ...], limit: int) -> list[dict]:
+        """按给定字段（RANK_COLUMNS 之一）降序返回某群的前 limit 只宠物。"""
+
+    @abstractmethod
+    async def group_user_ids(self, group_id: str | int) -> list[int]:
+        """某群所有养了宠物的玩家。"""
+
+    @abstractmethod
+    async def group_pets(self, group_id: str | int) -> list[dict]:
+        """某群全部宠物的原始数据。"""
+
+    @abstractmethod
+    async def write_back(self, pet_rows: list[dict],
+                         item_rows: list[tuple[int, int, str, int]]) -> list[tuple[int, int]]:
+        """
+        在一个事务中批量写回宠物整行数据和背包物品数量，数量不大于 0 的物品会被删除。
+        返回因为行版本已被其他实例改变而没有写入（宠物与背包都没有写入）的玩家 (user_id, group_id)。
+        """
+
+    @abstractmethod
+    async def settle_pets(self, pet_rows: list[dict], guard: str, cutoff: str):
+        """
+        在一个事务中整行写回多只宠物，每一行都要求 guard 字段为空或不晚于 cutoff。
+        任意一行条件不满足时回滚全部写入并抛出 SettlementConflictError。
+        """
+
+    # --- 背包表 ---
+    @abstractmethod
+    async def get_inventory(self, user_id: str, group_id: str) -> list[tuple[str, int]]:
+        ...
+
+
+class SQLitePetRepository(PetRepository):
+    """
+    基于 aiosqlite 的本地实现。
+    整个插件共享一条长连接负责写入，另有少量只读连接供查询使用（WAL 模式下读写互不阻塞），
+    所有 SQL 都不会在事件循环线程上执行。
+    """
+
+    def __init__(self, db_path: Path, busy_timeout_ms: int = 5000, read_pool_size: int = 2,
+                 statement_cache_size: int = 128, metrics: Metrics | None = None):
+        super().__init__(metrics)
+        self.db_path = db_path
+        self.busy_timeout_ms = busy_timeout_ms
+        self.read_pool_size = read_pool_size
+        self.statement_cache_size = statement_cache_size
+        self._writer: aiosqlite.Connection | None = None
+        self._readers: asyncio.Queue[aiosqlite.Connection] | None = None
+        self._reader_conns: list[aiosqlite.Connection] = []
+        self._connect_lock = asyncio.Lock()
+        # 单条写连接上同一时刻只允许一个事务
+        self._write_lock = asyncio.Lock()
+
+    # --- 连接管理 ---
+    async def _open(self) -> aiosqlite.Connection:
+        conn = await aiosqlite.connect(
+            self.db_path,
+            timeout=self.busy_timeout_ms / 1000,
+            isolation_level=None,  # 自行管理事务，只读查询不会隐式开启事务
+            cached_statements=self.statement_cache_size,
+        )
+        conn.row_factory = aiosqlite.Row
+        await conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        return conn
+
+    async def connect(self) -> aiosqlite.Connection:
+        """打开（或返回已打开的）写连接，首次调用时完成数据库迁移与连接池初始化。"""
+        if self._writer is not None:
+            return self._writer
+        async with self._connect_lock:
+            if self._writer is not None:
+                return self._writer
+            writer = await self._open()
+            await writer.execute("PRAGMA journal_mode = WAL")
+            await writer.execute("PRAGMA synchronous = NORMAL")
+            await migrate(writer)
+
+            readers: asyncio.Queue[aiosqlite.Connection] = asyncio.Queue()
+            for _ in range(self.read_pool_size):
+                conn = await self._open()
+                self._reader_conns.append(conn)
+                readers.put_nowait(conn)
+            self._readers = readers
+            self._writer = writer
+        return self._writer
+
+    async def close(self):
+        """关闭所有连接。"""
+        for conn in self._reader_conns:
+            await conn.close()
+        self._reader_conns.clear()
+        self._readers = None
+        if self._writer is not None:
+            await self._writer.close()
+            self._writer = None
+
+    @asynccontextmanager
+    async def reader(self):
+        """借出一条只读连接；未配置读连接池时退回到写连接。"""
+        await self.connect()
+        start = time.perf_counter()
+        try:
+            if not self._reader_conns:
+                yield self._writer
+                return
+            conn = await self._readers.get()
+            try:
+                yield conn
+            finally:
+                self._readers.put_nowait(conn)
+        finally:
+            self._record_read(start)
+
+    @asynccontextmanager
+    async def transaction(self):
+        """在写连接上开启一个 IMMEDIATE 事务，退出时提交，出错时回滚。"""
+        conn = await self.connect()
+        start = time.perf_counter()
+        async with self._write_lock:
+            acquired = time.perf_counter()
+            try:
+                await conn.execute("BEGIN IMMEDIATE")
+                try:
+                    yield conn
+                except BaseException:
+                    await conn.rollback()
+                    raise
+                else:
+                    await conn.commit()
+            finally:
+                self._record_write(start, acquired)
+
+    # --- 宠物表 ---
+    async def get_pet(self, user_id: str, group_id: str) -> dict | None:
+        async with self.reader() as conn:
+            async with conn.execute(SQL_SELECT_PET, (int(user_id), int(group_id))) as cursor:
+                row = await cursor.fetchone()
+        return dict(row) if row else None
+
+    async def create_pet(self, user_id: str, group_id: str, pet_name: str, pet_type: str,
+                         attack: int, defense: int, fed_time: str, cooldown_time: str):
+        async with self.transaction() as conn:
+            await conn.execute(SQL_INSERT_PET, (int(user_id), int(group_id), pet_name, pet_type, attack, defense,
+                                                fed_time, cooldown_time, cooldown_time, fed_time))
+
+    async def top_pets(self, group_id: str | int, order_by: tuple[str, ...], limit: int) -> list[dict]:
+        """走排行榜索引。"""
+        if not order_by or any(col not in RANK_COLUMNS for col in order_by):
+            raise ValueError(f"不支持的排序字段: {order_by}")
+        sql = SQL_TOP_PETS.format(order=", ".join(f"{col} DESC" for col in order_by))
+        async with self.reader() as conn:
+            async with conn.execute(sql, (int(group_id), limit)) as cursor:
+                rows = await cursor.fetchall()
+        return [dict(row) for row in rows]
+
+    async def group_user_ids(self, group_id: str | int) -> list[int]:
+        async with self.reader() as conn:
+            async with conn.execute(SQL_GROUP_USER_IDS, (int(group_id),)) as cursor:
+                rows = await cursor.fetchall()
+        return [row["user_id"] for row in rows]
+
+    async def group_pets(self, group_id: str | int) -> list[dict]:
+        async with self.reader() as conn:
+            async with conn.execute(SQL_GROUP_PETS, (int(group_id),)) as cursor:
+                rows = await cursor.fetchall()
+        return [dict(row) for row in rows]
+
+    async def write_back(self, pet_rows: list[dict],
+                         item_rows: list[tuple[int, int, str, int]]) -> list[tuple[int, int]]:
+        """单进程独占数据库文件，不存在其他写入者，总是全部写入。"""
+        pet_params = [pet_write_params(row) for row in pet_rows]
+        upserts = [row for row in item_rows if row[3] > 0]
+        deletes = [row[:3] for row in item_rows if row[3] <= 0]
+        async with self.transaction() as conn:
+            if pet_params:
+                await conn.executemany(SQL_WRITE_BACK_PET, pet_params)
+            if upserts:
+                await conn.executemany(SQL_UPSERT_ITEM, upserts)
+            if deletes:
+                await conn.executemany(SQL_DELETE_ITEM, deletes)
+        return []
+
+    async def settle_pets(self, pet_rows: list[dict], guard: str, cutoff: str):
+        """条件写在 UPDATE 的 WHERE 中，按实际更新的行数判断是否有行不满足。"""
+        if guard not in SETTLE_GUARD_COLUMNS:
+            raise ValueError(f"不支持的冷却字段: {guard}")
+        sql = SQL_SETTLE_PET.format(guard=guard)
+        params = [pet_write_params(row, cutoff) for row in pet_rows]
+        async with self.transaction() as conn:
+            cursor = await conn.executemany(sql, params)
+            if cursor.rowcount != len(params):
+                raise SettlementConflictError()
+
+    # --- 背包表 ---
+    async def get_inventory(self, user_id: str, group_id: str) -> list[tuple[str, int]]:
+        async with self.reader() as conn:
+            async with conn.execute(SQL_SELECT_INVENTORY, (int(user_id), int(group_id))) as cursor:
+                rows = await cursor.fetchall()
+        return [(row["item_name"], row["quantity"]) for row in rows]
@@ -0,0 +1,291 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+import aiomysql
+
+from astrbot.api import logger
+
+from .metrics import Metrics
+from .storage import (PET_WRITE_COLUMNS, RANK_COLUMNS, SETTLE_GUARD_COLUMNS, PetRepository,
+                      SettlementConflictError, pet_write_params)
+
+# --- 表结构 ---
+# 时间字段与 SQLite 一样保存为 ISO 字符串，冷却比较按字符串进行，两种后端的行为一致
+SQL_CREATE_PETS = """
+    CREATE TABLE IF NOT EXISTS pets (
+        user_id BIGINT NOT NULL,
+        group_id BIGINT NOT NULL,
+        pet_name VARCHAR(64) NOT NULL,
+        pet_type VARCHAR(32) NOT NULL,
+        level INT DEFAULT 1,
+        exp INT DEFAULT 0,
+        mood INT DEFAULT 100,
+        satiety INT DEFAULT 80,
+        attack INT DEFAULT 10,
+        defense INT DEFAULT 10,
+        evolution_stage INT DEFAULT 1,
+        last_fed_time VARCHAR(32),
+        last_walk_time VARCHAR(32),
+        last_duel_time VARCHAR(32),
+        money INT DEFAULT 50,
+        last_updated_time VARCHAR(32),
+        duel_wins INT DEFAULT 0,
+        last_raid_time VARCHAR(32),
+        last_tournament_time VARCHAR(32),
+        PRIMARY KEY (user_id, group_id),
+        KEY idx_pets_group_level (group_id, level DESC, exp DESC),
+        KEY idx_pets_group_money (group_id, money DESC),
+        KEY idx_pets_group_duel_wins (group_id, duel_wins DESC)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+"""
+SQL_CREATE_INVENTORY = """
+    CREATE TABLE IF NOT EXISTS inventory (
+        user_id BIGINT NOT NULL,
+        group_id BIGINT NOT NULL,
+        item_name VARCHAR(64) NOT NULL,
+        quantity INT NOT NULL,
+        PRIMARY KEY (user_id, group_id, item_name)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+"""
+SQL_CREATE_SCHEMA_VERSION = """
+    CREATE TABLE IF NOT EXISTS pet_schema_version (
+        id TINYINT PRIMARY KEY,
+        version INT NOT NULL
+    ) ENGINE=InnoDB
+"""
+
+# 每个步骤只会执行一次；已经发布的步骤不能再修改，新的表结构变化一律追加新步骤。
+# MySQL 后端从 SQLite 第 5 版的表结构起步，因此第一步即为完整的表结构；之后的步骤与 SQLite 对应
+MYSQL_MIGRATIONS: tuple[tuple[str, tuple[str, ...]], ...] = (
+    ("建立宠物表与背包表", (SQL_CREATE_PETS, SQL_CREATE_INVENTORY)),
+    ("补齐领养后未结算过的衰减时间",
+     ("UPDATE pets SET last_updated_time = COALESCE(last_fed_time, DATE_FORMAT(NOW(6), '%Y-%m-%dT%H:%i:%s.%f')) "
+      "WHERE last_updated_time IS NULL",)),
+    ("添加行版本", ("ALTER TABLE pets ADD COLUMN row_version INT NOT NULL DEFAULT 0",)),
+)
+MYSQL_SCHEMA_VERSION = len(MYSQL_MIGRATIONS)
+# 多个实例同时启动时只让一个实例执行迁移
+MIGRATION_LOCK_NAME = "astrbot_pet_plugin_migrate"
+MIGRATION_LOCK_TIMEOUT = 60
+
+# --- SQL 语句 ---
+SQL_SELECT_PET = "SELECT * FROM pets WHERE user_id = %s AND group_id = %s"
+SQL_INSERT_PET = """
+    INSERT INTO pets (user_id, group_id, pet_name, pet_type, attack, defense,
+                      last_fed_time, last_walk_time, last_duel_time, last_updated_time)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+SQL_SELECT_INVENTORY = "SELECT item_name, quantity FROM inventory WHERE user_id = %s AND group_id = %s"
+SQL_UPSERT_ITEM = """
+    INSERT INTO inventory (user_id, group_id, item_name, quantity)
+    VALUES (%s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE quantity = VALUES(quantity)
+"""
+SQL_DELETE_ITEM = "DELETE FROM inventory WHERE user_id = %s AND group_id = %s AND item_name = %s"
+SQL_TOP_PETS = ("SELECT user_id, group_id, pet_name, pet_type, level, exp, money, duel_wins FROM pets "
+                "WHERE group_id = %s ORDER BY {order} LIMIT %s")
+SQL_GROUP_USER_IDS = "SELECT user_id FROM pets WHERE group_id = %s"
+SQL_GROUP_PETS = "SELECT * FROM pets WHERE group_id = %s"
+# 整行写回只在行版本与读取时一致时生效，并把版本加一；版本总会变化，因此受影响行数可以用来判断是否写入
+SQL_WRITE_BACK_PET = (f"UPDATE pets SET {', '.join(f'{col} = %s' for col in PET_WRITE_COLUMNS)}, "
+                      f"row_version = row_version + 1 WHERE user_id = %s AND group_id = %s AND row_version = %s")
+# 结算前按主键锁住所有相关行；InnoDB 按主键顺序加锁，并发结算之间不会交叉等待
+SQL_LOCK_FOR_SETTLE = ("SELECT user_id, group_id, row_version, {guard} AS guard FROM pets "
+                       "WHERE (user_id, group_id) IN ({keys}) FOR UPDATE")
+
+
+class MySQLPetRepository(PetRepository):
+    """
+    基于 aiomysql 的实现，供多个机器人进程共用同一份玩家数据。
+    所有读写都从有上限的连接池借用连接；只读查询在自动提交模式下执行，写入各自开启事务。
+    每次写入都检查行版本：其他实例在本实例读取之后修改过的玩家不会被覆盖，由缓存丢弃本地数据后重新读取。
+    结算另外用 SELECT ... FOR UPDATE 锁住相关行再检查冷却与版本，其他实例的并发结算会等待行锁而不是重复结算。
+    """
+
+    shared = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 3306, user: str = "root", password: str = "",
+                 database: str = "astrbot_pet", pool_size: int = 5, connect_timeout: float = 10.0,
+                 metrics: Metrics | None = None):
+        super().__init__(metrics)
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.database = database
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self._pool: aiomysql.Pool | None = None
+        self._connect_lock = asyncio.Lock()
+
+    # --- 连接管理 ---
+    async def connect(self) -> aiomysql.Pool:
+        """创建（或返回已创建的）连接池，首次调用时完成表结构迁移。"""
+        if self._pool is not None:
+            return self._pool
+        async with self._connect_lock:
+            if self._pool is not None:
+                return self._pool
+            pool = await aiomysql.create_pool(
+                host=self.host,
+                port=self.port,
+                user=self.user,
+                password=self.password,
+                db=self.database,
+                minsize=1,
+                maxsize=max(self.pool_size, 1),
+                connect_timeout=self.connect_timeout,
+                charset="utf8mb4",
+                autocommit=True,
+                cursorclass=aiomysql.DictCursor,
+            )
+            try:
+                async with pool.acquire() as conn:
+                    await self._migrate(conn)
+            except BaseException:
+                pool.close()
+                await pool.wait_closed()
+                raise
+            self._pool = pool
+        return self._pool
+
+    async def _migrate(self, conn: aiomysql.Connection):
+        """
+        把表结构升级到 MYSQL_SCHEMA_VERSION。DDL 会隐式提交，无法放进事务，
+        因此用 GET_LOCK 让同时启动的多个实例依次检查，拿到锁后再读一次版本号。
+        """
+        async with conn.cursor() as cursor:
+            await cursor.execute(SQL_CREATE_SCHEMA_VERSION)
+            await cursor.execute("SELECT GET_LOCK(%s, %s) AS locked", (MIGRATION_LOCK_NAME, MIGRATION_LOCK_TIMEOUT))
+            if not (await cursor.fetchone())["locked"]:
+                raise TimeoutError("等待其他实例完成数据库迁移超时")
+            try:
+                await cursor.execute("SELECT version FROM pet_schema_version WHERE id = 1")
+                row = await cursor.fetchone()
+                version = row["version"] if row else 0
+                if version > MYSQL_SCHEMA_VERSION:
+                    logger.warning(f"数据库版本 {version} 高于插件支持的版本 {MYSQL_SCHEMA_VERSION}，可能是插件被降级了。")
+                for target, (description, statements) in enumerate(MYSQL_MIGRATIONS[version:], version + 1):
+                    for sql in statements:
+                        await cursor.execute(sql)
+                    await cursor.execute("REPLACE INTO pet_schema_version (id, version) VALUES (1, %s)", (target,))
+                    logger.info(f"数据库迁移到版本 {target}：{description}")
+            finally:
+                await cursor.execute("SELECT RELEASE_LOCK(%s)", (MIGRATION_LOCK_NAME,))
+
+    async def close(self):
+        """关闭连接池。"""
+        if self._pool is not None:
+            self._pool.close()
+            await self._pool.wait_closed()
+            self._pool = None
+
+    @asynccontextmanager
+    async def reader(self):
+        """借出一条连接上的游标，用于自动提交模式下的只读查询。"""
+        pool = await self.connect()
+        start = time.perf_counter()
+        try:
+            async with pool.acquire() as conn, conn.cursor() as cursor:
+                yield cursor
+        finally:
+            self._record_read(start)
+
+    @asynccontextmanager
+    async def transaction(self):
+        """借出一条连接并开启事务，退出时提交，出错时回滚。等待连接池的时间记为写入等待。"""
+        pool = await self.connect()
+        start = time.perf_counter()
+        async with pool.acquire() as conn:
+            acquired = time.perf_counter()
+            try:
+                await conn.begin()
+                try:
+                    async with conn.cursor() as cursor:
+                        yield cursor
+                except BaseException:
+                    await conn.rollback()
+                    raise
+                else:
+                    await conn.commit()
+            finally:
+                self._record_write(start, acquired)
+
+    # --- 宠物表 ---
+    async def get_pet(self, user_id: str, group_id: str) -> dict | None:
+        async with self.reader() as cursor:
+            await cursor.execute(SQL_SELECT_PET, (int(user_id), int(group_id)))
+            return await cursor.fetchone()
+
+    async def create_pet(self, user_id: str, group_id: str, pet_name: str, pet_type: str,
+                         attack: int, defense: int, fed_time: str, cooldown_time: str):
+        async with self.transaction() as cursor:
+            await cursor.execute(SQL_INSERT_PET, (int(user_id), int(group_id), pet_name, pet_type, attack, defense,
+                                                  fed_time, cooldown_time, cooldown_time, fed_time))
+
+    async def top_pets(self, group_id: str | int, order_by: tuple[str, ...], limit: int) -> list[dict]:
+        """走排行榜索引。"""
+        if not order_by or any(col not in RANK_COLUMNS for col in order_by):
+            raise ValueError(f"不支持的排序字段: {order_by}")
+        sql = SQL_TOP_PETS.format(order=", ".join(f"{col} DESC" for col in order_by))
+        async with self.reader() as cursor:
+            await cursor.execute(sql, (int(group_id), limit))
+            return list(await cursor.fetchall())
+
+    async def group_user_ids(self, group_id: str | int) -> list[int]:
+        async with self.reader() as cursor:
+            await cursor.execute(SQL_GROUP_USER_IDS, (int(group_id),))
+            return [row["user_id"] for row in await cursor.fetchall()]
+
+    async def group_pets(self, group_id: str | int) -> list[dict]:
+        async with self.reader() as cursor:
+            await cursor.execute(SQL_GROUP_PETS, (int(group_id),))
+            return list(await cursor.fetchall())
+
+    async def write_back(self, pet_rows: list[dict],
+                         item_rows: list[tuple[int, int, str, int]]) -> list[tuple[int, int]]:
+        """逐行检查版本后写入（按主键顺序，与其他实例的写入加锁顺序一致），版本不一致的玩家连同背包一起跳过。"""
+        stale = set()
+        async with self.transaction() as cursor:
+            for row in sorted(pet_rows, key=lambda row: (int(row['user_id']), int(row['group_id']))):
+                await cursor.execute(SQL_WRITE_BACK_PET, pet_write_params(row, row.get('row_version', 0)))
+                if cursor.rowcount == 0:
+                    stale.add((int(row['user_id']), int(row['group_id'])))
+            upserts = [row for row in item_rows if row[3] > 0 and (row[0], row[1]) not in stale]
+            deletes = [row[:3] for row in item_rows if row[3] <= 0 and (row[0], row[1]) not in stale]
+            if upserts:
+                await cursor.executemany(SQL_UPSERT_ITEM, upserts)
+            if deletes:
+                await cursor.executemany(SQL_DELETE_ITEM, deletes)
+        for row in pet_rows:
+            if (int(row['user_id']), int(row['group_id'])) not in stale:
+                row['row_version'] = row.get('row_version', 0) + 1
+        return sorted(stale)
+
+    async def settle_pets(self, pet_rows: list[dict], guard: str, cutoff: str):
+        """先锁住所有行，确认冷却与行版本都满足后再整行写回。"""
+        if guard not in SETTLE_GUARD_COLUMNS:
+            raise ValueError(f"不支持的冷却字段: {guard}")
+        if not pet_rows:
+            return
+        keys = [(int(row['user_id']), int(row['group_id'])) for row in pet_rows]
+        sql = SQL_LOCK_FOR_SETTLE.format(guard=guard, keys=", ".join(["(%s, %s)"] * len(keys)))
+        async with self.transaction() as cursor:
+            await cursor.execute(sql, [value for key in keys for value in key])
+            locked = {(row["user_id"], row["group_id"]): row for row in await cursor.fetchall()}
+            for key, row in zip(keys, pet_rows):
+                current = locked.get(key)
+                if (current is None or current["row_version"] != row.get('row_version', 0)
+                        or (current["guard"] is not None and current["guard"] > cutoff)):
+                    raise SettlementConflictError()
+            await cursor.executemany(SQL_WRITE_BACK_PET,
+                                     [pet_write_params(row, row.get('row_version', 0)) for row in pet_rows])
+        for row in pet_rows:
+            row['row_version'] = row.get('row_version', 0) + 1
+
+    # --- 背包表 ---
+    async def get_inventory(self, user_id: str, group_id: str) -> list[tuple[str, int]]:
+        async with self.reader() as cursor:
+            await cursor.execute(SQL_SELECT_INVENTORY, (int(user_id), int(group_id)))
+            return [(row["item_name"], row["quantity"]) for row in await cursor.fetchall()]
@@ -0,0 +1,35 @@
+"""
+测试与基准测试共用 benchmarks/astrbot_stubs.py 中的 astrbot 替身，插件目录作为 pet_plugin 包导入。
+"""
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+PLUGIN_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PLUGIN_ROOT / "benchmarks"))
+
+import astrbot_stubs  # noqa: E402
+
+_data_root = tempfile.TemporaryDirectory(prefix="pet_tests_")
+astrbot_stubs.install(Path(_data_root.name))
+main = astrbot_stubs.load_plugin(PLUGIN_ROOT)
+
+
+@pytest.fixture
+def make_plugin(tmp_path, monkeypatch):
+    """在独立数据目录中创建插件实例；限流、指标导出和内容热重载默认关闭。"""
+    class StarTools:
+        @staticmethod
+        def get_data_dir(name: str) -> Path:
+            return tmp_path / name
+
+    monkeypatch.setattr(main, "StarTools", StarTools)
+
+    def create(context=None, **config):
+        config = {"rate_limit_user_rate": 0, "rate_limit_group_rate": 0, "metrics_export_interval": 0,
+                  "content_hot_reload": False, **config}
+        return main.PetPlugin(context, config)
+
+    return create
@@ -0,0 +1,149 @@
+"""
+测试用的进程内 MySQL 替身：模拟 aiomysql 连接池的最小接口，语句翻译成 SQLite 方言后在一个临时数据库文件上执行。
+每条连接独立打开数据库文件，自动提交模式下只能读到已提交的数据；事务之间整库互斥，比 InnoDB 的行锁更严格，
+GET_LOCK / RELEASE_LOCK 按名字对应一把 asyncio 锁。只覆盖 storage_mysql 用到的语法，不代替真实服务器上的测试。
+"""
+import asyncio
+import re
+import sqlite3
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+# (MySQL 写法, SQLite 写法)，按顺序替换；DATE_FORMAT 中的 %s 必须在参数占位符之前处理
+_TRANSLATIONS = (
+    (re.compile(r"DATE_FORMAT\(NOW\(6\), '[^']*'\)"), "strftime('%Y-%m-%dT%H:%M:%f', 'now')"),
+    (re.compile(r"%s"), "?"),
+    (re.compile(r",\s*KEY \w+ \([^)]*\)"), ""),
+    (re.compile(r"\)\s*ENGINE=\w+[^\n]*"), ")"),
+    (re.compile(r"\s+FOR UPDATE"), ""),
+    (re.compile(r"IN \(\("), "IN (VALUES ("),
+    (re.compile(r"ON DUPLICATE KEY UPDATE"), "ON CONFLICT DO UPDATE SET"),
+    (re.compile(r"VALUES\((\w+)\)"), r"excluded.\1"),
+)
+_GET_LOCK = re.compile(r"SELECT GET_LOCK\(%s, %s\)")
+_RELEASE_LOCK = re.compile(r"SELECT RELEASE_LOCK\(%s\)")
+
+
+def translate(sql: str) -> str:
+    for pattern, replacement in _TRANSLATIONS:
+        sql = pattern.sub(replacement, sql)
+    return sql
+
+
+class FakeMySQLServer:
+    """一个数据库文件对应一台“服务器”，同一台服务器上创建的多个连接池相当于多个插件实例。"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.pools_created = 0
+        self.statements: list[str] = []
+        self._write_lock = asyncio.Lock()
+        self._named_locks: dict[str, asyncio.Lock] = {}
+        with sqlite3.connect(path) as db:
+            db.execute("PRAGMA journal_mode = WAL")
+
+    async def create_pool(self, **kwargs) -> "FakePool":
+        self.pools_created += 1
+        return FakePool(self)
+
+    def named_lock(self, name: str) -> asyncio.Lock:
+        return self._named_locks.setdefault(name, asyncio.Lock())
+
+
+class FakePool:
+    def __init__(self, server: FakeMySQLServer):
+        self.server = server
+        self.closed = False
+
+    @asynccontextmanager
+    async def acquire(self):
+        conn = FakeConnection(self.server)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def close(self):
+        self.closed = True
+
+    async def wait_closed(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, server: FakeMySQLServer):
+        self.server = server
+        self.db = sqlite3.connect(server.path, isolation_level=None)
+        self.db.row_factory = sqlite3.Row
+        self.in_transaction = False
+
+    async def begin(self):
+        await self.server._write_lock.acquire()
+        self.db.execute("BEGIN")
+        self.in_transaction = True
+
+    async def commit(self):
+        self._end("COMMIT")
+
+    async def rollback(self):
+        self._end("ROLLBACK")
+
+    def _end(self, statement: str):
+        if self.in_transaction:
+            self.db.execute(statement)
+            self.in_transaction = False
+            self.server._write_lock.release()
+
+    @asynccontextmanager
+    async def cursor(self):
+        yield FakeCursor(self)
+
+    def close(self):
+        if self.in_transaction:
+            self._end("ROLLBACK")
+        self.db.close()
+
+
+class FakeCursor:
+    """行以 dict 返回，与 aiomysql.DictCursor 一致。"""
+
+    def __init__(self, conn: FakeConnection):
+        self.conn = conn
+        self.rowcount = -1
+        self._rows: list[dict] = []
+
+    async def execute(self, sql: str, params=()):
+        # 每条语句都让出一次事件循环，让并发的实例有机会交错执行
+        await asyncio.sleep(0)
+        self.conn.server.statements.append(sql)
+        if _GET_LOCK.match(sql):
+            name, timeout = params
+            try:
+                await asyncio.wait_for(self.conn.server.named_lock(name).acquire(), timeout)
+                self._rows = [{"locked": 1}]
+            except asyncio.TimeoutError:
+                self._rows = [{"locked": 0}]
+            return
+        if _RELEASE_LOCK.match(sql):
+            lock = self.conn.server.named_lock(params[0])
+            if lock.locked():
+                lock.release()
+            self._rows = [{"released": 1}]
+            return
+        cursor = self.conn.db.execute(translate(sql), tuple(params or ()))
+        self._rows = [dict(row) for row in cursor.fetchall()]
+        self.rowcount = cursor.rowcount
+
+    async def executemany(self, sql: str, seq_of_params):
+        await asyncio.sleep(0)
+        self.conn.server.statements.append(sql)
+        cursor = self.conn.db.executemany(translate(sql), [tuple(params) for params in seq_of_params])
+        self._rows = []
+        self.rowcount = cursor.rowcount
+
+    async def fetchone(self) -> dict | None:
+        return self._rows.pop(0) if self._rows else None
+
+    async def fetchall(self) -> list[dict]:
+        rows, self._rows = self._rows, []
+        return rows
@@ -0,0 +1,63 @@
+import random
+import re
+
+import pytest
+
+from pet_plugin.battle import render_battle_log, run_battle_core
+
+
+def _pet(name: str, attack: int, defense: int, level: int = 100, satiety: int = 100) -> dict:
+    return {"pet_name": name, "attack": attack, "defense": defense, "level": level, "satiety": satiety}
+
+
+def _battle(pet1: dict, pet2: dict, seed: int = 0):
+    random.seed(seed)
+    return run_battle_core(pet1, pet2, "水", "水")
+
+
+def _length(lines: list[str]) -> int:
+    return len("\n".join(lines))
+
+
+def _shown_turns(lines: list[str]) -> list[int]:
+    return [int(turn) for turn in re.findall(r"--- 第 (\d+) 回合 ---", "\n".join(lines))]
+
+
+# 双方防御远高于攻击，每次只造成 1 点伤害，战斗会持续上千回合
+LONG = (_pet("甲" * 20, 10, 200), _pet("乙" * 20, 10, 200))
+
+
+def test_max_rounds_zero_shows_every_round():
+    result = _battle(*LONG)
+    lines = render_battle_log(result, *LONG, "水", "水", max_rounds=0)
+    assert _shown_turns(lines) == list(range(1, result.turns + 1))
+    assert not any("省略" in line for line in lines)
+    # 最后一次攻击后的剩余 HP 与战斗结果一致
+    loser = 1 - result.winner
+    assert f"(剩余HP: {max(0, result.end_hp[loser])})" in [line for line in lines if "剩余HP" in line][-1]
+
+
+@pytest.mark.parametrize("max_rounds", [0, 6, 7])
+@pytest.mark.parametrize("max_chars", [400, 800, 1500])
+def test_truncated_log_fits_max_chars_including_summary(max_rounds, max_chars):
+    result = _battle(*LONG)
+    lines = render_battle_log(result, *LONG, "水", "水", max_rounds=max_rounds, max_chars=max_chars)
+    assert _length(lines) <= max_chars
+    assert any(line.startswith(f"\n全场共 {result.turns} 回合") for line in lines)
+    # 保留的回合是开头和结尾的连续回合，开头多保留一个
+    shown = _shown_turns(lines)
+    head, tail = (len(shown) + 1) // 2, len(shown) // 2
+    assert shown == list(range(1, head + 1)) + list(range(result.turns - tail + 1, result.turns + 1))
+
+
+def test_truncated_rounds_match_full_log():
+    pets = (_pet("豆豆", 30, 40, level=20), _pet("球球", 28, 44, level=20))
+    for seed in range(20):
+        result = _battle(*pets, seed=seed)
+        full = render_battle_log(result, *pets, "水", "水")
+        short = render_battle_log(result, *pets, "水", "水", max_rounds=4)
+        gap = next(i for i, line in enumerate(short) if "省略" in line)
+        # 省略中间回合后，保留的回合（包括其中的剩余 HP）与完整日志逐行相同
+        assert short[:gap] == full[:gap]
+        tail = short[gap + 1:-2]
+        assert full[-1 - len(tail):-1] == tail
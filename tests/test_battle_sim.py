@@ -0,0 +1,73 @@
+"""批量模拟器与逐场战斗引擎的统计等价性：相同规则下胜率、回合数分布和伤害应当一致。"""
+import math
+import random
+
+import numpy as np
+import pytest
+
+from pet_plugin.battle import ATTRIBUTE_MULTIPLIERS, run_battle_core
+from pet_plugin.battle_sim import attribute_matrix, simulate_battles
+
+ATTRIBUTES = sorted({attacker for attacker, _ in ATTRIBUTE_MULTIPLIERS})
+BATTLES = 4000
+
+# (先手方, 后手方)：攻击、防御、等级、饱食度、属性
+MATCHUPS = {
+    "mirror": ((12, 10, 5, 80, "火"), (12, 10, 5, 80, "火")),
+    "type_advantage": ((12, 10, 5, 80, "火"), (12, 10, 5, 80, "水")),
+    "high_defense": ((15, 8, 10, 100, "草"), (9, 26, 10, 100, "草")),
+    "level_gap": ((20, 12, 8, 60, "水"), (26, 16, 12, 90, "火")),
+    "underdog": ((40, 30, 30, 100, "草"), (10, 10, 3, 20, "水")),
+}
+
+
+def _scalar(p1, p2, seed: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    random.seed(seed)
+    pet1 = dict(zip(("attack", "defense", "level", "satiety"), p1[:4]))
+    pet2 = dict(zip(("attack", "defense", "level", "satiety"), p2[:4]))
+    results = [run_battle_core(pet1, pet2, p1[4], p2[4]) for _ in range(BATTLES)]
+    return (np.array([r.winner == 0 for r in results]),
+            np.array([r.turns for r in results]),
+            np.array([r.damage[0] for r in results]))
+
+
+def _batched(p1, p2, seed: int):
+    matrix = attribute_matrix(ATTRIBUTES, ATTRIBUTE_MULTIPLIERS)
+    index = ATTRIBUTES.index
+    return simulate_battles(*p1[:4], index(p1[4]), *p2[:4], index(p2[4]), matrix, n=BATTLES,
+                            rng=np.random.default_rng(seed))
+
+
+def _ks_statistic(a: np.ndarray, b: np.ndarray) -> float:
+    values = np.union1d(a, b)
+    cdf_a = np.searchsorted(np.sort(a), values, side="right") / a.size
+    cdf_b = np.searchsorted(np.sort(b), values, side="right") / b.size
+    return float(np.abs(cdf_a - cdf_b).max())
+
+
+@pytest.mark.parametrize("name", sorted(MATCHUPS))
+def test_simulate_battles_matches_scalar_engine(name):
+    p1, p2 = MATCHUPS[name]
+    wins, turns, damage = _scalar(p1, p2, seed=11)
+    stats = _batched(p1, p2, seed=12)
+
+    # 胜率：两个独立样本比例之差在 4 个标准误以内
+    p = (wins.mean() + stats.win_rate) / 2
+    se = math.sqrt(max(p * (1 - p), 1e-4) * 2 / BATTLES)
+    assert abs(wins.mean() - stats.win_rate) <= 4 * se
+
+    # 回合数分布：双样本 KS 检验，显著性水平 0.001
+    assert _ks_statistic(turns, stats.turns) <= 1.95 * math.sqrt(2 / BATTLES)
+
+    # 先手方造成的总伤害：均值之差在 4 个标准误以内
+    se = math.sqrt((damage.var() + stats.p1_damage.var()) / BATTLES)
+    assert abs(damage.mean() - stats.p1_damage.mean()) <= 4 * se + 1e-9
+
+
+def test_deterministic_matchup_is_identical():
+    """伤害浮动不足以改变结果时，两种实现的每一场都应完全相同。"""
+    p1, p2 = (50, 10, 1, 0, "火"), (1, 1, 1, 5, "草")
+    wins, turns, _ = _scalar(p1, p2, seed=1)
+    stats = _batched(p1, p2, seed=2)
+    assert wins.all() and stats.p1_wins.all()
+    assert set(turns) == set(stats.turns.tolist()) == {1}
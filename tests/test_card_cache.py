@@ -0,0 +1,127 @@
+import asyncio
+
+import pytest
+
+from pet_plugin import card_cache
+from pet_plugin.card_cache import CardCache
+
+
+def _render(data: bytes, calls: list):
+    async def render() -> bytes:
+        calls.append(1)
+        return data
+
+    return render
+
+
+def test_file_cache_hit_skips_render(tmp_path):
+    async def scenario():
+        cache = CardCache(tmp_path)
+        calls = []
+        first = await cache.get_or_render("a", _render(b"x" * 10, calls))
+        second = await cache.get_or_render("a", _render(b"x" * 10, calls))
+        assert first == second == cache.path_for("a")
+        assert first.read_bytes() == b"x" * 10
+        assert (len(calls), cache.hits, cache.misses) == (1, 1, 1)
+
+    asyncio.run(scenario())
+
+
+def test_eviction_removes_least_recent_file(tmp_path):
+    async def scenario():
+        cache = CardCache(tmp_path, max_bytes=25, unlink_delay=0)
+        for key in ("a", "b", "c"):
+            await cache.get_or_render(key, _render(b"x" * 10, []))
+        assert not cache.path_for("a").exists()
+        assert cache.path_for("b").exists() and cache.path_for("c").exists()
+        assert cache.total_bytes == 20
+
+    asyncio.run(scenario())
+
+
+def test_evicted_file_survives_until_unlink_delay(tmp_path, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(card_cache.time, "monotonic", lambda: clock[0])
+
+    async def scenario():
+        cache = CardCache(tmp_path, max_bytes=15, unlink_delay=60)
+        returned = await cache.get_or_render("a", _render(b"a" * 10, []))
+        # 发送 a 之前它已经被 b 挤出缓存，文件仍然可以读取
+        await cache.get_or_render("b", _render(b"b" * 10, []))
+        assert await cache.lookup("a") is None
+        assert returned.read_bytes() == b"a" * 10
+
+        clock[0] += 60
+        await cache.get_or_render("c", _render(b"c" * 10, []))
+        assert not returned.exists()
+        assert cache.path_for("b").exists() and cache.path_for("c").exists()
+
+    asyncio.run(scenario())
+
+
+def test_rerendered_key_is_not_deleted_by_earlier_eviction(tmp_path, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(card_cache.time, "monotonic", lambda: clock[0])
+
+    async def scenario():
+        cache = CardCache(tmp_path, max_bytes=15, unlink_delay=60)
+        await cache.get_or_render("a", _render(b"a" * 10, []))
+        await cache.get_or_render("b", _render(b"b" * 10, []))
+        path = await cache.get_or_render("a", _render(b"A" * 10, []))
+        clock[0] += 60
+        await cache.get_or_render("c", _render(b"c" * 10, []))
+        # b 到期被删除，重新渲染过的 a 仍在
+        assert not cache.path_for("b").exists()
+        assert path.read_bytes() == b"A" * 10
+
+    asyncio.run(scenario())
+
+
+def test_oversize_card_is_returned_but_not_cached(tmp_path):
+    async def scenario():
+        cache = CardCache(tmp_path, max_bytes=5)
+        await cache.get_or_render("small", _render(b"x" * 4, []))
+        result = await cache.get_or_render("big", _render(b"x" * 10, []))
+        assert result == b"x" * 10
+        assert not cache.path_for("big").exists()
+        # 超大的图片不会把已有条目挤出去
+        assert cache.path_for("small").exists() and cache.total_bytes == 4
+
+    asyncio.run(scenario())
+
+
+def test_failed_render_leaves_no_files(tmp_path):
+    async def scenario():
+        cache = CardCache(tmp_path)
+
+        async def timeout() -> bytes:
+            raise asyncio.TimeoutError()
+
+        with pytest.raises(asyncio.TimeoutError):
+            await cache.get_or_render("a", timeout)
+        assert list(tmp_path.iterdir()) == []
+        assert await cache.get_or_render("a", _render(b"ok", [])) == cache.path_for("a")
+
+    asyncio.run(scenario())
+
+
+def test_externally_deleted_file_is_rendered_again(tmp_path):
+    async def scenario():
+        cache = CardCache(tmp_path)
+        calls = []
+        path = await cache.get_or_render("a", _render(b"x", calls))
+        path.unlink()
+        assert await cache.get_or_render("a", _render(b"x", calls)) == path
+        assert len(calls) == 2 and path.exists()
+
+    asyncio.run(scenario())
+
+
+def test_memory_mode_never_touches_disk(tmp_path):
+    async def scenario():
+        cache = CardCache(tmp_path, in_memory=True)
+        assert await cache.get_or_render("a", _render(b"img", [])) == b"img"
+        assert await cache.get_or_render("a", _render(b"other", [])) == b"img"
+        assert list(tmp_path.iterdir()) == []
+
+    asyncio.run(scenario())
@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+
+import pytest
+import yaml
+
+from astrbot_stubs import FakeEvent
+from pet_plugin.content import DEFAULT_CONTENT_PATH, ContentStore
+
+
+def _raw() -> dict:
+    return yaml.safe_load(DEFAULT_CONTENT_PATH.read_text(encoding="utf-8"))
+
+
+def _write(path, raw: dict):
+    path.write_text(yaml.safe_dump(raw, allow_unicode=True), encoding="utf-8")
+
+
+@pytest.fixture
+def store(tmp_path):
+    reloaded = []
+    store = ContentStore(tmp_path, on_reload=reloaded.append)
+    store.reloaded = reloaded
+    return store
+
+
+def test_valid_edit_replaces_content_and_notifies(store):
+    raw = _raw()
+    raw['shop_items']['普通口粮']['price'] = 12
+    raw['stat_names']['mood'] = "好心情"
+    _write(store.path, raw)
+
+    assert asyncio.run(store.reload())
+    assert store.current.shop_items['普通口粮']['price'] == 12
+    assert store.reloaded == [store.current]
+    assert store.current.stat_names['mood'] == "好心情"
+
+
+@pytest.mark.parametrize("text", [
+    "shop_items: [未闭合",  # YAML 语法错误
+    "attributes: {}\n",  # 缺少必需的段
+])
+def test_invalid_file_keeps_previous_content(store, text, caplog):
+    previous = store.current
+    store.path.write_text(text, encoding="utf-8")
+    with caplog.at_level(logging.ERROR):
+        assert not asyncio.run(store.reload())
+    assert store.current is previous
+    assert store.reloaded == []
+    assert "继续使用原有内容" in caplog.text
+
+
+def test_reload_rejects_removing_species_or_evolutions(store):
+    previous = store.current
+    raw = _raw()
+    del raw['pet_types']['火小犬']
+    _write(store.path, raw)
+    assert not asyncio.run(store.reload())
+
+    raw = _raw()
+    del raw['pet_types']['水灵灵']['evolutions'][2]
+    raw['pet_types']['水灵灵']['evolutions'][1]['evolve_level'] = None
+    _write(store.path, raw)
+    assert not asyncio.run(store.reload())
+    assert store.current is previous
+
+    # 新增种类是兼容的修改
+    raw = _raw()
+    raw['pet_types']['雷电鼠'] = dict(raw['pet_types']['火小犬'], attribute="雷")
+    _write(store.path, raw)
+    assert asyncio.run(store.reload())
+    assert "雷电鼠" in store.current.species
+
+
+def test_invalid_file_at_startup_falls_back_to_defaults(tmp_path):
+    (tmp_path / "game_content.yaml").write_text("pet_types: 42\n", encoding="utf-8")
+    store = ContentStore(tmp_path)
+    assert store.current.shop_items['普通口粮']['price'] == _raw()['shop_items']['普通口粮']['price']
+
+
+def test_hot_reload_picks_up_edit_while_running(make_plugin):
+    plugin = make_plugin()
+
+    async def wait_for(predicate, timeout: float = 10.0):
+        deadline = time.monotonic() + timeout
+        while not predicate():
+            assert time.monotonic() < deadline, "内容文件的修改没有被重新加载"
+            await asyncio.sleep(0.05)
+
+    async def scenario():
+        now = datetime.now()
+        await plugin.repo.create_pet("1", "100", "豆豆", "草叶猫", 10, 10, now.isoformat(),
+                                     (now - timedelta(hours=2)).isoformat())
+        plugin.content.start()
+        await asyncio.sleep(0.2)  # 等监视开始
+        raw = _raw()
+        raw['shop_items']['普通口粮']['price'] = 1
+        _write(plugin.content.path, raw)
+        await wait_for(lambda: plugin.content.current.shop_items['普通口粮']['price'] == 1)
+
+        replies = [reply async for reply in plugin.buy_item(FakeEvent("1", "100"), "普通口粮", 3)]
+        assert replies == [("text", "购买成功！你花费 $3 购买了 3 个「普通口粮」。")]
+        await plugin.terminate()
+
+    asyncio.run(scenario())
@@ -0,0 +1,201 @@
+import asyncio
+import json
+import re
+import time
+
+import pytest
+
+from pet_plugin import encounters
+from pet_plugin.encounters import CircuitBreaker, EncounterPool, ProviderUnavailableError
+
+STAT_NAMES = {"exp": "经验值", "mood": "心情值", "satiety": "饱食度"}
+
+
+def _completion(count: int) -> str:
+    events = [{"description": f"{{pet_name}}遇到了第{i}只小鸟。", "reward_type": "mood", "reward_value": 10,
+               "money_gain": 3} for i in range(count)]
+    return f"```json\n{json.dumps(events, ensure_ascii=False)}\n```"
+
+
+class FakeProvider:
+    """
+    按提示词中要求的条数返回事件，extra 为额外多返回的条数。
+    每次调用先等待 delay 秒；fail 为真时抛出异常，用来模拟 LLM 出错。
+    """
+
+    def __init__(self, extra: int = 0, delay: float = 0.0, fail: bool = False):
+        self.extra = extra
+        self.delay = delay
+        self.fail = fail
+        self.requested: list[int] = []
+
+    async def __call__(self, prompt: str) -> str:
+        count = int(re.search(r"生成 (\d+) 个", prompt).group(1))
+        self.requested.append(count)
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("provider error")
+        return _completion(count + self.extra)
+
+
+def test_refill_requests_only_the_free_slots():
+    provider = FakeProvider()
+    pool = EncounterPool(provider, STAT_NAMES, capacity=7, batch_size=5)
+
+    async def scenario():
+        await pool.refill()
+        await pool.refill()
+        assert provider.requested == [5, 2]
+        assert len(pool) == 7
+        pool.take()
+        await pool.refill()
+        assert provider.requested[-1] == 1
+        assert len(pool) == 7
+        assert pool.stats()["discarded"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_events_beyond_capacity_are_counted_as_discarded():
+    provider = FakeProvider(extra=3)
+    pool = EncounterPool(provider, STAT_NAMES, capacity=4, batch_size=3)
+
+    async def scenario():
+        await pool.refill()
+        assert provider.requested == [3]
+        assert len(pool) == 4
+        assert pool.stats()["discarded"] == 2
+        # 没有预生成（capacity 为 0）时，当场生成的一批事件仍然留给之后的散步
+        on_demand = EncounterPool(FakeProvider(), STAT_NAMES, capacity=0, batch_size=3)
+        await on_demand.acquire()
+        assert len(on_demand) == 2
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_walks_share_one_generation():
+    provider = FakeProvider(delay=0.05)
+    pool = EncounterPool(provider, STAT_NAMES, capacity=0, batch_size=5, latency_budget=2.0)
+
+    async def scenario():
+        encounters = await asyncio.gather(*(pool.acquire() for _ in range(4)))
+        assert provider.requested == [5]
+        # 四次散步各自拿到同一批中不同的事件，剩下的一条留在池中
+        assert len({encounter.description for encounter in encounters}) == 4
+        assert len(pool) == 1
+        assert pool.stats()["fallbacks"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_generation_survives_a_cancelled_waiter():
+    provider = FakeProvider(delay=0.05)
+    pool = EncounterPool(provider, STAT_NAMES, capacity=0, batch_size=3)
+
+    async def scenario():
+        first = asyncio.create_task(pool.refill())
+        second = asyncio.create_task(pool.refill())
+        await asyncio.sleep(0.01)
+        first.cancel()
+        await second
+        assert first.cancelled()
+        assert provider.requested == [3]
+        assert len(pool) == 3
+        # 完成后再次补充会发起新的请求
+        await pool.refill()
+        assert len(provider.requested) == 2
+
+    asyncio.run(scenario())
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+def test_breaker_opens_after_failures_and_probes_once_half_open(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(encounters, "time", clock)
+    provider = FakeProvider(fail=True)
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    pool = EncounterPool(provider, STAT_NAMES, capacity=0, breaker=breaker)
+
+    async def scenario():
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                await pool.refill()
+        assert (breaker.state, breaker.trips) == (CircuitBreaker.OPEN, 1)
+        # 打开期间不调用 LLM
+        with pytest.raises(ProviderUnavailableError):
+            await pool.refill()
+        assert len(provider.requested) == 2
+
+        # 半开时只放行一次试探，失败后重新打开
+        clock.now += 60
+        with pytest.raises(RuntimeError):
+            await pool.refill()
+        assert (breaker.state, breaker.trips, len(provider.requested)) == (CircuitBreaker.OPEN, 2, 3)
+        with pytest.raises(ProviderUnavailableError):
+            await pool.refill()
+
+        # 试探成功后关闭，失败计数清零
+        clock.now += 60
+        provider.fail = False
+        await pool.refill()
+        assert (breaker.state, breaker.failures) == (CircuitBreaker.CLOSED, 0)
+        assert pool.stats()["provider_failures"] == 3
+
+    asyncio.run(scenario())
+
+
+def test_open_breaker_falls_back_to_local_encounter_without_waiting(monkeypatch):
+    monkeypatch.setattr(encounters, "time", FakeClock())
+    provider = FakeProvider(fail=True)
+    pool = EncounterPool(provider, STAT_NAMES, capacity=0, breaker=CircuitBreaker(failure_threshold=1))
+
+    async def scenario():
+        await pool.acquire()
+        encounter = await pool.acquire()
+        assert encounter.reward_type in STAT_NAMES
+        assert len(provider.requested) == 1
+        assert pool.stats()["fallbacks"] == 2
+
+    asyncio.run(scenario())
+
+
+def test_slow_provider_is_cut_off_by_latency_budget():
+    provider = FakeProvider(delay=0.3)
+    pool = EncounterPool(provider, STAT_NAMES, capacity=0, batch_size=2, latency_budget=0.05)
+
+    async def scenario():
+        start = time.perf_counter()
+        encounter = await pool.acquire()
+        assert time.perf_counter() - start < 0.25
+        assert "遇到了第" not in encounter.description
+        assert pool.stats()["budget_timeouts"] == 1
+        assert pool.stats()["fallbacks"] == 1
+        # 超出预算的生成仍在后台完成，结果留给之后的散步
+        await asyncio.sleep(0.4)
+        assert len(pool) == 2
+        assert "遇到了第" in (await pool.acquire()).description
+        assert pool.breaker.state == CircuitBreaker.CLOSED
+
+    asyncio.run(scenario())
+
+
+def test_provider_timeout_counts_as_failure():
+    provider = FakeProvider(delay=1.0)
+    pool = EncounterPool(provider, STAT_NAMES, capacity=0, latency_budget=1.0, provider_timeout=0.05,
+                         breaker=CircuitBreaker(failure_threshold=1))
+
+    async def scenario():
+        encounter = await pool.acquire()
+        assert encounter is not None
+        stats = pool.stats()
+        assert (stats["provider_timeouts"], stats["budget_timeouts"], stats["fallbacks"]) == (1, 0, 1)
+        assert stats["breaker_state"] == CircuitBreaker.OPEN
+
+    asyncio.run(scenario())
@@ -0,0 +1,130 @@
+import asyncio
+import random
+import re
+from datetime import datetime, timedelta
+
+from astrbot_stubs import FakeEvent
+from pet_plugin.leaderboard import RANK_METRICS, Leaderboard
+from pet_plugin.pet_cache import PetStateCache
+from pet_plugin.storage import SQLitePetRepository
+
+GROUP = "100"
+
+
+async def _adopt(repo, count: int):
+    now = datetime.now()
+    for user_id in range(1, count + 1):
+        await repo.create_pet(str(user_id), GROUP, f"宠物{user_id}", "草叶猫", 10, 10,
+                              now.isoformat(), (now - timedelta(hours=2)).isoformat())
+
+
+def _brute_force(pets: dict[int, dict], metric: str, size: int) -> list[tuple]:
+    """全量排序的结果：按排序字段降序，同分时 user_id 大的在前，与榜单窗口内的顺序一致。"""
+    fields = RANK_METRICS[metric]
+    ranked = sorted(pets.values(), key=lambda pet: (tuple(pet[f] for f in fields), pet['user_id']), reverse=True)
+    return [tuple(pet[f] for f in fields) for pet in ranked[:size]]
+
+
+def _keys(rows: list[dict], metric: str) -> list[tuple]:
+    return [tuple(row[f] for f in RANK_METRICS[metric]) for row in rows]
+
+
+class CountingRepo(SQLitePetRepository):
+    """记录排行榜从数据库加载的次数。"""
+
+    loads = 0
+
+    async def top_pets(self, group_id, order_by, limit):
+        self.loads += 1
+        return await super().top_pets(group_id, order_by, limit)
+
+
+def test_incremental_updates_match_full_sort(tmp_path):
+    async def scenario():
+        repo = CountingRepo(tmp_path / "pets.db")
+        await _adopt(repo, 30)
+        cache = PetStateCache(repo)
+        board = Leaderboard(repo, size=5, slack=3, before_load=cache.flush)
+        cache.on_change = board.update
+        pets = {pet['user_id']: dict(pet) for pet in await repo.group_pets(GROUP)}
+        for metric in RANK_METRICS:
+            await board.top(GROUP, metric)
+
+        rng = random.Random(3)
+        for _ in range(400):
+            user_id = rng.randint(1, 30)
+            # 取值范围很小，经常出现同分；也经常把榜上的宠物打到窗口之外
+            fields = {"money": rng.randint(0, 12), "duel_wins": rng.randint(0, 5),
+                      "level": rng.randint(1, 4), "exp": rng.randint(0, 3)}
+            await cache.update_pet(str(user_id), GROUP, **fields)
+            pets[user_id].update(fields)
+            for metric in RANK_METRICS:
+                assert _keys(await board.top(GROUP, metric), metric) == _brute_force(pets, metric, 5)
+        # 只有窗口缩小到 size 以下时才重新加载，绝大多数查询不访问数据库
+        assert len(RANK_METRICS) < repo.loads < 400
+        await repo.close()
+
+    asyncio.run(scenario())
+
+
+def test_dropping_below_floor_refills_from_database(tmp_path):
+    async def scenario():
+        repo = CountingRepo(tmp_path / "pets.db")
+        await _adopt(repo, 8)
+        cache = PetStateCache(repo)
+        board = Leaderboard(repo, size=3, slack=1, before_load=cache.flush)
+        cache.on_change = board.update
+        for user_id in range(1, 9):
+            await cache.update_pet(str(user_id), GROUP, money=user_id * 10)
+        assert [row['user_id'] for row in await board.top(GROUP, "金钱")] == [8, 7, 6]
+        assert repo.loads == 1
+
+        # 前两名跌到窗口之外，窗口只剩 2 名，必须重新加载才能确定第三名
+        await cache.update_pet("8", GROUP, money=0)
+        await cache.update_pet("7", GROUP, money=1)
+        assert [row['user_id'] for row in await board.top(GROUP, "金钱")] == [6, 5, 4]
+        assert repo.loads == 2
+        # 跌出窗口的宠物重新上榜
+        await cache.update_pet("8", GROUP, money=100)
+        assert [row['user_id'] for row in await board.top(GROUP, "金钱")] == [8, 6, 5]
+        assert repo.loads == 2
+        await repo.close()
+
+    asyncio.run(scenario())
+
+
+def test_ties_are_ordered_by_user_id(tmp_path):
+    async def scenario():
+        repo = SQLitePetRepository(tmp_path / "pets.db")
+        await _adopt(repo, 5)
+        cache = PetStateCache(repo)
+        board = Leaderboard(repo, size=5, before_load=cache.flush)
+        cache.on_change = board.update
+        await cache.update_pet("2", GROUP, duel_wins=3)
+        await cache.update_pet("4", GROUP, duel_wins=3)
+        assert [row['user_id'] for row in await board.top(GROUP, "胜场")] == [4, 2, 5, 3, 1]
+        # 增量更新后同分的顺序不变
+        await cache.update_pet("1", GROUP, duel_wins=3)
+        assert [row['user_id'] for row in await board.top(GROUP, "胜场")] == [4, 2, 1, 5, 3]
+        await repo.close()
+
+    asyncio.run(scenario())
+
+
+def test_tournament_larger_than_cache_updates_leaderboard(make_plugin):
+    plugin = make_plugin(pet_cache_size=4, tournament_cooldown=0)
+
+    async def scenario():
+        await _adopt(plugin.repo, 8)
+        event = FakeEvent("1", GROUP)
+        [_ async for _ in plugin.pet_ranking(event, "金钱")]
+        [_ async for _ in plugin.pet_tournament(event)]
+
+        replies = [reply async for reply in plugin.pet_ranking(event, "金钱")]
+        shown = [int(money) for money in re.findall(r"\$(\d+)", replies[0][1])]
+        stored = sorted((pet['money'] for pet in await plugin.repo.group_pets(GROUP)), reverse=True)
+        assert shown == stored[:len(shown)]
+        assert shown[0] > 50
+        await plugin.terminate()
+
+    asyncio.run(scenario())
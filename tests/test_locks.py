@@ -0,0 +1,35 @@
+import asyncio
+
+from pet_plugin.locks import KeyedLocks
+
+
+def test_opposite_key_orders_do_not_deadlock():
+    async def scenario():
+        locks = KeyedLocks()
+        order = []
+
+        async def worker(name, *keys):
+            async with locks.hold(*keys):
+                order.append(name)
+                await asyncio.sleep(0.01)
+
+        await asyncio.wait_for(asyncio.gather(worker("a", 1, 2), worker("b", 2, 1), worker("c", 2)), 1)
+        assert sorted(order) == ["a", "b", "c"]
+        # 没有协程持有或等待时锁被回收
+        assert locks._locks == {}
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_releases_its_slot():
+    async def scenario():
+        locks = KeyedLocks()
+        async with locks.hold(1):
+            waiter = asyncio.create_task(locks.hold(1).__aenter__())
+            await asyncio.sleep(0)
+            waiter.cancel()
+            await asyncio.gather(waiter, return_exceptions=True)
+            assert locks.locked(1)
+        assert locks._locks == {}
+
+    asyncio.run(scenario())
@@ -0,0 +1,158 @@
+import asyncio
+import math
+import re
+
+import pytest
+
+from astrbot_stubs import FakeEvent
+from pet_plugin import metrics as metrics_module
+from pet_plugin.metrics import LATENCY_BUCKETS, METRIC_PREFIX, Metrics, current_command, instrumented
+
+# Prometheus 文本格式中的一行样本：指标名、可选的标签、数值
+_SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{((?:[a-zA-Z_]\w*="[^"]*",?)*)\})? (\S+)$')
+_TYPE = re.compile(r"^# TYPE ([a-zA-Z_:][a-zA-Z0-9_:]*) (counter|gauge|histogram)$")
+
+
+def parse_prometheus(text: str) -> tuple[dict[str, str], list[tuple[str, dict, float]]]:
+    """按 Prometheus 文本格式严格解析，返回 (指标名 -> 类型, 样本列表)，格式不对时断言失败。"""
+    types, samples = {}, []
+    assert text.endswith("\n")
+    for line in text.splitlines():
+        declared = _TYPE.match(line)
+        if declared:
+            assert declared.group(1) not in types, f"重复声明类型: {line}"
+            types[declared.group(1)] = declared.group(2)
+            continue
+        match = _SAMPLE.match(line)
+        assert match, f"无法解析的行: {line!r}"
+        name, raw_labels, value = match.groups()
+        labels = dict(re.findall(r'(\w+)="([^"]*)"', raw_labels or ""))
+        family = re.sub(r"_(bucket|sum|count)$", "", name) if name not in types else name
+        assert family in types, f"样本出现在类型声明之前: {line}"
+        samples.append((name, labels, float(value)))
+    return types, samples
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def perf_counter(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return self.now
+
+
+class Handlers:
+    def __init__(self, clock: FakeClock):
+        self.metrics = Metrics()
+        self.clock = clock
+        self.seen_command = None
+
+    @instrumented
+    async def greet(self, work: float):
+        self.seen_command = current_command()
+        self.clock.now += work
+        yield "first"
+        self.clock.now += work
+        yield "second"
+
+    @instrumented
+    async def broken(self):
+        self.clock.now += 0.02
+        raise RuntimeError("boom")
+        yield
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(metrics_module, "time", clock)
+    return clock
+
+
+def test_instrumented_records_count_and_bucket(clock):
+    handlers = Handlers(clock)
+
+    async def scenario():
+        results = []
+        async for result in handlers.greet(0.002):
+            # 调用方发送回复的时间不计入命令耗时
+            clock.now += 1.0
+            results.append(result)
+        return results
+
+    assert asyncio.run(scenario()) == ["first", "second"]
+    assert handlers.seen_command == "greet"
+    assert current_command() == "background"
+    assert handlers.metrics.counter("commands_total", command="greet", status="ok") == 1
+
+    histogram = handlers.metrics.histogram("command_seconds", command="greet")
+    assert histogram.count == 1
+    assert histogram.sum == pytest.approx(0.004)
+    # 0.004 秒落在 (0.0025, 0.005] 这个桶里
+    assert histogram.counts[LATENCY_BUCKETS.index(0.005)] == 1
+
+
+def test_instrumented_counts_errors_and_early_close(clock):
+    handlers = Handlers(clock)
+
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            [_ async for _ in handlers.broken()]
+        # 只取第一条回复就停止迭代，仍然记为一次成功的调用
+        generator = handlers.greet(0.5)
+        assert await generator.__anext__() == "first"
+        await generator.aclose()
+
+    asyncio.run(scenario())
+    assert handlers.metrics.counter("commands_total", command="broken", status="error") == 1
+    assert handlers.metrics.histogram("command_seconds", command="broken").counts[LATENCY_BUCKETS.index(0.025)] == 1
+    assert handlers.metrics.counter("commands_total", command="greet", status="ok") == 1
+    assert handlers.metrics.histogram("command_seconds", command="greet").sum == pytest.approx(0.5)
+
+
+def test_prometheus_export_parses(clock):
+    metrics = Metrics()
+    metrics.inc("commands_total", command="greet", status="ok")
+    metrics.inc("commands_total", command="greet", status="error", value=2)
+    for seconds in (0.0001, 0.003, 0.003, 0.2, 100.0):
+        metrics.observe("command_seconds", seconds, command="greet")
+    metrics.observe("db_seconds", 0.001, op="get_pet")
+    metrics.add_collector(lambda: [("pool_size", "gauge", {}, 3), ("hits_total", "counter", {"kind": "card"}, 7)])
+
+    types, samples = parse_prometheus(metrics.render_prometheus())
+    assert types[METRIC_PREFIX + "commands_total"] == "counter"
+    assert types[METRIC_PREFIX + "command_seconds"] == "histogram"
+    assert types[METRIC_PREFIX + "pool_size"] == "gauge"
+    values = {(name, tuple(sorted(labels.items()))): value for name, labels, value in samples}
+    assert values[(METRIC_PREFIX + "commands_total", (("command", "greet"), ("status", "error")))] == 2
+    assert values[(METRIC_PREFIX + "hits_total", (("kind", "card"),))] == 7
+
+    buckets = [(labels["le"], value) for name, labels, value in samples
+               if name == METRIC_PREFIX + "command_seconds_bucket"]
+    bounds = [math.inf if le == "+Inf" else float(le) for le, _ in buckets]
+    counts = [value for _, value in buckets]
+    assert bounds == [*LATENCY_BUCKETS, math.inf]
+    assert counts == sorted(counts)  # 桶是累计的
+    assert counts[LATENCY_BUCKETS.index(0.005)] == 3
+    assert counts[-1] == values[(METRIC_PREFIX + "command_seconds_count", (("command", "greet"),))] == 5
+    assert values[(METRIC_PREFIX + "command_seconds_sum", (("command", "greet"),))] == pytest.approx(100.2061)
+
+
+def test_plugin_commands_are_exported(make_plugin, tmp_path):
+    plugin = make_plugin()
+    path = tmp_path / "metrics.prom"
+
+    async def scenario():
+        [_ async for _ in plugin.pet_menu(FakeEvent("1", "100"))]
+        await plugin.metrics.export(path)
+        await plugin.terminate()
+
+    asyncio.run(scenario())
+    types, samples = parse_prometheus(path.read_text(encoding="utf-8"))
+    assert (METRIC_PREFIX + "commands_total", {"command": "pet_menu", "status": "ok"}, 1.0) in samples
+    assert types[METRIC_PREFIX + "card_cache_hits_total"] == "counter"
+    assert any(name == METRIC_PREFIX + "command_seconds_count" and labels == {"command": "pet_menu"}
+               for name, labels, _ in samples)
@@ -0,0 +1,63 @@
+import asyncio
+
+import aiosqlite
+
+from pet_plugin.migrations import SCHEMA_VERSION, SQL_CREATE_PETS, migrate
+
+
+async def _open(path) -> aiosqlite.Connection:
+    conn = await aiosqlite.connect(path, isolation_level=None)
+    conn.row_factory = aiosqlite.Row
+    return conn
+
+
+async def _scalar(conn, sql: str):
+    async with conn.execute(sql) as cursor:
+        return (await cursor.fetchone())[0]
+
+
+def test_fresh_database_reaches_latest_version(tmp_path):
+    async def scenario():
+        conn = await _open(tmp_path / "pets.db")
+        assert await migrate(conn) == 0
+        assert await _scalar(conn, "PRAGMA user_version") == SCHEMA_VERSION
+        async with conn.execute("PRAGMA table_info(pets)") as cursor:
+            columns = {row[1] for row in await cursor.fetchall()}
+        assert {"money", "duel_wins", "last_updated_time", "last_raid_time", "last_tournament_time"} <= columns
+        async with conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'") as cursor:
+            indexes = {row[0] for row in await cursor.fetchall()}
+        assert {"idx_pets_group_level", "idx_pets_group_money", "idx_pets_group_duel_wins"} <= indexes
+        await conn.close()
+
+    asyncio.run(scenario())
+
+
+def test_unversioned_legacy_database_is_upgraded_in_place(tmp_path):
+    async def scenario():
+        conn = await _open(tmp_path / "pets.db")
+        await conn.execute(SQL_CREATE_PETS)
+        # 旧版本启动时用 ALTER TABLE 补过的字段，已经存在也不能报错
+        await conn.execute("ALTER TABLE pets ADD COLUMN money INTEGER DEFAULT 50")
+        await conn.execute("INSERT INTO pets (user_id, group_id, pet_name, pet_type) VALUES (1, 100, '豆豆', '草叶猫')")
+
+        assert await migrate(conn) == 0
+        async with conn.execute("SELECT * FROM pets") as cursor:
+            row = dict(await cursor.fetchone())
+        assert row['money'] == 50 and row['duel_wins'] == 0
+        assert row['last_updated_time'] is not None  # v3 补齐
+        await conn.close()
+
+    asyncio.run(scenario())
+
+
+def test_migrate_is_a_no_op_when_current(tmp_path):
+    async def scenario():
+        conn = await _open(tmp_path / "pets.db")
+        await migrate(conn)
+        await conn.execute("INSERT INTO pets (user_id, group_id, pet_name, pet_type) VALUES (1, 100, '豆豆', '草叶猫')")
+        assert await migrate(conn) == SCHEMA_VERSION
+        # 版本已是最新时不会再次执行补齐
+        assert await _scalar(conn, "SELECT last_updated_time FROM pets") is None
+        await conn.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,168 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from pet_plugin.leaderboard import Leaderboard
+from pet_plugin.pet_cache import PetStateCache
+from pet_plugin.storage import SettlementConflictError, SQLitePetRepository
+
+# 与对决冷却一致
+DUEL_COOLDOWN = timedelta(minutes=30)
+
+
+@pytest.fixture
+def repo(tmp_path):
+    return SQLitePetRepository(tmp_path / "pets.db")
+
+
+async def _adopt(repo, user_id: str, group_id: str = "100", cooldown: timedelta = timedelta(hours=1)):
+    now = datetime.now()
+    await repo.create_pet(user_id, group_id, f"宠物{user_id}", "草叶猫", 10, 10,
+                          now.isoformat(), (now - cooldown).isoformat())
+
+
+def test_flush_writes_dirty_pets_and_inventory(repo):
+    async def scenario():
+        await _adopt(repo, "1")
+        cache = PetStateCache(repo)
+        await cache.adjust_pet("1", "100", mood=-30)
+        await cache.add_item("1", "100", "苹果", 2)
+        await cache.add_item("1", "100", "饼干", 1)
+        assert await cache.take_item("1", "100", "饼干")
+        # 落盘之前数据库中仍是旧值
+        assert (await repo.get_pet("1", "100"))['mood'] == 100
+
+        await cache.flush()
+        assert (await repo.get_pet("1", "100"))['mood'] == 70
+        assert await repo.get_inventory("1", "100") == [("苹果", 2)]
+        await repo.close()
+
+    asyncio.run(scenario())
+
+
+def test_eviction_keeps_dirty_entries(repo):
+    async def scenario():
+        for uid in ("1", "2", "3"):
+            await _adopt(repo, uid)
+        cache = PetStateCache(repo, capacity=2)
+        await cache.adjust_pet("1", "100", money=10)
+        await cache.get_pet("2", "100")
+        await cache.get_pet("3", "100")
+        # 最久未使用的玩家 1 有未落盘的修改，淘汰的是玩家 2
+        assert set(cache._entries) == {(1, 100), (3, 100)}
+        await cache.flush()
+        assert (await repo.get_pet("1", "100"))['money'] == 60
+        await repo.close()
+
+    asyncio.run(scenario())
+
+
+def test_reads_stay_clean_and_writes_settle_decay(repo):
+    async def scenario():
+        await _adopt(repo, "1")
+        row = await repo.get_pet("1", "100")
+        row['last_updated_time'] = (datetime.now() - timedelta(hours=5, minutes=10)).isoformat()
+        await repo.write_back([row], [])
+        cache = PetStateCache(repo)
+        assert (await cache.get_pet("1", "100"))['satiety'] == 80
+        assert not cache._dirty_pets
+
+        # 修改时才把离线衰减结算进存储值
+        await cache.adjust_pet("1", "100", money=10)
+        await cache.flush()
+        stored = await repo.get_pet("1", "100")
+        assert (stored['satiety'], stored['mood'], stored['money']) == (65, 90, 60)
+        await repo.close()
+
+    asyncio.run(scenario())
+
+
+def test_settle_writes_through_and_updates_cache(repo):
+    async def scenario():
+        await _adopt(repo, "1")
+        changed = []
+        cache = PetStateCache(repo, on_change=changed.append)
+        draft = await cache.draft("1", "100")
+        draft.update(money=draft['money'] + 20, last_duel_time=datetime.now().isoformat())
+        cutoff = (datetime.now() - DUEL_COOLDOWN).isoformat()
+        assert await cache.settle([draft], "last_duel_time", cutoff)
+        assert (await repo.get_pet("1", "100"))['money'] == 70
+        assert (await cache.get_pet("1", "100"))['money'] == 70
+        assert changed and changed[-1]['money'] == 70
+        await repo.close()
+
+    asyncio.run(scenario())
+
+
+def test_settle_conflict_rolls_back_and_drops_stale_entry(repo):
+    async def scenario():
+        await _adopt(repo, "1")
+        cache = PetStateCache(repo)
+        draft = await cache.draft("1", "100")
+        cutoff = (datetime.now() - DUEL_COOLDOWN).isoformat()
+
+        # 另一个实例抢先完成了结算
+        other = dict(draft, money=500, last_duel_time=datetime.now().isoformat())
+        await repo.settle_pets([other], "last_duel_time", cutoff)
+
+        draft.update(money=draft['money'] + 20, last_duel_time=datetime.now().isoformat())
+        assert not await cache.settle([draft], "last_duel_time", cutoff)
+        assert (await repo.get_pet("1", "100"))['money'] == 500
+        # 过期的条目被丢弃，下次读取从数据库重新加载
+        assert (await cache.get_pet("1", "100"))['money'] == 500
+        await repo.close()
+
+    asyncio.run(scenario())
+
+
+def test_settle_pets_is_all_or_nothing(repo):
+    async def scenario():
+        await _adopt(repo, "1")
+        await _adopt(repo, "2", cooldown=timedelta(0))  # 第二只仍在冷却中
+        cutoff = (datetime.now() - DUEL_COOLDOWN).isoformat()
+        rows = [dict(await repo.get_pet(uid, "100"), money=999) for uid in ("1", "2")]
+        with pytest.raises(SettlementConflictError):
+            await repo.settle_pets(rows, "last_duel_time", cutoff)
+        assert [(await repo.get_pet(uid, "100"))['money'] for uid in ("1", "2")] == [50, 50]
+        await repo.close()
+
+    asyncio.run(scenario())
+
+
+def test_settle_does_not_lose_pending_dirty_flag_on_conflict(repo):
+    async def scenario():
+        await _adopt(repo, "1")
+        cache = PetStateCache(repo)
+        await cache.add_item("1", "100", "苹果", 1)
+        draft = await cache.draft("1", "100")
+        cutoff = (datetime.now() - DUEL_COOLDOWN).isoformat()
+        await repo.settle_pets([dict(draft, last_duel_time=datetime.now().isoformat())], "last_duel_time", cutoff)
+        assert not await cache.settle([draft], "last_duel_time", cutoff)
+        # 背包还有未落盘的修改，条目不能被丢弃
+        await cache.flush()
+        assert await repo.get_inventory("1", "100") == [("苹果", 1)]
+        await repo.close()
+
+    asyncio.run(scenario())
+
+
+def test_settle_updates_leaderboard_for_rows_evicted_from_cache(repo):
+    async def scenario():
+        for uid in ("1", "2", "3"):
+            await _adopt(repo, uid)
+        cache = PetStateCache(repo, capacity=1)
+        board = Leaderboard(repo, size=3, before_load=cache.flush)
+        cache.on_change = board.update
+        assert [row['money'] for row in await board.top("100", "金钱")] == [50, 50, 50]
+
+        drafts = [await cache.draft(uid, "100") for uid in ("1", "2", "3")]
+        for draft in drafts:
+            draft.update(money=draft['money'] + 10 * int(draft['user_id']), last_duel_time=datetime.now().isoformat())
+        cutoff = (datetime.now() - DUEL_COOLDOWN).isoformat()
+        assert await cache.settle(drafts, "last_duel_time", cutoff)
+        # 参与者多于缓存容量，已被淘汰的玩家也要更新到排行榜
+        assert [(row['user_id'], row['money']) for row in await board.top("100", "金钱")] == [(3, 80), (2, 70), (1, 60)]
+        await repo.close()
+
+    asyncio.run(scenario())
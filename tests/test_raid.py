@@ -0,0 +1,164 @@
+import asyncio
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from astrbot_stubs import FakeEvent
+from pet_plugin import main
+from pet_plugin.battle_sim import simulate_raid
+from pet_plugin.raid import (BOSS_LEVEL_BONUS, RAID_BASE_EXP, RAID_BASE_MONEY, RAID_MVP_MONEY,
+                             RAID_VICTORY_MULTIPLIER, Raid, boss_max_hp, make_boss, raid_rewards)
+
+GROUP = "100"
+
+
+class Context:
+    """记录插件主动发送的消息。"""
+
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, origin, chain):
+        self.sent.append((origin, "".join(part.text for part in chain)))
+
+    def get_using_provider(self):
+        return None
+
+
+async def _adopt(repo, count: int):
+    now = datetime.now()
+    for user_id in range(1, count + 1):
+        await repo.create_pet(str(user_id), GROUP, f"宠物{user_id}", "草叶猫", 10 + user_id, 10,
+                              now.isoformat(), (now - timedelta(hours=2)).isoformat())
+
+
+@pytest.fixture
+def seeded_raid(monkeypatch):
+    """用固定种子运行讨伐模拟，并记下模拟结果供断言使用。"""
+    results = []
+
+    def simulate(*args):
+        stats = simulate_raid(*args, rng=np.random.default_rng(7))
+        results.append(stats)
+        return stats
+
+    monkeypatch.setattr(main, "simulate_raid", simulate)
+    return results
+
+
+def _raid(plugin, participants: int, level: int = 1) -> Raid:
+    boss = make_boss(plugin.content.current, level, random.Random(3))
+    return Raid(group_id=GROUP, boss=boss, origin="origin", started_at=datetime.now().isoformat(), ends_at=0.0,
+                participants={str(user_id): f"宠物{user_id}" for user_id in range(1, participants + 1)})
+
+
+def test_rewards_scale_with_damage_and_victory():
+    damage = np.array([0, 40, 100, 100])
+    exp, money = raid_rewards(damage, defeated=False)
+    assert exp.tolist() == [RAID_BASE_EXP + d // 4 for d in damage.tolist()]
+    # 伤害并列第一时赏金给先加入的人
+    assert money.tolist() == [RAID_BASE_MONEY, RAID_BASE_MONEY + 2, RAID_BASE_MONEY + 5 + RAID_MVP_MONEY,
+                              RAID_BASE_MONEY + 5]
+    won_exp, won_money = raid_rewards(damage, defeated=True)
+    assert won_exp.tolist() == (exp * RAID_VICTORY_MULTIPLIER).tolist()
+    assert (won_money - money).tolist() == [RAID_BASE_MONEY, RAID_BASE_MONEY + 2, RAID_BASE_MONEY + 5,
+                                            RAID_BASE_MONEY + 5]
+    assert [a.tolist() for a in raid_rewards(np.array([], dtype=np.int64), True)] == [[], []]
+
+
+def test_boss_is_seeded_and_scales_with_participants(make_plugin):
+    plugin = make_plugin()
+    content = plugin.content.current
+    boss = make_boss(content, 12, random.Random(5))
+    assert boss == make_boss(content, 12, random.Random(5))
+    assert boss.level == 12 + BOSS_LEVEL_BONUS
+    assert boss.pet_type in content.species
+    assert boss_max_hp(boss, 6) == 3 * boss_max_hp(boss, 2)
+    asyncio.run(plugin.terminate())
+
+
+def test_settlement_writes_rewards_for_group_larger_than_cache(make_plugin, seeded_raid):
+    plugin = make_plugin(pet_cache_size=3)
+
+    async def scenario():
+        await _adopt(plugin.repo, 8)
+        before = {pet['user_id']: pet for pet in await plugin.repo.group_pets(GROUP)}
+        [_ async for _ in plugin.pet_ranking(FakeEvent("1", GROUP), "金钱")]
+        raid = _raid(plugin, 8)
+
+        report = await plugin._settle_raid(raid)
+        stats = seeded_raid[-1]
+        exp, money = raid_rewards(stats.damage, stats.defeated)
+        assert f"参战 8 人，激战 {stats.rounds} 回合" in report
+
+        after = {pet['user_id']: pet for pet in await plugin.repo.group_pets(GROUP)}
+        for i, user_id in enumerate(range(1, 9)):
+            assert after[user_id]['money'] == before[user_id]['money'] + money[i]
+            assert after[user_id]['last_raid_time'] >= raid.started_at
+            # 升级时经验被扣除，没有升级时恰好增加奖励的经验
+            assert (after[user_id]['level'] > before[user_id]['level']
+                    or after[user_id]['exp'] == before[user_id]['exp'] + exp[i])
+            # 缓存与数据库一致
+            assert (await plugin.cache.get_pet(str(user_id), GROUP))['money'] == after[user_id]['money']
+        # 排行榜收到了全部参与者的结算结果，包括不在缓存中的
+        board = [row['money'] for row in await plugin.leaderboard.top(GROUP, "金钱")]
+        assert board == sorted((pet['money'] for pet in after.values()), reverse=True)[:len(board)]
+
+        # 同一次讨伐不能结算两次
+        assert "作废" in await plugin._settle_raid(raid)
+        assert {pet['user_id']: pet['money'] for pet in await plugin.repo.group_pets(GROUP)} == \
+               {user_id: pet['money'] for user_id, pet in after.items()}
+        await plugin.terminate()
+
+    asyncio.run(scenario())
+
+
+def test_conflicting_settlement_rolls_back_every_participant(make_plugin, seeded_raid):
+    plugin = make_plugin(pet_cache_size=3)
+
+    async def scenario():
+        await _adopt(plugin.repo, 5)
+        raid = _raid(plugin, 5)
+        for user_id in range(1, 6):
+            await plugin.cache.get_pet(str(user_id), GROUP)
+        # 另一个实例在讨伐开始后已经给 4 号结算过一次讨伐
+        other = await plugin.repo.get_pet("4", GROUP)
+        other.update(money=999, last_raid_time=datetime.now().isoformat())
+        await plugin.repo.settle_pets([other], "last_raid_time", raid.started_at)
+        before = {pet['user_id']: pet for pet in await plugin.repo.group_pets(GROUP)}
+
+        report = await plugin._settle_raid(raid)
+        assert report.endswith("本次讨伐作废。")
+        assert {pet['user_id']: pet for pet in await plugin.repo.group_pets(GROUP)} == before
+        # 冲突后缓存丢弃了过期的条目，重新读到另一个实例写入的数据
+        assert (await plugin.cache.get_pet("4", GROUP))['money'] == 999
+        await plugin.terminate()
+
+    asyncio.run(scenario())
+
+
+def test_world_boss_command_gathers_and_reports(make_plugin, seeded_raid):
+    context = Context()
+    plugin = make_plugin(context, raid_join_window=0.2, raid_cooldown=60)
+
+    async def scenario():
+        await _adopt(plugin.repo, 3)
+        replies = [[reply async for reply in plugin.world_boss(FakeEvent(str(user_id), GROUP))]
+                   for user_id in (1, 2, 2, 3)]
+        assert "降临了" in replies[0][0][1]
+        assert "当前共 2 人" in replies[1][0][1]
+        assert "已经在讨伐队伍中" in replies[2][0][1]
+        assert "当前共 3 人" in replies[3][0][1]
+
+        await asyncio.gather(*plugin._raid_tasks)
+        [(origin, report)] = context.sent
+        assert origin == FakeEvent("1", GROUP).unified_msg_origin
+        assert "参战 3 人" in report
+        # 冷却期间不能再次召唤
+        [reply] = [reply async for reply in plugin.world_boss(FakeEvent("1", GROUP))]
+        assert "还需等待" in reply[1]
+        await plugin.terminate()
+
+    asyncio.run(scenario())
@@ -0,0 +1,123 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from astrbot_stubs import FakeEvent
+from pet_plugin import ratelimit
+from pet_plugin.ratelimit import CooldownIndex, RateGate, TokenBuckets
+
+
+class FakeClock:
+    """代替 ratelimit 模块中的 time，monotonic 与 time 一起前进。"""
+
+    def __init__(self, start: float = 1_000_000.0):
+        self.now = start
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(ratelimit, "time", clock)
+    return clock
+
+
+def test_bucket_allows_burst_then_refills_at_rate():
+    buckets = TokenBuckets(rate=0.5, burst=3)
+    assert [buckets.take("a", now=0.0) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert buckets.take("a", now=0.0) == pytest.approx(2.0)
+    # 其他键互不影响
+    assert buckets.take("b", now=0.0) == 0.0
+    # 1 秒恢复半个令牌，还差半个
+    assert buckets.take("a", now=1.0) == pytest.approx(1.0)
+    assert buckets.take("a", now=2.0) == 0.0
+    # 长时间空闲后最多积攒 burst 个
+    assert [buckets.take("a", now=1000.0) for _ in range(4)][-1] > 0
+
+
+def test_bucket_cost_is_capped_at_burst_and_rejection_does_not_consume():
+    buckets = TokenBuckets(rate=1, burst=2)
+    # 单次消耗超过 burst 时按 burst 计，否则永远无法放行
+    assert buckets.take("a", cost=5, now=0.0) == 0.0
+    assert buckets.take("a", cost=2, now=1.0) == pytest.approx(1.0)
+    assert buckets.take("a", cost=1, now=1.0) == 0.0
+
+
+def test_group_rejection_refunds_user_tokens(clock):
+    gate = RateGate(CooldownIndex({}), user_rate=1, user_burst=2, group_rate=1, group_burst=3)
+    assert gate.admit("1", "100") is None
+    assert gate.admit("2", "100") is None
+    assert gate.admit("2", "100") is None
+    # 群的令牌已经用完，玩家 1 被群限流，但自己的令牌不被扣除
+    reason, wait = gate.admit("1", "100")
+    assert (reason, wait) == ("group", pytest.approx(1.0))
+    reason, _ = gate.admit("2", "100")
+    assert reason == "user"
+    clock.advance(1)
+    assert gate.admit("1", "100") is None
+    # 私聊不受群限流
+    assert gate.admit("3", None) is None
+
+
+def test_rejection_is_announced_once_per_period(make_plugin, clock):
+    plugin = make_plugin(rate_limit_user_rate=0.5, rate_limit_user_burst=2)
+
+    async def scenario():
+        event = FakeEvent("1", "100")
+        replies = [[reply async for reply in plugin.pet_menu(event)] for _ in range(4)]
+        assert all(replies[:2])
+        assert replies[2] == [("text", "你的操作太频繁了，请 2 秒后再试。")]
+        # 同一段限流期间的刷屏不再回复
+        assert replies[3] == []
+        assert plugin.metrics.counter("ratelimit_rejections_total", command="pet_menu", reason="user") == 2
+
+        clock.advance(2)
+        assert [reply async for reply in plugin.pet_menu(event)]
+        await plugin.terminate()
+
+    asyncio.run(scenario())
+
+
+def test_cooldown_index_expires(clock):
+    index = CooldownIndex({"walk": timedelta(minutes=5), "duel": timedelta(minutes=30)})
+    stamp = datetime.fromtimestamp(clock.now).isoformat()
+    index.observe({"user_id": 1, "group_id": 100, "last_walk_time": stamp, "last_duel_time": None})
+    assert index.remaining("1", "100", "walk") == pytest.approx(300)
+    assert index.remaining("1", "100", "duel") == 0
+    assert index.remaining("2", "100", "walk") == 0
+    clock.advance(299)
+    assert index.remaining("1", "100", "walk") == pytest.approx(1)
+    clock.advance(1)
+    assert index.remaining("1", "100", "walk") == 0
+
+    # 新的散步时间覆盖旧的记录
+    index.observe({"user_id": 1, "group_id": 100, "last_walk_time": datetime.fromtimestamp(clock.now).isoformat()})
+    assert index.remaining("1", "100", "walk") == pytest.approx(300)
+
+
+def test_cooldown_index_rejects_walk_before_reading_pet(make_plugin, clock):
+    plugin = make_plugin()
+
+    async def scenario():
+        stamp = datetime.fromtimestamp(clock.now).isoformat()
+        plugin.rate_gate.cooldowns.observe({"user_id": "1", "group_id": "100", "last_walk_time": stamp})
+        # 插件中还没有这只宠物，被拒绝说明请求没有走到读取数据的一步
+        replies = [reply async for reply in plugin.walk_pet(FakeEvent("1", "100"))]
+        assert replies == [("text", "刚散步回来，让宠物休息一下吧，还需等待 0:05:00。")]
+        assert plugin.metrics.counter("ratelimit_rejections_total", command="walk_pet", reason="cooldown") == 1
+
+        clock.advance(300)
+        replies = [reply async for reply in plugin.walk_pet(FakeEvent("1", "100"))]
+        assert replies == [("text", "你还没有宠物，不能去散步哦。")]
+        await plugin.terminate()
+
+    asyncio.run(scenario())
@@ -0,0 +1,101 @@
+import asyncio
+import io
+import threading
+
+import pytest
+from PIL import Image, ImageDraw
+
+from pet_plugin.render import CARD_SIZE, EncodeOptions, RenderBusyError, RenderPool, encode_image
+
+
+def _blocking_job(gate: threading.Event, value):
+    gate.wait(5)
+    return value
+
+
+def test_pool_rejects_beyond_max_pending(tmp_path):
+    pool = RenderPool(tmp_path, {}, workers=1, max_pending=2, timeout=5)
+    gate = threading.Event()
+
+    async def scenario():
+        running = [asyncio.create_task(pool.submit(_blocking_job, gate, i)) for i in range(2)]
+        await asyncio.sleep(0.01)
+        assert pool.pending == 2
+        with pytest.raises(RenderBusyError):
+            await pool.submit(_blocking_job, gate, 2)
+        # 被拒绝的任务不占名额
+        assert pool.pending == 2
+
+        gate.set()
+        assert await asyncio.gather(*running) == [0, 1]
+        assert pool.pending == 0
+        assert await pool.submit(_blocking_job, gate, 3) == 3
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        gate.set()
+        pool.shutdown()
+
+
+def test_timed_out_job_keeps_its_slot_until_it_finishes(tmp_path):
+    pool = RenderPool(tmp_path, {}, workers=1, max_pending=1, timeout=0.05)
+    gate = threading.Event()
+
+    async def scenario():
+        with pytest.raises(asyncio.TimeoutError):
+            await pool.submit(_blocking_job, gate, "slow")
+        # 放弃等待的任务仍在工作线程中运行，名额没有归还，新的任务直接被拒绝
+        assert pool.pending == 1
+        with pytest.raises(RenderBusyError):
+            await pool.submit(_blocking_job, gate, "next")
+
+        gate.set()
+        for _ in range(100):
+            if pool.pending == 0:
+                break
+            await asyncio.sleep(0.01)
+        assert pool.pending == 0
+        assert await pool.submit(_blocking_job, gate, "next") == "next"
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        gate.set()
+        pool.shutdown()
+
+
+def _card() -> Image.Image:
+    """与状态卡同样大小、带透明通道的测试图；渐变加噪点，接近背景和精灵图的压缩难度。"""
+    gradient = Image.linear_gradient("L").resize(CARD_SIZE).convert("RGB")
+    noise = Image.effect_noise(CARD_SIZE, 40).convert("RGB")
+    img = Image.blend(gradient, noise, 0.3).convert("RGBA")
+    ImageDraw.Draw(img).ellipse((50, 150, 350, 450), fill=(255, 200, 0, 128))
+    return img
+
+
+@pytest.mark.parametrize("fmt, pil_format, mode, suffix", [
+    ("png", "PNG", "RGBA", ".png"),
+    ("png8", "PNG", "P", ".png"),
+    ("jpeg", "JPEG", "RGB", ".jpg"),
+    ("webp", "WEBP", "RGBA", ".webp"),
+])
+@pytest.mark.parametrize("width", [0, 400])
+def test_encode_produces_requested_format_and_size(fmt, pil_format, mode, suffix, width):
+    options = EncodeOptions(format=fmt, width=width)
+    decoded = Image.open(io.BytesIO(encode_image(_card(), options)))
+    assert (decoded.format, decoded.mode) == (pil_format, mode)
+    # width 为 0 时不缩放，否则按比例缩放
+    expected = CARD_SIZE if width == 0 else (400, 300)
+    assert decoded.size == expected
+    assert options.suffix == suffix
+
+
+def test_lossy_quality_and_palette_shrink_output():
+    img = _card()
+    png = len(encode_image(img, EncodeOptions("png")))
+    assert len(encode_image(img, EncodeOptions("png8"))) < png
+    for fmt in ("jpeg", "webp"):
+        low = len(encode_image(img, EncodeOptions(fmt, quality=30)))
+        high = len(encode_image(img, EncodeOptions(fmt, quality=95)))
+        assert low < high < png
@@ -0,0 +1,70 @@
+import random
+from datetime import datetime, timedelta
+
+from pet_plugin.rules import (CUMULATIVE_EXP, MAX_LEVEL, exp_for_next_level, materialize_decay,
+                              resolve_level_up, with_decay)
+
+NOW = datetime(2026, 1, 1, 12, 0, 0)
+
+
+def _pet(last_updated: datetime | None, satiety: int = 80, mood: int = 100) -> dict:
+    return {"satiety": satiety, "mood": mood,
+            "last_updated_time": last_updated.isoformat() if last_updated else None}
+
+
+# --- 离线衰减 ---
+def test_with_decay_counts_whole_hours_without_mutating():
+    pet = _pet(NOW - timedelta(hours=5, minutes=30))
+    view = with_decay(pet, NOW)
+    assert (view['satiety'], view['mood']) == (65, 90)
+    assert (pet['satiety'], pet['mood']) == (80, 100)
+
+
+def test_with_decay_floors_at_zero():
+    view = with_decay(_pet(NOW - timedelta(days=10)), NOW)
+    assert (view['satiety'], view['mood']) == (0, 0)
+
+
+def test_with_decay_ignores_missing_timestamp():
+    assert with_decay(_pet(None), NOW)['satiety'] == 80
+
+
+def test_materialize_decay_keeps_partial_hour():
+    last = NOW - timedelta(hours=2, minutes=40)
+    pet = _pet(last)
+    assert materialize_decay(pet, NOW) == 2
+    assert pet['satiety'] == 74
+    assert pet['last_updated_time'] == (last + timedelta(hours=2)).isoformat()
+    # 剩下的 40 分钟再过 20 分钟就凑满一小时
+    assert materialize_decay(pet, NOW + timedelta(minutes=20)) == 1
+    assert pet['satiety'] == 71
+
+
+def test_materialize_decay_starts_clock_for_new_rows():
+    pet = _pet(None)
+    assert materialize_decay(pet, NOW) == 0
+    assert pet['last_updated_time'] == NOW.isoformat()
+
+
+# --- 等级 ---
+def _level_up_by_steps(level: int, exp: int) -> tuple[int, int]:
+    while level < MAX_LEVEL and exp >= exp_for_next_level(level):
+        exp -= exp_for_next_level(level)
+        level += 1
+    return level, exp
+
+
+def test_resolve_level_up_matches_step_by_step():
+    rng = random.Random(7)
+    for _ in range(2000):
+        level = rng.randint(1, MAX_LEVEL)
+        exp = rng.randint(0, CUMULATIVE_EXP[MAX_LEVEL] // rng.choice((1, 10, 1000)))
+        assert resolve_level_up(level, exp) == _level_up_by_steps(level, exp)
+
+
+def test_resolve_level_up_boundaries():
+    assert resolve_level_up(1, exp_for_next_level(1) - 1) == (1, exp_for_next_level(1) - 1)
+    assert resolve_level_up(1, exp_for_next_level(1)) == (2, 0)
+    # 满级后经验继续累积
+    assert resolve_level_up(MAX_LEVEL - 1, 10 ** 9)[0] == MAX_LEVEL
+    assert resolve_level_up(MAX_LEVEL, 12345) == (MAX_LEVEL, 12345)
@@ -0,0 +1,40 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import aiosqlite
+
+from pet_plugin.migrations import migrate
+from pet_plugin.pet_cache import PetStateCache
+from pet_plugin.rules import with_decay
+from pet_plugin.storage import SQLitePetRepository
+
+
+def test_adopted_pet_decays_from_adoption(tmp_path):
+    async def scenario():
+        repo = SQLitePetRepository(tmp_path / "pets.db")
+        adopted = datetime.now()
+        await repo.create_pet("1", "100", "豆豆", "草叶猫", 10, 10, adopted.isoformat(),
+                              (adopted - timedelta(hours=2)).isoformat())
+        stored = await PetStateCache(repo).get_pet("1", "100")
+        assert stored['last_updated_time'] == adopted.isoformat()
+        view = with_decay(stored, adopted + timedelta(hours=10))
+        assert (view['satiety'], view['mood']) == (50, 80)
+        await repo.close()
+
+    asyncio.run(scenario())
+
+
+def test_migration_backfills_pets_adopted_without_decay_clock(tmp_path):
+    async def scenario():
+        conn = await aiosqlite.connect(tmp_path / "pets.db", isolation_level=None)
+        await migrate(conn)
+        # 修复之前领养、此后从未写入过的宠物
+        await conn.execute("INSERT INTO pets (user_id, group_id, pet_name, pet_type, last_fed_time) "
+                           "VALUES (1, 100, '豆豆', '草叶猫', '2026-01-01T08:00:00')")
+        await conn.execute("PRAGMA user_version = 5")
+        await migrate(conn)
+        async with conn.execute("SELECT last_updated_time FROM pets") as cursor:
+            assert (await cursor.fetchone())[0] == '2026-01-01T08:00:00'
+        await conn.close()
+
+    asyncio.run(scenario())
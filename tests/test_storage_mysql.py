@@ -0,0 +1,260 @@
+"""
+MySQL 后端的测试默认在 mysql_standin 的进程内替身上运行；设置 PET_TEST_MYSQL 为 JSON 格式的连接参数
+（如 {"password": "pet", "database": "astrbot_pet_test"}）时改为连接真实服务器，测试会清空其中的表。
+"""
+import asyncio
+import json
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from astrbot_stubs import FakeEvent
+from mysql_standin import FakeMySQLServer
+from pet_plugin import storage_mysql
+from pet_plugin.pet_cache import PetStateCache
+from pet_plugin.storage import SettlementConflictError
+from pet_plugin.storage_mysql import MYSQL_SCHEMA_VERSION, MySQLPetRepository
+
+REAL_SERVER = json.loads(os.environ["PET_TEST_MYSQL"]) if os.environ.get("PET_TEST_MYSQL") else None
+# 插件配置中对应的 mysql_* 字段
+REAL_SERVER_CONFIG = {f"mysql_{key}": value for key, value in REAL_SERVER.items()} if REAL_SERVER else None
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    if REAL_SERVER is not None:
+        async def reset():
+            repo = MySQLPetRepository(**REAL_SERVER)
+            async with repo.transaction() as cursor:
+                for table in ("pets", "inventory", "pet_schema_version"):
+                    await cursor.execute(f"DROP TABLE IF EXISTS {table}")
+            await repo.close()
+
+        asyncio.run(reset())
+        return None
+    server = FakeMySQLServer(tmp_path / "mysql.db")
+    monkeypatch.setattr(storage_mysql.aiomysql, "create_pool", server.create_pool)
+    return server
+
+
+def _instance() -> MySQLPetRepository:
+    """同一份数据上的一个插件实例。"""
+    return MySQLPetRepository(**(REAL_SERVER or {}))
+
+
+async def _adopt(repo, user_id: str = "1", group_id: str = "100"):
+    now = datetime.now()
+    await repo.create_pet(user_id, group_id, f"宠物{user_id}", "草叶猫", 10, 10,
+                          now.isoformat(), (now - timedelta(hours=2)).isoformat())
+
+
+async def _schema_version(repo) -> int:
+    async with repo.reader() as cursor:
+        await cursor.execute("SELECT version FROM pet_schema_version WHERE id = 1")
+        return (await cursor.fetchone())["version"]
+
+
+def test_instances_starting_together_migrate_once(server):
+    if server is None:
+        pytest.skip("需要统计替身上执行过的语句")
+
+    async def scenario():
+        first, second = _instance(), _instance()
+        await asyncio.gather(first.connect(), second.connect())
+        assert await _schema_version(first) == MYSQL_SCHEMA_VERSION
+        assert sum("ADD COLUMN row_version" in sql for sql in server.statements) == 1
+        # 已是最新版本时再次启动不做任何修改
+        executed = len(server.statements)
+        third = _instance()
+        await third.connect()
+        assert not any(sql.lstrip().startswith(("CREATE TABLE IF NOT EXISTS pets", "REPLACE", "ALTER"))
+                       for sql in server.statements[executed:])
+        for repo in (first, second, third):
+            await repo.close()
+
+    asyncio.run(scenario())
+
+
+def test_migration_lock_timeout_closes_pool(server, monkeypatch):
+    if server is None:
+        pytest.skip("需要在替身上占住迁移锁")
+    monkeypatch.setattr(storage_mysql, "MIGRATION_LOCK_TIMEOUT", 0.05)
+
+    async def scenario():
+        await server.named_lock(storage_mysql.MIGRATION_LOCK_NAME).acquire()
+        repo = _instance()
+        with pytest.raises(TimeoutError):
+            await repo.connect()
+        assert repo._pool is None
+
+    asyncio.run(scenario())
+
+
+def test_create_pet_starts_decay_clock(server):
+    async def scenario():
+        repo = _instance()
+        await _adopt(repo)
+        pet = await repo.get_pet("1", "100")
+        assert pet['last_updated_time'] == pet['last_fed_time']
+        assert pet['row_version'] == 0
+        await repo.close()
+
+    asyncio.run(scenario())
+
+
+def test_settle_rejects_guard_conflict(server):
+    async def scenario():
+        repo = _instance()
+        await _adopt(repo)
+        row = await repo.get_pet("1", "100")
+        row.update(money=row['money'] + 30, last_duel_time=datetime.now().isoformat())
+        # 数据库中的冷却时间晚于 cutoff，说明冷却尚未结束
+        cutoff = (datetime.now() - timedelta(hours=3)).isoformat()
+        with pytest.raises(SettlementConflictError):
+            await repo.settle_pets([row], "last_duel_time", cutoff)
+        stored = await repo.get_pet("1", "100")
+        assert (stored['money'], stored['row_version']) == (50, 0)
+        await repo.close()
+
+    asyncio.run(scenario())
+
+
+def test_settle_rejects_rows_changed_by_another_instance(server):
+    async def scenario():
+        first, second = _instance(), _instance()
+        await _adopt(first)
+        stale = await first.get_pet("1", "100")
+        fresh = await second.get_pet("1", "100")
+        fresh['exp'] += 40
+        assert await second.write_back([fresh], []) == []
+        assert fresh['row_version'] == 1
+
+        stale.update(money=stale['money'] + 30, last_raid_time=datetime.now().isoformat())
+        with pytest.raises(SettlementConflictError):
+            await first.settle_pets([stale], "last_raid_time", datetime.now().isoformat())
+        stored = await first.get_pet("1", "100")
+        assert (stored['money'], stored['exp'], stored['row_version']) == (50, 40, 1)
+        for repo in (first, second):
+            await repo.close()
+
+    asyncio.run(scenario())
+
+
+def test_write_back_skips_stale_player_with_inventory(server):
+    async def scenario():
+        first, second = _instance(), _instance()
+        await _adopt(first, "1")
+        await _adopt(first, "2")
+        stale = await first.get_pet("1", "100")
+        other = await first.get_pet("2", "100")
+        fresh = await second.get_pet("1", "100")
+        fresh['money'] -= 20
+        await second.write_back([fresh], [(1, 100, "小鱼干", 1)])
+
+        stale['exp'] += 10
+        other['exp'] += 10
+        rows = [(1, 100, "能量饮料", 2), (2, 100, "能量饮料", 3)]
+        assert await first.write_back([stale, other], rows) == [(1, 100)]
+        assert (stale['row_version'], other['row_version']) == (0, 1)
+        stored = await first.get_pet("1", "100")
+        assert (stored['money'], stored['exp']) == (30, 0)
+        assert await first.get_inventory("1", "100") == [("小鱼干", 1)]
+        assert await first.get_inventory("2", "100") == [("能量饮料", 3)]
+        for repo in (first, second):
+            await repo.close()
+
+    asyncio.run(scenario())
+
+
+def test_shared_caches_do_not_overwrite_each_other(server):
+    async def scenario():
+        first, second = _instance(), _instance()
+        await _adopt(first)
+        # 两个实例各自缓存了同一只宠物，第一个实例先修改并落盘
+        cache_a = PetStateCache(first, shared=True, max_staleness=60)
+        cache_b = PetStateCache(second, shared=True, max_staleness=60)
+        await cache_a.get_pet("1", "100")
+        await cache_b.get_pet("1", "100")
+        assert await cache_a.spend_money("1", "100", 20)
+        await cache_a.flush()
+
+        # 第二个实例基于旧数据的修改被拒绝，不会把金币改回去
+        await cache_b.adjust_pet("1", "100", exp=15)
+        await cache_b.flush()
+        assert cache_b.conflicts == 1
+        stored = await first.get_pet("1", "100")
+        assert (stored['money'], stored['exp']) == (30, 0)
+        assert (await cache_b.get_pet("1", "100"))['money'] == 30
+
+        # 数据过期后重新读取，两边的修改都能保留
+        cache_b.max_staleness = 0
+        await cache_b.adjust_pet("1", "100", exp=15)
+        await cache_b.flush()
+        stored = await first.get_pet("1", "100")
+        assert (stored['money'], stored['exp'], cache_b.conflicts) == (30, 15, 1)
+        for cache in (cache_a, cache_b):
+            await cache.close()
+        for repo in (first, second):
+            await repo.close()
+
+    asyncio.run(scenario())
+
+
+def test_commit_writes_through_and_reports_lost_changes(server):
+    async def scenario():
+        first, second = _instance(), _instance()
+        await _adopt(first)
+        cache = PetStateCache(first, flush_interval=3600, shared=True, max_staleness=60)
+        await cache.adjust_pet("1", "100", money=5)
+        await cache.add_item("1", "100", "小鱼干", 1)
+        assert await cache.commit("1", "100")
+        assert (await first.get_pet("1", "100"))['money'] == 55
+        assert await first.get_inventory("1", "100") == [("小鱼干", 1)]
+
+        # 另一个实例先改了这只宠物，定期落盘丢弃的修改也要由 commit 报告
+        fresh = await second.get_pet("1", "100")
+        await second.write_back([dict(fresh, money=0)], [])
+        await cache.adjust_pet("1", "100", money=5)
+        await cache.flush()
+        assert not await cache.commit("1", "100")
+        assert (await first.get_pet("1", "100"))['money'] == 0
+        # 之后的新修改与丢失的那次无关
+        await cache.adjust_pet("1", "100", money=5)
+        assert await cache.commit("1", "100")
+        assert (await first.get_pet("1", "100"))['money'] == 5
+        await cache.close()
+        for repo in (first, second):
+            await repo.close()
+
+    asyncio.run(scenario())
+
+
+def test_conflicting_purchase_is_reported_instead_of_lost(server, make_plugin):
+    first = make_plugin(storage_backend="mysql", mysql_cache_staleness=60, **(REAL_SERVER_CONFIG or {}))
+    second = make_plugin(storage_backend="mysql", mysql_cache_staleness=60, **(REAL_SERVER_CONFIG or {}))
+
+    async def reply(generator) -> str:
+        return [result async for result in generator][-1][1]
+
+    async def scenario():
+        await _adopt(first.repo)
+        name, item = next((name, item) for name, item in first.content.current.shop_items.items()
+                          if item['price'] <= 25)
+        # 两个实例都已缓存了这只宠物
+        await first.cache.get_pet("1", "100")
+        await second.cache.get_pet("1", "100")
+
+        assert "购买成功" in await reply(first.buy_item(FakeEvent("1", "100"), name))
+        assert "没有生效" in await reply(second.buy_item(FakeEvent("1", "100"), name))
+        assert (await first.repo.get_pet("1", "100"))['money'] == 50 - item['price']
+        assert await first.repo.get_inventory("1", "100") == [(name, 1)]
+
+        # 重试时读到最新数据，两次购买都生效
+        assert "购买成功" in await reply(second.buy_item(FakeEvent("1", "100"), name))
+        assert (await first.repo.get_pet("1", "100"))['money'] == 50 - 2 * item['price']
+        assert await first.repo.get_inventory("1", "100") == [(name, 2)]
+        for plugin in (first, second):
+            await plugin.terminate()
+
+    asyncio.run(scenario())
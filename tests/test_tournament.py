@@ -0,0 +1,138 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from astrbot_stubs import FakeEvent
+from pet_plugin import main
+from pet_plugin.tournament import (PARTICIPATION_EXP, PLACE_MONEY, WIN_EXP, WIN_MONEY, Match, bracket_order,
+                                   run_bracket, tournament_rewards)
+
+GROUP = "100"
+
+
+async def _adopt(repo, count: int):
+    """攻击力各不相同，用来从模拟的参数中认出每个种子对应的玩家。"""
+    now = datetime.now()
+    for user_id in range(1, count + 1):
+        await repo.create_pet(str(user_id), GROUP, f"宠物{user_id}", "草叶猫", 10 + user_id, 10,
+                              now.isoformat(), (now - timedelta(hours=2)).isoformat())
+
+
+def _bracket(count: int, seed: int = 0) -> list[list[Match]]:
+    stats = np.arange(count, 0, -1) + 10
+    return run_bracket(stats, stats, np.full(count, 5), np.full(count, 100), np.zeros(count, dtype=np.intp),
+                       np.ones((1, 1)), rng=np.random.default_rng(seed))
+
+
+@pytest.fixture
+def seeded_bracket(monkeypatch):
+    """用固定种子运行淘汰赛，记下 (种子顺序的攻击力, 各轮对局) 供断言使用。"""
+    results = []
+
+    def bracket(attack, *args):
+        rounds = run_bracket(attack, *args, rng=np.random.default_rng(11))
+        results.append((attack.tolist(), rounds))
+        return rounds
+
+    monkeypatch.setattr(main, "run_bracket", bracket)
+    return results
+
+
+def test_bracket_order_keeps_top_seeds_apart():
+    assert bracket_order(1) == [0]
+    assert bracket_order(4) == [0, 3, 1, 2]
+    assert bracket_order(8) == [0, 7, 3, 4, 1, 6, 2, 5]
+    # 每一对首轮对手的种子序号之和相同
+    assert {a + b for a, b in zip(bracket_order(16)[::2], bracket_order(16)[1::2])} == {15}
+
+
+@pytest.mark.parametrize("count", [4, 5, 6, 9, 13])
+def test_byes_go_to_top_seeds_and_everyone_but_champion_loses_once(count):
+    rounds = _bracket(count)
+    size = 1 << (count - 1).bit_length()
+    assert len(rounds) == size.bit_length() - 1
+    byes = [match.a for match in rounds[0] if match.b is None]
+    assert sorted(byes) == list(range(size - count))
+    assert all(match.b is not None for matches in rounds[1:] for match in matches)
+
+    losers = [match.b if match.winner == match.a else match.a for matches in rounds for match in matches
+              if match.b is not None]
+    champion = rounds[-1][0].winner
+    assert sorted(losers + [champion]) == list(range(count))
+    # 每一轮的胜者按签位顺序进入下一轮
+    for previous, matches in zip(rounds, rounds[1:]):
+        assert [seed for match in matches for seed in (match.a, match.b)] == [match.winner for match in previous]
+    assert _bracket(count, seed=4) == _bracket(count, seed=4)
+
+
+def test_rewards_count_wins_but_not_byes():
+    # 5 人：种子 0、1、2 首轮轮空，3 胜 4；半决赛 0 胜 3、2 胜 1；决赛 2 胜 0
+    rounds = [
+        [Match(0, None, 0), Match(3, 4, 3, 7), Match(1, None, 1), Match(2, None, 2)],
+        [Match(0, 3, 0, 5), Match(1, 2, 2, 6)],
+        [Match(0, 2, 2, 9)],
+    ]
+    exp, money, wins = tournament_rewards(rounds, 5)
+    assert wins.tolist() == [1, 0, 2, 1, 0]
+    assert exp.tolist() == [PARTICIPATION_EXP + WIN_EXP * w for w in wins.tolist()]
+    assert money.tolist() == [WIN_MONEY + PLACE_MONEY[1], PLACE_MONEY[2], 2 * WIN_MONEY + PLACE_MONEY[0],
+                              WIN_MONEY + PLACE_MONEY[2], 0]
+
+
+def test_tournament_settles_group_larger_than_cache(make_plugin, seeded_bracket):
+    plugin = make_plugin(pet_cache_size=3, tournament_cooldown=60)
+
+    async def scenario():
+        await _adopt(plugin.repo, 10)
+        before = {pet['user_id']: pet for pet in await plugin.repo.group_pets(GROUP)}
+        replies = [reply async for reply in plugin.pet_tournament(FakeEvent("1", GROUP))]
+        assert "10 只宠物经过 4 轮角逐" in replies[1][1]
+
+        attack, rounds = seeded_bracket[-1]
+        seeds = [int(value) - 10 for value in attack]  # 种子序号 -> user_id
+        exp, money, _ = tournament_rewards(rounds, len(seeds))
+        after = {pet['user_id']: pet for pet in await plugin.repo.group_pets(GROUP)}
+        for seed, user_id in enumerate(seeds):
+            assert after[user_id]['money'] == before[user_id]['money'] + money[seed]
+            assert (after[user_id]['level'] > before[user_id]['level']
+                    or after[user_id]['exp'] == before[user_id]['exp'] + exp[seed])
+            assert after[user_id]['last_tournament_time'] is not None
+        champion = seeds[rounds[-1][0].winner]
+        assert f"「宠物{champion}」" in replies[1][1]
+        # 缓存和排行榜都与数据库一致
+        for user_id, pet in after.items():
+            assert (await plugin.cache.get_pet(str(user_id), GROUP))['money'] == pet['money']
+        board = [row['money'] for row in await plugin.leaderboard.top(GROUP, "金钱")]
+        assert board == sorted((pet['money'] for pet in after.values()), reverse=True)[:len(board)]
+
+        # 冷却期间不能再次举办
+        [reply] = [reply async for reply in plugin.pet_tournament(FakeEvent("1", GROUP))]
+        assert "还需等待" in reply[1]
+        await plugin.terminate()
+
+    asyncio.run(scenario())
+
+
+def test_conflicting_settlement_voids_tournament(make_plugin, seeded_bracket):
+    plugin = make_plugin(pet_cache_size=3, tournament_cooldown=60)
+
+    async def scenario():
+        await _adopt(plugin.repo, 6)
+        # 另一个实例记录的比赛时间晚于本次比赛的开始时间
+        later = (datetime.now() + timedelta(minutes=1)).isoformat()
+        other = await plugin.repo.get_pet("5", GROUP)
+        other.update(money=999, last_tournament_time=later)
+        await plugin.repo.settle_pets([other], "last_tournament_time", later)
+        before = await plugin.repo.group_pets(GROUP)
+
+        replies = [reply async for reply in plugin.pet_tournament(FakeEvent("1", GROUP))]
+        assert replies[-1] == ("text", "有参赛宠物的锦标赛奖励已经结算过了，本次锦标赛作废。")
+        assert await plugin.repo.group_pets(GROUP) == before
+        assert (await plugin.cache.get_pet("5", GROUP))['money'] == 999
+        # 作废的比赛不进入冷却
+        assert GROUP not in plugin._tournament_ready_at
+        await plugin.terminate()
+
+    asyncio.run(scenario())
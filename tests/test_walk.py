@@ -0,0 +1,65 @@
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta
+
+from astrbot_stubs import FakeEvent
+
+
+class SlowContext:
+    """LLM 始终比散步的时间预算更慢。"""
+
+    class Provider:
+        async def text_chat(self, prompt: str = "", **kwargs):
+            await asyncio.sleep(30)
+
+    def get_using_provider(self):
+        return self.Provider()
+
+
+async def _collect(generator) -> list:
+    return [result async for result in generator]
+
+
+def test_walk_does_not_hold_player_lock_while_waiting_for_encounter(make_plugin, monkeypatch):
+    monkeypatch.setattr(random, "random", lambda: 0.0)  # 总是触发奇遇
+    plugin = make_plugin(SlowContext(), encounter_latency_budget=0.5, encounter_pool_size=0)
+
+    async def scenario():
+        now = datetime.now()
+        await plugin.repo.create_pet("1", "100", "豆豆", "草叶猫", 10, 10, now.isoformat(),
+                                     (now - timedelta(hours=2)).isoformat())
+        walk = asyncio.create_task(_collect(plugin.walk_pet(FakeEvent("1", "100"))))
+        await asyncio.sleep(0.1)
+        assert not walk.done()
+
+        # 散步还在等待奇遇事件，同一玩家的其他命令可以立即拿到锁
+        start = time.perf_counter()
+        async with plugin.player_locks.hold(plugin._player_key("1", "100")):
+            pass
+        assert time.perf_counter() - start < 0.05
+
+        replies = await walk
+        assert "奇遇发生" in replies[0][1]
+        assert (await plugin.cache.get_pet("1", "100"))['last_walk_time'] > now.isoformat()
+        await plugin.terminate()
+
+    asyncio.run(scenario())
+
+
+def test_walk_rechecks_cooldown_under_lock(make_plugin, monkeypatch):
+    monkeypatch.setattr(random, "random", lambda: 0.0)
+    plugin = make_plugin(SlowContext(), encounter_latency_budget=0.2, encounter_pool_size=0)
+
+    async def scenario():
+        now = datetime.now()
+        await plugin.repo.create_pet("1", "100", "豆豆", "草叶猫", 10, 10, now.isoformat(),
+                                     (now - timedelta(hours=2)).isoformat())
+        # 两次散步同时通过加锁前的检查，只有一次能结算
+        replies = await asyncio.gather(*(_collect(plugin.walk_pet(FakeEvent("1", "100"))) for _ in range(2)))
+        texts = sorted(reply[0][1] for reply in replies)
+        assert sum("奇遇发生" in text for text in texts) == 1
+        assert sum("休息一下" in text for text in texts) == 1
+        await plugin.terminate()
+
+    asyncio.run(scenario())
@@ -0,0 +1,91 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+from .battle_sim import simulate_battles
+
+TOURNAMENT_MIN_ENTRANTS = 4
+# 奖励：参赛经验，每赢一场的经验与金钱，以及冠军、亚军、四强的额外金钱
+PARTICIPATION_EXP = 5
+WIN_EXP, WIN_MONEY = 15, 10
+PLACE_MONEY = (200, 100, 50)  # 冠军、亚军、半决赛败者
+
+
+@dataclass(frozen=True, slots=True)
+class Match:
+    """一场对局。参赛者用种子序号表示（0 为头号种子），b 为 None 表示 a 轮空晋级。"""
+    a: int
+    b: int | None
+    winner: int
+    turns: int = 0
+
+
+def bracket_order(size: int) -> list[int]:
+    """标准种子排位：返回每个签位上的种子序号，强者尽量晚相遇，轮空总是分给排名靠前的种子。size 为 2 的幂。"""
+    order = [0]
+    while len(order) < size:
+        n = len(order) * 2
+        order = [s for seed in order for s in (seed, n - 1 - seed)]
+    return order
+
+
+def run_bracket(attack, defense, level, satiety, attr, multipliers: np.ndarray,
+                rng: np.random.Generator | None = None) -> list[list[Match]]:
+    """
+    按种子顺序给出的参赛者（数组下标即种子序号）进行单败淘汰赛，返回从首轮到决赛每一轮的对局。
+    同一轮的对局互不影响，在一次 simulate_battles 批量模拟中完成；每场随机决定先手方。
+    """
+    rng = rng or np.random.default_rng()
+    attack, defense, level, satiety, attr = (np.asarray(v) for v in (attack, defense, level, satiety, attr))
+    count = attack.size
+    size = 1 << (count - 1).bit_length()
+    slots: list[int | None] = [seed if seed < count else None for seed in bracket_order(size)]
+
+    rounds = []
+    while len(slots) > 1:
+        pairs = list(zip(slots[::2], slots[1::2]))
+        fights = [(a, b) for a, b in pairs if b is not None]
+        outcome = {}
+        if fights:
+            left = np.array([a for a, _ in fights])
+            right = np.array([b for _, b in fights])
+            swap = rng.random(len(fights)) < 0.5
+            p1, p2 = np.where(swap, right, left), np.where(swap, left, right)
+            stats = simulate_battles(attack[p1], defense[p1], level[p1], satiety[p1], attr[p1],
+                                     attack[p2], defense[p2], level[p2], satiety[p2], attr[p2],
+                                     multipliers, rng=rng)
+            winners = np.where(stats.p1_wins, p1, p2)
+            outcome = {a: (int(w), int(t)) for (a, _), w, t in zip(fights, winners, stats.turns)}
+
+        matches = []
+        for a, b in pairs:
+            if b is None:
+                matches.append(Match(a, None, a))
+            else:
+                winner, turns = outcome[a]
+                matches.append(Match(a, b, winner, turns))
+        rounds.append(matches)
+        slots = [match.winner for match in matches]
+    return rounds
+
+
+def tournament_rewards(rounds: list[list[Match]], count: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """按每名参赛者的胜场和名次计算 (经验, 金钱, 胜场) 数组，轮空不计胜场。"""
+    wins = np.zeros(count, dtype=np.int64)
+    for matches in rounds:
+        for match in matches:
+            if match.b is not None:
+                wins[match.winner] += 1
+    exp = PARTICIPATION_EXP + WIN_EXP * wins
+    money = WIN_MONEY * wins
+
+    final = rounds[-1][0]
+    runner_up = final.b if final.winner == final.a else final.a
+    money[final.winner] += PLACE_MONEY[0]
+    if runner_up is not None:
+        money[runner_up] += PLACE_MONEY[1]
+    if len(rounds) >= 2:
+        for match in rounds[-2]:
+            if match.b is not None:
+                money[match.b if match.winner == match.a else match.a] += PLACE_MONEY[2]
+    return exp, money, wins